@@ -5,37 +5,35 @@ from PySide6.QtWidgets import (QMainWindow, QWidget, QLabel, QComboBox, QPushBut
                                QListWidgetItem, QGridLayout, QDateEdit, QSpinBox,
                                QRadioButton, QButtonGroup, QCheckBox, QTextEdit,
                                QHeaderView, QStackedWidget, QSplitter, QTimeEdit,
-                               QFileDialog)
+                               QFileDialog, QTableView, QDockWidget)
 from PySide6.QtCore import Qt, Signal, QDate, QSize, QTimer, QTime
 from PySide6.QtGui import QFont, QIcon, QColor, QPixmap, QPainter, QPen, QBrush, QPainterPath
 from datetime import datetime, timedelta
 import sys
 import json
+import logging
 import os
 import tempfile
-import docx
-from docx.shared import Pt, Cm, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
-import subprocess
-import platform
-import xlwt
-import ssl
-import report_generator
 
+from analysis_flags import analysis_flags
+from appointment_reminders import queue_reminders, pending_reminders, REMINDER_INTERVAL
+from background_jobs import job_manager, output_file, JobsPanel
 from database_connection import db
+from email_outbox import email_outbox, build_message, SmtpSettings
+from email_templates import render_analysis_notification, render_report
+from lazy_tabs import LazyTab
+from patient_search import patient_search, SEARCH_DELAY
+from query_builder import QueryConditions
+from reference_cache import reference_cache
+from reference_ranges import reference_ranges, age_on
+from statistics_service import statistics_service, STATISTICS_DATA_KINDS
+from table_models import (iter_query_rows, LazyQueryTableModel, TableColumn, ActionButtonsDelegate, RowAction,
+                          abnormal_result_background)
 
-# Попытка импорта классов из app.utils
-try:
-    from app.utils.document_generator import DocumentGenerator
-    from app.utils.email_sender import EmailSender
-    print("Импортированы классы из app.utils")
-except ImportError:
-    print("Невозможно импортировать классы из app.utils, используются встроенные версии")
-    # DocumentGenerator класс определен в другом месте - app.utils.document_generator
+logger = logging.getLogger(__name__)
+
+# Модули экспорта (docx, openpyxl, report_generator) импортируются
+# при первом экспорте, а не при открытии окна
 
 
 class EmailSender:
@@ -50,40 +48,26 @@ class EmailSender:
         self.app_password = "app_password_here"         # Заменить на пароль приложения Gmail
         self.test_mode = test_mode
     
-    def send_email(self, recipient_email, subject, message, attachments=None):
+    def smtp_settings(self):
+        """Параметры SMTP-сервера для очереди писем"""
+        return SmtpSettings(self.smtp_server, self.port, self.username, self.app_password)
+    
+    def send_email(self, recipient_email, subject, message, attachments=None, analysis_result_id=None):
         """
-        Отправка электронного письма
+        Постановка электронного письма в очередь отправки (email_outbox)
         
         :param recipient_email: Email получателя
         :param subject: Тема письма
         :param message: Текст письма (может быть в формате HTML)
         :param attachments: Список путей к файлам для прикрепления
-        :return: True в случае успеха, False в случае ошибки
+        :param analysis_result_id: ID результата анализа; после доставки письма
+                                   статус результата меняется на 'sent'
+        :return: True, если письмо поставлено в очередь, False в случае ошибки
         """
         try:
             # Создание объекта сообщения
-            from email.mime.multipart import MIMEMultipart
-            from email.mime.text import MIMEText
-            from email.mime.application import MIMEApplication
-            import os
-            
-            msg = MIMEMultipart()
-            msg['From'] = self.username
-            msg['To'] = recipient_email
-            msg['Subject'] = subject
-            
-            # Добавление текста письма
-            msg.attach(MIMEText(message, 'html'))
-            
-            # Добавление вложений
-            if attachments:
-                for file_path in attachments:
-                    if os.path.isfile(file_path):
-                        with open(file_path, 'rb') as file:
-                            part = MIMEApplication(file.read(), Name=os.path.basename(file_path))
-                            part['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
-                            msg.attach(part)
-
+            msg = build_message(self.username, recipient_email, subject, message, attachments)
+            
             # В тестовом режиме не отправляем письмо, а только выводим информацию
             if self.test_mode:
                 print(f"\n[ТЕСТОВЫЙ РЕЖИМ] Отправка email:")
@@ -96,16 +80,10 @@ class EmailSender:
                 print("Email успешно отправлен (тестовый режим)")
                 return True
             
-            # Отправка письма
-            import smtplib
-            
-            context = ssl.create_default_context()
-            with smtplib.SMTP(self.smtp_server, self.port) as server:
-                server.starttls(context=context)
-                server.login(self.username, self.app_password)
-                server.sendmail(self.username, recipient_email, msg.as_string())
-            
-            return True
+            # Письмо отправляется фоновым потоком очереди через одно SMTP-соединение
+            email_outbox.configure(self.smtp_settings())
+            outbox_id = email_outbox.enqueue(recipient_email, subject, msg.as_string(), analysis_result_id)
+            return outbox_id is not None
             
         except Exception as e:
             print(f"Ошибка при отправке email: {str(e)}")
@@ -129,45 +107,10 @@ class EmailSender:
                 print(f"Ошибка: файл отчета {report_file_path} не найден")
                 return False
             
-            # Создание HTML-содержимого письма
-            html_content = f"""
-            <html>
-                <head>
-                    <style>
-                        body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
-                        .container {{ width: 80%; margin: 0 auto; padding: 20px; }}
-                        h1 {{ color: #2c3e50; }}
-                        .report-info {{ background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-                        .additional-info {{ background-color: #e8f4fe; padding: 10px; border-left: 4px solid #2196f3; margin-top: 20px; }}
-                    </style>
-                </head>
-                <body>
-                    <div class="container">
-                        <h1>Отчет: {report_type}</h1>
-                        <p>Уважаемый(ая) <strong>{recipient_name}</strong>,</p>
-                        <p>Направляем Вам отчет <strong>"{report_type}"</strong> за период <strong>{report_period}</strong>.</p>
-                        
-                        <div class="report-info">
-                            <p>Файл отчета прикреплен к письму.</p>
-                            <p>Тип файла: {os.path.splitext(report_file_path)[1]}</p>
-                        </div>
-            """
-            
-            # Добавление дополнительной информации, если она указана
-            if additional_text:
-                html_content += f"""
-                        <div class="additional-info">
-                            <p><strong>Дополнительная информация:</strong></p>
-                            <p>{additional_text}</p>
-                        </div>
-                """
-            
-            html_content += """
-                        <p>С уважением,<br>Медицинский центр</p>
-                    </div>
-                </body>
-            </html>
-            """
+            # HTML-содержимое письма по общему шаблону
+            html_content = render_report(
+                recipient_name, report_type, report_period, os.path.splitext(report_file_path)[1], additional_text
+            )
             
             # Отправка email с отчетом
             return self.send_email(
@@ -196,6 +139,10 @@ class DocumentGenerator:
         :param result_details: Словарь с данными результатов анализа
         :return: Путь к созданному файлу
         """
+        import docx
+        from docx.shared import Pt
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        
         try:
             # Создание документа Word
             doc = docx.Document()
@@ -297,7 +244,7 @@ class DocumentGenerator:
                     row_cells[1].text = str(value)
                     
                     # Нормальные значения (для примера)
-                    normal_values = self._get_normal_values(param)
+                    normal_values = self._get_normal_values(param, patient)
                     row_cells[2].text = normal_values
             else:
                 doc.add_paragraph('Нет данных о результатах анализа.')
@@ -329,33 +276,18 @@ class DocumentGenerator:
             print(f"Ошибка при создании документа: {str(e)}")
             return None
     
-    def _get_normal_values(self, parameter):
+    def _get_normal_values(self, parameter, patient=None):
         """
-        Получение нормальных значений для параметра анализа
+        Получение нормальных значений для параметра анализа из справочника
         
         :param parameter: Имя параметра анализа
+        :param patient: Данные пациента (пол и дата рождения) для выбора нормы
         :return: Строка с нормальными значениями
         """
-        # Словарь с нормальными значениями для некоторых параметров
-        normal_values = {
-            'Гемоглобин': '120-160 г/л',
-            'Эритроциты': '3.8-5.5 млн/мкл',
-            'Лейкоциты': '4.0-9.0 тыс/мкл',
-            'Тромбоциты': '180-320 тыс/мкл',
-            'СОЭ': '2-15 мм/ч',
-            'Глюкоза': '3.9-6.1 ммоль/л',
-            'Холестерин': '3.0-5.2 ммоль/л',
-            'Билирубин': '3.4-17.1 мкмоль/л',
-            'АЛТ': '5-40 ед/л',
-            'АСТ': '5-40 ед/л',
-            'Креатинин': '53-106 мкмоль/л',
-            'Мочевина': '2.5-8.3 ммоль/л',
-            'pH': '5.0-7.0',
-            'Белок': 'Отсутствует',
-            'Кетоновые тела': 'Отсутствуют'
-        }
-        
-        return normal_values.get(parameter, 'Не указано')
+        patient = patient or {}
+        return reference_ranges.describe(
+            parameter, patient.get('gender'), age_on(patient.get('birth_date')), default='Не указано'
+        )
 
 
 class AddEditUserDialog(QDialog):
@@ -545,8 +477,7 @@ class AddEditUserDialog(QDialog):
                 query += " WHERE id = ?"
                 params.append(user_id)
                 
-                print(f"Выполнение обновления пользователя: {query}")
-                print(f"Параметры: {params}")
+                logger.debug("Выполнение обновления пользователя: %s; параметры: %r", query, params)
                 
                 if db.execute_query(query, params):
                     # Обновление информации о враче, если это врач
@@ -597,9 +528,17 @@ class AddEditUserDialog(QDialog):
 class UserListWidget(QWidget):
     """Виджет для отображения списка пользователей"""
     
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, load=True):
+        """
+        :param load: Загрузить пользователей сразу; при False данные
+                     передаются через show_data() (см. lazy_tabs)
+        """
         super().__init__(parent)
+        # Отображаемые пользователи
+        self._users = None
         self.setup_ui()
+        if load:
+            self.load_users()
     
     def setup_ui(self):
         """Настройка интерфейса"""
@@ -629,13 +568,20 @@ class UserListWidget(QWidget):
         self.users_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         
         layout.addWidget(self.users_table)
-        
-        # Загрузка пользователей
-        self.load_users()
     
     def load_users(self):
         """Загрузка списка пользователей"""
-        users = db.get_all_users()
+        self.show_data(db.get_all_users())
+    
+    def data_loader(self):
+        """Функция чтения пользователей для фонового потока"""
+        return db.get_all_users
+    
+    def show_data(self, users):
+        """Отображение списка пользователей; таблица не перестраивается, если список не изменился"""
+        if users == self._users:
+            return
+        self._users = users
         
         self.users_table.setRowCount(len(users))
         
@@ -725,9 +671,29 @@ class UserListWidget(QWidget):
 class SystemStatisticsWidget(QWidget):
     """Виджет для отображения статистики системы"""
     
-    def __init__(self, parent=None):
+    # Маппинг ролей и статусов приемов для отображения
+    ROLE_NAMES = {
+        'admin': 'Администраторы',
+        'doctor': 'Врачи',
+        'lab': 'Лаборанты'
+    }
+    APPOINTMENT_STATUS_NAMES = {
+        'scheduled': 'Запланировано',
+        'completed': 'Завершено',
+        'cancelled': 'Отменено'
+    }
+    
+    def __init__(self, parent=None, load=True):
+        """
+        :param load: Загрузить статистику сразу; при False данные
+                     передаются через show_data() (см. lazy_tabs)
+        """
         super().__init__(parent)
+        # Отображаемая статистика (PeriodStatistics)
+        self._statistics = None
         self.setup_ui()
+        if load:
+            self.load_statistics()
     
     def setup_ui(self):
         """Настройка интерфейса"""
@@ -799,112 +765,91 @@ class SystemStatisticsWidget(QWidget):
         
         self.statistics_area.setWidget(statistics_widget)
         layout.addWidget(self.statistics_area)
-        
-        # Загрузка статистики
-        self.load_statistics()
+    
+    def period(self):
+        """Выбранный период (начало, конец) в формате 'YYYY-MM-DD'"""
+        return self.start_date.date().toString("yyyy-MM-dd"), self.end_date.date().toString("yyyy-MM-dd")
     
     def load_statistics(self):
         """Загрузка статистики"""
+        # Статистика берется из дневных сводок (statistics_service)
+        self.show_data(statistics_service.get_statistics(*self.period()))
+    
+    def data_loader(self):
+        """Функция чтения статистики за выбранный период для фонового потока"""
+        start_date, end_date = self.period()
+        return lambda: statistics_service.get_statistics(start_date, end_date)
+    
+    def show_data(self, statistics):
+        """Отображение статистики; блоки не перестраиваются, если данные не изменились"""
+        if statistics == self._statistics:
+            return
+        self._statistics = statistics
+        
         # Очистка предыдущих данных
         for i in reversed(range(self.statistics_layout.count())):
             widget = self.statistics_layout.itemAt(i).widget()
             if widget:
                 widget.setParent(None)
         
-        # Получение параметров фильтрации
-        start_date = self.start_date.date().toString("yyyy-MM-dd")
-        end_date = self.end_date.date().toString("yyyy-MM-dd")
-        
         # Статистика пользователей
-        self._add_user_statistics()
+        self._add_user_statistics(statistics)
         
         # Статистика пациентов
-        self._add_patient_statistics(start_date, end_date)
+        self._add_patient_statistics(statistics)
         
         # Статистика анализов
-        self._add_analysis_statistics(start_date, end_date)
+        self._add_analysis_statistics(statistics)
         
         # Статистика приемов
-        self._add_appointment_statistics(start_date, end_date)
+        self._add_appointment_statistics(statistics)
     
-    def _add_user_statistics(self):
+    def _add_user_statistics(self, statistics):
         """Добавление блока статистики пользователей"""
         group_box = QGroupBox("Статистика пользователей")
         layout = QVBoxLayout()
         
-        # Общее количество пользователей
-        users = db.fetch_all("SELECT role, COUNT(*) as count FROM users GROUP BY role")
-        
-        # Маппинг ролей для отображения
-        role_map = {
-            'admin': 'Администраторы',
-            'doctor': 'Врачи',
-            'lab': 'Лаборанты'
-        }
-        
         user_stats = QLabel("Пользователи в системе:")
         layout.addWidget(user_stats)
         
-        for role_stat in users:
-            role = role_stat.get('role', '')
-            count = role_stat.get('count', 0)
-            role_label = QLabel(f"• {role_map.get(role, role)}: {count}")
+        for role, count in statistics.users_by_role:
+            role_label = QLabel(f"• {self.ROLE_NAMES.get(role, role)}: {count}")
             layout.addWidget(role_label)
         
         group_box.setLayout(layout)
         self.statistics_layout.addWidget(group_box)
     
-    def _add_patient_statistics(self, start_date, end_date):
+    def _add_patient_statistics(self, statistics):
         """Добавление блока статистики пациентов"""
         group_box = QGroupBox("Статистика пациентов")
         layout = QVBoxLayout()
         
         # Общее количество пациентов
-        total_patients = db.fetch_one("SELECT COUNT(*) as count FROM patients")
-        total_label = QLabel(f"Всего пациентов: {total_patients.get('count', 0)}")
+        total_label = QLabel(f"Всего пациентов: {statistics.total_patients}")
         layout.addWidget(total_label)
         
         # Количество новых пациентов за период
-        new_patients = db.fetch_one(
-            "SELECT COUNT(*) as count FROM patients WHERE date(created_at) BETWEEN ? AND ?",
-            (start_date, end_date)
-        )
-        new_patients_label = QLabel(f"Новых пациентов за период: {new_patients.get('count', 0)}")
+        new_patients_label = QLabel(f"Новых пациентов за период: {statistics.new_patients}")
         layout.addWidget(new_patients_label)
         
         group_box.setLayout(layout)
         self.statistics_layout.addWidget(group_box)
     
-    def _add_analysis_statistics(self, start_date, end_date):
+    def _add_analysis_statistics(self, statistics):
         """Добавление блока статистики анализов"""
         group_box = QGroupBox("Статистика анализов")
         layout = QVBoxLayout()
         
         # Общее количество анализов за период
-        total_analyses = db.fetch_one(
-            "SELECT COUNT(*) as count FROM analysis_results WHERE date(result_date) BETWEEN ? AND ?",
-            (start_date, end_date)
-        )
-        total_label = QLabel(f"Всего анализов за период: {total_analyses.get('count', 0)}")
+        total_label = QLabel(f"Всего анализов за период: {statistics.total_analyses}")
         layout.addWidget(total_label)
         
         # Количество анализов по типам
-        analyses_by_type = db.fetch_all("""
-            SELECT at.name, COUNT(ar.id) as count
-            FROM analysis_results ar
-            JOIN analysis_types at ON ar.analysis_type_id = at.id
-            WHERE date(ar.result_date) BETWEEN ? AND ?
-            GROUP BY at.name
-            ORDER BY count DESC
-        """, (start_date, end_date))
-        
-        if analyses_by_type:
+        if statistics.analyses_by_type:
             types_label = QLabel("Анализы по типам:")
             layout.addWidget(types_label)
             
-            for type_stat in analyses_by_type:
-                type_name = type_stat.get('name', '')
-                count = type_stat.get('count', 0)
+            for type_name, count in statistics.analyses_by_type:
                 type_label = QLabel(f"• {type_name}: {count}")
                 layout.addWidget(type_label)
         else:
@@ -914,43 +859,31 @@ class SystemStatisticsWidget(QWidget):
         group_box.setLayout(layout)
         self.statistics_layout.addWidget(group_box)
     
-    def _add_appointment_statistics(self, start_date, end_date):
+    def _add_appointment_statistics(self, statistics):
         """Добавление блока статистики приемов"""
         group_box = QGroupBox("Статистика приемов")
         layout = QVBoxLayout()
         
         # Общее количество приемов за период
-        total_appointments = db.fetch_one(
-            "SELECT COUNT(*) as count FROM appointments WHERE date(appointment_date) BETWEEN ? AND ?",
-            (start_date, end_date)
-        )
-        total_label = QLabel(f"Всего приемов за период: {total_appointments.get('count', 0)}")
+        total_label = QLabel(f"Всего приемов за период: {statistics.total_appointments}")
         layout.addWidget(total_label)
         
         # Количество приемов по статусам
-        appointments_by_status = db.fetch_all("""
-            SELECT status, COUNT(*) as count
-            FROM appointments
-            WHERE date(appointment_date) BETWEEN ? AND ?
-            GROUP BY status
-        """, (start_date, end_date))
-        
-        # Маппинг статусов для отображения
-        status_map = {
-            'scheduled': 'Запланировано',
-            'completed': 'Завершено',
-            'cancelled': 'Отменено'
-        }
-        
-        if appointments_by_status:
+        if statistics.appointments_by_status:
             status_label = QLabel("Приемы по статусам:")
             layout.addWidget(status_label)
             
-            for status_stat in appointments_by_status:
-                status = status_stat.get('status', '')
-                count = status_stat.get('count', 0)
-                status_label = QLabel(f"• {status_map.get(status, status)}: {count}")
+            for status, count in statistics.appointments_by_status:
+                status_label = QLabel(f"• {self.APPOINTMENT_STATUS_NAMES.get(status, status)}: {count}")
                 layout.addWidget(status_label)
+            
+            # Количество приемов по врачам
+            doctors_label = QLabel("Приемы по врачам:")
+            layout.addWidget(doctors_label)
+            
+            for doctor_name, count in statistics.appointments_by_doctor:
+                doctor_label = QLabel(f"• {doctor_name}: {count}")
+                layout.addWidget(doctor_label)
         else:
             no_data_label = QLabel("Нет данных о приемах за указанный период")
             layout.addWidget(no_data_label)
@@ -959,157 +892,177 @@ class SystemStatisticsWidget(QWidget):
         self.statistics_layout.addWidget(group_box)
     
     def generate_excel_report(self):
-        """Создание отчета в формате Excel"""
-        try:
-            import xlwt
-            from datetime import datetime
-            
-            # Создаем книгу Excel
-            wb = xlwt.Workbook()
-            
-            # Создаем лист для общей статистики
-            ws_general = wb.add_sheet('Общая статистика')
-            
-            # Заголовки
-            ws_general.write(0, 0, "Медицинский центр - Статистика")
-            ws_general.write(1, 0, f"Период: {self.start_date.date().toString('dd.MM.yyyy')} - {self.end_date.date().toString('dd.MM.yyyy')}")
-            ws_general.write(2, 0, f"Дата создания отчета: {datetime.now().strftime('%d.%m.%Y %H:%M')}")
-            
-            # Получаем данные
-            start_date = self.start_date.date().toString("yyyy-MM-dd")
-            end_date = self.end_date.date().toString("yyyy-MM-dd")
-            
-            # Статистика пользователей
-            row = 4
-            ws_general.write(row, 0, "Статистика пользователей")
-            row += 1
-            
-            users = db.fetch_all("SELECT role, COUNT(*) as count FROM users GROUP BY role")
-            role_map = {
-                'admin': 'Администраторы',
-                'doctor': 'Врачи',
-                'lab': 'Лаборанты'
-            }
-            
-            for role_stat in users:
-                role = role_stat.get('role', '')
-                count = role_stat.get('count', 0)
-                ws_general.write(row, 0, f"{role_map.get(role, role)}")
-                ws_general.write(row, 1, count)
-                row += 1
-            
-            # Статистика пациентов
-            row += 1
-            ws_general.write(row, 0, "Статистика пациентов")
-            row += 1
-            
-            total_patients = db.fetch_one("SELECT COUNT(*) as count FROM patients")
-            ws_general.write(row, 0, "Всего пациентов")
-            ws_general.write(row, 1, total_patients.get('count', 0))
-            row += 1
-            
-            new_patients = db.fetch_one(
-                "SELECT COUNT(*) as count FROM patients WHERE date(created_at) BETWEEN ? AND ?",
-                (start_date, end_date)
-            )
-            ws_general.write(row, 0, "Новых пациентов за период")
-            ws_general.write(row, 1, new_patients.get('count', 0))
+        """Создание отчета в формате Excel (фоновая задача)"""
+        # Статистика берется в окне (тот же кэшированный результат, что и в окне статистики),
+        # список пациентов читается в задаче
+        start_date = self.start_date.date().toString("yyyy-MM-dd")
+        end_date = self.end_date.date().toString("yyyy-MM-dd")
+        statistics = statistics_service.get_statistics(start_date, end_date)
+        period = f"{self.start_date.date().toString('dd.MM.yyyy')} - {self.end_date.date().toString('dd.MM.yyyy')}"
+        
+        report_name = f"medical_report_Общий_список_пациентов_{datetime.now().strftime('%Y-%m-%d')}.xls"
+        job_manager.submit(
+            f"Статистика (Excel): {report_name}",
+            self.write_excel_report, os.path.abspath(report_name), statistics, period
+        )
+    
+    @classmethod
+    def write_excel_report(cls, job, report_path, statistics, period):
+        """
+        Запись отчета со статистикой и списком пациентов в Excel
+        
+        :param job: Фоновая задача (background_jobs.Job)
+        :param report_path: Путь к файлу .xls
+        :param statistics: PeriodStatistics
+        :param period: Период для заголовка отчета
+        :return: Путь к файлу
+        """
+        import xlwt
+        
+        # Создаем книгу Excel
+        wb = xlwt.Workbook()
+        
+        # Создаем лист для общей статистики
+        ws_general = wb.add_sheet('Общая статистика')
+        
+        # Заголовки
+        ws_general.write(0, 0, "Медицинский центр - Статистика")
+        ws_general.write(1, 0, f"Период: {period}")
+        ws_general.write(2, 0, f"Дата создания отчета: {datetime.now().strftime('%d.%m.%Y %H:%M')}")
+        
+        # Статистика пользователей
+        row = 4
+        ws_general.write(row, 0, "Статистика пользователей")
+        row += 1
+        
+        for role, count in statistics.users_by_role:
+            ws_general.write(row, 0, f"{cls.ROLE_NAMES.get(role, role)}")
+            ws_general.write(row, 1, count)
             row += 1
-            
-            # Статистика анализов
+        
+        # Статистика пациентов
+        row += 1
+        ws_general.write(row, 0, "Статистика пациентов")
+        row += 1
+        
+        ws_general.write(row, 0, "Всего пациентов")
+        ws_general.write(row, 1, statistics.total_patients)
+        row += 1
+        
+        ws_general.write(row, 0, "Новых пациентов за период")
+        ws_general.write(row, 1, statistics.new_patients)
+        row += 1
+        
+        # Статистика анализов
+        row += 1
+        ws_general.write(row, 0, "Статистика анализов")
+        row += 1
+        
+        for type_name, count in statistics.analyses_by_type:
+            ws_general.write(row, 0, type_name)
+            ws_general.write(row, 1, count)
             row += 1
-            ws_general.write(row, 0, "Статистика анализов")
+        
+        # Статистика приемов
+        row += 1
+        ws_general.write(row, 0, "Статистика приемов")
+        row += 1
+        
+        ws_general.write(row, 0, "Всего приемов за период")
+        ws_general.write(row, 1, statistics.total_appointments)
+        row += 1
+        
+        for status, count in statistics.appointments_by_status:
+            ws_general.write(row, 0, cls.APPOINTMENT_STATUS_NAMES.get(status, status))
+            ws_general.write(row, 1, count)
             row += 1
-            
-            analyses_by_type = db.fetch_all("""
-                SELECT at.name, COUNT(ar.id) as count
-                FROM analysis_results ar
-                JOIN analysis_types at ON ar.analysis_type_id = at.id
-                WHERE date(ar.result_date) BETWEEN ? AND ?
-                GROUP BY at.name
-                ORDER BY count DESC
-            """, (start_date, end_date))
-            
-            for type_stat in analyses_by_type:
-                type_name = type_stat.get('name', '')
-                count = type_stat.get('count', 0)
-                ws_general.write(row, 0, type_name)
-                ws_general.write(row, 1, count)
-                row += 1
-            
-            # Создаем лист со списком пациентов
-            ws_patients = wb.add_sheet('Список пациентов')
-            
-            # Заголовки столбцов
-            headers = ["ID", "ФИО", "Дата рождения", "Телефон", "Email", "Адрес"]
-            for col, header in enumerate(headers):
-                ws_patients.write(0, col, header)
-            
-            # Данные пациентов
-            patients = db.get_all_patients()
-            for row, patient in enumerate(patients, 1):
-                ws_patients.write(row, 0, patient.get('id', ''))
-                ws_patients.write(row, 1, patient.get('full_name', ''))
-                ws_patients.write(row, 2, patient.get('birth_date', ''))
-                ws_patients.write(row, 3, patient.get('phone', ''))
-                ws_patients.write(row, 4, patient.get('email', ''))
-                ws_patients.write(row, 5, patient.get('address', ''))
-            
-            # Сохраняем отчет
-            report_name = f"medical_report_Общий_список_пациентов_{datetime.now().strftime('%Y-%m-%d')}.xls"
-            wb.save(report_name)
-            
-            QMessageBox.information(self, "Отчет создан", f"Отчет успешно сохранен: {report_name}")
         
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при создании отчета: {str(e)}")
+        # Создаем лист со списком пациентов
+        ws_patients = wb.add_sheet('Список пациентов')
+        
+        # Заголовки столбцов
+        headers = ["ID", "ФИО", "Дата рождения", "Телефон", "Email", "Адрес"]
+        for col, header in enumerate(headers):
+            ws_patients.write(0, col, header)
+        
+        # Данные пациентов
+        patients = db.get_all_patients()
+        job.set_progress(0, len(patients), "список пациентов")
+        for row, patient in enumerate(patients, 1):
+            ws_patients.write(row, 0, patient.get('id', ''))
+            ws_patients.write(row, 1, patient.get('full_name', ''))
+            ws_patients.write(row, 2, patient.get('birth_date', ''))
+            ws_patients.write(row, 3, patient.get('phone', ''))
+            ws_patients.write(row, 4, patient.get('email', ''))
+            ws_patients.write(row, 5, patient.get('address', ''))
+            job.set_progress(row)
+        
+        # Сохраняем отчет
+        with output_file(report_path):
+            wb.save(report_path)
+        return report_path
     
     def generate_csv_report(self):
-        """Создание отчета в формате CSV"""
-        try:
-            import csv
-            from datetime import datetime
+        """Создание отчета в формате CSV (фоновая задача)"""
+        report_name = f"medical_report_Общий_список_пациентов_{datetime.now().strftime('%Y-%m-%d')}.csv"
+        job_manager.submit(
+            f"Список пациентов (CSV): {report_name}",
+            self.write_csv_report, os.path.abspath(report_name)
+        )
+    
+    @staticmethod
+    def write_csv_report(job, report_path):
+        """
+        Запись списка пациентов в CSV
+        
+        :param job: Фоновая задача (background_jobs.Job)
+        :param report_path: Путь к файлу .csv
+        :return: Путь к файлу
+        """
+        import csv
+        
+        # Получаем данные
+        patients = db.get_all_patients()
+        job.set_progress(0, len(patients), "список пациентов")
+        
+        with output_file(report_path), open(report_path, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
             
-            # Получаем данные
-            patients = db.get_all_patients()
+            # Заголовок отчета
+            writer.writerow(["Медицинский центр - Список пациентов"])
+            writer.writerow([f"Дата создания: {datetime.now().strftime('%d.%m.%Y %H:%M')}"])
+            writer.writerow([])  # Пустая строка
             
-            # Создаем CSV-файл
-            report_name = f"medical_report_Общий_список_пациентов_{datetime.now().strftime('%Y-%m-%d')}.csv"
+            # Заголовки столбцов
+            writer.writerow(["ID", "ФИО", "Дата рождения", "Телефон", "Email", "Адрес"])
             
-            with open(report_name, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                
-                # Заголовок отчета
-                writer.writerow(["Медицинский центр - Список пациентов"])
-                writer.writerow([f"Дата создания: {datetime.now().strftime('%d.%m.%Y %H:%M')}"])
-                writer.writerow([])  # Пустая строка
-                
-                # Заголовки столбцов
-                writer.writerow(["ID", "ФИО", "Дата рождения", "Телефон", "Email", "Адрес"])
-                
-                # Данные пациентов
-                for patient in patients:
-                    writer.writerow([
-                        patient.get('id', ''),
-                        patient.get('full_name', ''),
-                        patient.get('birth_date', ''),
-                        patient.get('phone', ''),
-                        patient.get('email', ''),
-                        patient.get('address', '')
-                    ])
-            
-            QMessageBox.information(self, "Отчет создан", f"Отчет CSV успешно сохранен: {report_name}")
-        
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при создании отчета CSV: {str(e)}")
+            # Данные пациентов
+            for number, patient in enumerate(patients, 1):
+                writer.writerow([
+                    patient.get('id', ''),
+                    patient.get('full_name', ''),
+                    patient.get('birth_date', ''),
+                    patient.get('phone', ''),
+                    patient.get('email', ''),
+                    patient.get('address', '')
+                ])
+                job.set_progress(number)
+        
+        return report_path
 
 
 class PatientListWidget(QWidget):
     """Виджет для отображения списка пациентов"""
     
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, load=True):
+        """
+        :param load: Загрузить пациентов сразу; при False данные
+                     передаются через show_data() (см. lazy_tabs)
+        """
         super().__init__(parent)
         self.setup_ui()
+        if load:
+            self.load_patients()
     
     def setup_ui(self):
         """Настройка интерфейса"""
@@ -1134,10 +1087,15 @@ class PatientListWidget(QWidget):
         add_button.clicked.connect(self.add_patient)
         top_panel.addWidget(add_button)
         
-        # Поле поиска
+        # Поле поиска; поиск выполняется после паузы в наборе
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Поиск пациента")
-        self.search_input.textChanged.connect(self.filter_patients)
+        self.search_input.setPlaceholderText("Поиск пациента: ФИО, телефон или email")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY)
+        self.search_timer.timeout.connect(self.filter_patients)
+        self.search_input.textChanged.connect(self.search_timer.start)
+        self.search_input.returnPressed.connect(self.filter_patients)
         top_panel.addWidget(self.search_input)
         
         # Кнопка обновления списка
@@ -1149,95 +1107,49 @@ class PatientListWidget(QWidget):
         
         layout.addLayout(top_panel)
         
-        # Таблица пациентов
-        self.patients_table = QTableWidget()
-        self.patients_table.setColumnCount(7)
-        self.patients_table.setHorizontalHeaderLabels([
-            "ID", "ФИО", "Дата рождения", "Пол", "Телефон", "Email", "Действия"
-        ])
+        # Таблица пациентов (строки загружаются порциями по мере прокрутки)
+        self.patients_model = LazyQueryTableModel([
+            TableColumn("ID", 'id'),
+            TableColumn("ФИО", 'full_name'),
+            TableColumn("Дата рождения", 'birth_date'),
+            TableColumn("Пол", 'gender', display=lambda p: p.get('gender') or 'Не указан'),
+            TableColumn("Телефон", 'phone'),
+            TableColumn("Email", 'email'),
+            TableColumn("Действия")
+        ], parent=self)
+        
+        self.patients_table = QTableView()
+        self.patients_table.setModel(self.patients_model)
+        self.patients_table.setItemDelegateForColumn(6, ActionButtonsDelegate([
+            RowAction("Редактировать", self.edit_patient),
+            RowAction("Запись", self.add_appointment),
+            RowAction("Удалить", self.delete_patient)
+        ], self.patients_table))
         self.patients_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.patients_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         self.patients_table.setSortingEnabled(True)
         
         layout.addWidget(self.patients_table)
-        
-        # Загрузка пациентов
-        self.load_patients()
     
     def load_patients(self):
-        """Загрузка списка пациентов"""
-        patients = db.get_all_patients()
-        self.all_patients = patients  # Сохраняем для фильтрации
-        
-        self.update_table(patients)
-    
-    def update_table(self, patients):
-        """Обновление таблицы пациентов"""
-        self.patients_table.setRowCount(len(patients))
-        
-        for row, patient in enumerate(patients):
-            # ID
-            self.patients_table.setItem(row, 0, QTableWidgetItem(str(patient.get('id', ''))))
-            
-            # ФИО
-            self.patients_table.setItem(row, 1, QTableWidgetItem(patient.get('full_name', '')))
-            
-            # Дата рождения
-            self.patients_table.setItem(row, 2, QTableWidgetItem(patient.get('birth_date', '')))
-            
-            # Пол (может отсутствовать в базе)
-            gender = patient.get('gender', 'Не указан')
-            self.patients_table.setItem(row, 3, QTableWidgetItem(gender))
-            
-            # Телефон
-            self.patients_table.setItem(row, 4, QTableWidgetItem(patient.get('phone', '')))
-            
-            # Email
-            self.patients_table.setItem(row, 5, QTableWidgetItem(patient.get('email', '')))
-            
-            # Кнопки действий
-            actions_widget = QWidget()
-            actions_layout = QHBoxLayout(actions_widget)
-            actions_layout.setContentsMargins(0, 0, 0, 0)
-            
-            edit_button = QPushButton("Редактировать")
-            edit_button.setStyleSheet("min-width: 80px;")
-            edit_button.clicked.connect(lambda checked, p=patient: self.edit_patient(p))
-            actions_layout.addWidget(edit_button)
-            
-            add_appointment_button = QPushButton("Запись")
-            add_appointment_button.setStyleSheet("min-width: 80px;")
-            add_appointment_button.clicked.connect(lambda checked, p=patient: self.add_appointment(p))
-            actions_layout.addWidget(add_appointment_button)
-            
-            delete_button = QPushButton("Удалить")
-            delete_button.setStyleSheet("min-width: 80px;")
-            delete_button.clicked.connect(lambda checked, p=patient: self.delete_patient(p))
-            actions_layout.addWidget(delete_button)
-            
-            self.patients_table.setCellWidget(row, 6, actions_widget)
+        """Загрузка списка пациентов с учетом строки поиска"""
+        self.filter_patients()
     
     def filter_patients(self):
         """Фильтрация пациентов по поисковому запросу"""
-        search_text = self.search_input.text().lower()
-        
-        if not search_text:
-            # Если строка поиска пуста, показываем всех пациентов
-            self.update_table(self.all_patients)
-            return
-        
-        # Фильтрация пациентов
-        filtered_patients = []
-        for patient in self.all_patients:
-            full_name = patient.get('full_name', '').lower()
-            phone = patient.get('phone', '').lower()
-            email = patient.get('email', '').lower()
-            
-            if (search_text in full_name or 
-                search_text in phone or 
-                search_text in email):
-                filtered_patients.append(patient)
-        
-        self.update_table(filtered_patients)
+        self.search_timer.stop()
+        # Полнотекстовый поиск (patient_search): лучшие совпадения по ФИО,
+        # телефону и email; при пустой строке - все пациенты
+        query, params = patient_search.search_query(self.search_input.text())
+        self.patients_model.set_query(query, params)
+    
+    def data_loader(self):
+        """Функция чтения первой порции пациентов для фонового потока"""
+        return self.patients_model.first_rows_loader(*patient_search.search_query(self.search_input.text()))
+    
+    def show_data(self, loaded):
+        """Отображение пациентов, прочитанных data_loader()"""
+        self.patients_model.set_loaded_query(loaded)
     
     def add_patient(self):
         """Добавление нового пациента"""
@@ -1544,11 +1456,17 @@ class AddPatientDialog(QDialog):
 class AnalysisResultsWidget(QWidget):
     """Виджет для работы с результатами анализов"""
     
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, load=True):
+        """
+        :param load: Загрузить результаты сразу; при False данные
+                     передаются через show_data() (см. lazy_tabs)
+        """
         super().__init__(parent)
         self.setup_ui()
         self.document_generator = DocumentGenerator()
         self.email_sender = EmailSender(test_mode=False)
+        if load:
+            self.refresh_analysis_results()
     
     def setup_ui(self):
         """Настройка интерфейса"""
@@ -1563,26 +1481,16 @@ class AnalysisResultsWidget(QWidget):
         self.patient_combo = QComboBox()
         self.patient_combo.setMinimumWidth(200)
         
-        # Добавляем опцию "Все пациенты"
-        self.patient_combo.addItem("Все пациенты", None)
-        
-        # Загружаем список пациентов
-        patients = db.get_all_patients()
-        for patient in patients:
-            self.patient_combo.addItem(patient.get('full_name', ''), patient.get('id'))
+        # Общий список пациентов с опцией "Все пациенты"
+        reference_cache.bind_combo(self.patient_combo, 'patients', "Все пациенты")
         
         # Выбор типа анализа
         analysis_type_label = QLabel("Тип анализа:")
         self.analysis_type_combo = QComboBox()
         self.analysis_type_combo.setMinimumWidth(150)
         
-        # Добавляем опцию "Все типы"
-        self.analysis_type_combo.addItem("Все типы", None)
-        
-        # Загружаем типы анализов
-        analysis_types = db.fetch_all("SELECT * FROM analysis_types")
-        for analysis_type in analysis_types:
-            self.analysis_type_combo.addItem(analysis_type.get('name', ''), analysis_type.get('id'))
+        # Общий список типов анализов с опцией "Все типы"
+        reference_cache.bind_combo(self.analysis_type_combo, 'analysis_types', "Все типы")
         
         # Выбор периода дат
         date_from_label = QLabel("С:")
@@ -1617,13 +1525,29 @@ class AnalysisResultsWidget(QWidget):
         filters_group.setLayout(filters_layout)
         layout.addWidget(filters_group)
         
-        # Таблица результатов анализов
-        self.results_table = QTableWidget()
-        self.results_table.setColumnCount(7)
-        self.results_table.setHorizontalHeaderLabels([
-            "Дата", "Пациент", "Тип анализа", "Статус", "Лаборант", "Документы", "Email"
-        ])
+        # Таблица результатов анализов (строки загружаются порциями по мере прокрутки)
+        self.results_model = LazyQueryTableModel([
+            TableColumn("Дата", 'result_date', display=lambda r: self.format_result_date(r.get('result_date', ''))),
+            TableColumn("Пациент", 'patient_name',
+                        display=lambda r: f"{r.get('patient_name', '')} ({r.get('birth_date', '')})"),
+            TableColumn("Тип анализа", 'analysis_type'),
+            TableColumn("Статус", 'status', display=lambda r: self.translate_status(r.get('status', ''))),
+            TableColumn("Лаборант", 'lab_technician'),
+            TableColumn("Документы"),
+            TableColumn("Email")
+        ], parent=self, row_background=abnormal_result_background, rows_loaded=analysis_flags.flag_results)
+        
+        self.results_table = QTableView()
+        self.results_table.setModel(self.results_model)
+        self.results_table.setItemDelegateForColumn(5, ActionButtonsDelegate([
+            RowAction("Просмотр", lambda r: self.view_analysis_result(r['id'])),
+            RowAction("Word", lambda r: self.export_to_word(r['id']))
+        ], self.results_table))
+        self.results_table.setItemDelegateForColumn(6, ActionButtonsDelegate([
+            RowAction("Отправить", lambda r: self.send_by_email(r['id']))
+        ], self.results_table))
         self.results_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.results_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         self.results_table.setSortingEnabled(True)
         
         layout.addWidget(self.results_table)
@@ -1647,12 +1571,22 @@ class AnalysisResultsWidget(QWidget):
         actions_layout.addWidget(send_report_button)
         
         layout.addLayout(actions_layout)
-        
-        # Загрузка результатов анализов
-        self.refresh_analysis_results()
     
     def refresh_analysis_results(self):
         """Обновление списка результатов анализов с учетом фильтров"""
+        # Обновление таблицы: строки читаются из курсора по мере прокрутки
+        self.results_model.set_query(*self.analysis_results_query())
+    
+    def data_loader(self):
+        """Функция чтения первой порции результатов анализов для фонового потока"""
+        return self.results_model.first_rows_loader(*self.analysis_results_query())
+    
+    def show_data(self, loaded):
+        """Отображение результатов анализов, прочитанных data_loader()"""
+        self.results_model.set_loaded_query(loaded)
+    
+    def analysis_results_query(self):
+        """Запрос результатов анализов с учетом фильтров: (запрос, параметры)"""
         # Получение параметров фильтрации
         patient_id = self.patient_combo.currentData()
         analysis_type_id = self.analysis_type_combo.currentData()
@@ -1660,30 +1594,21 @@ class AnalysisResultsWidget(QWidget):
         to_date = self.date_to.date().toString("yyyy-MM-dd")
         
         # Отладочная информация
-        print(f"Применяем фильтры: пациент={patient_id}, тип анализа={analysis_type_id}, даты с {from_date} по {to_date}")
+        logger.debug("Применяем фильтры: пациент=%s, тип анализа=%s, даты с %s по %s",
+                     patient_id, analysis_type_id, from_date, to_date)
         
         # Запрос к базе данных
         # Составление условий запроса
-        conditions = []
-        params = []
-        
-        if patient_id:
-            conditions.append("ar.patient_id = ?")
-            params.append(patient_id)
+        conditions = QueryConditions()
+        conditions.add_equals("ar.patient_id", patient_id)
+        conditions.add_equals("ar.analysis_type_id", analysis_type_id)
         
-        if analysis_type_id:
-            conditions.append("ar.analysis_type_id = ?")
-            params.append(analysis_type_id)
-        
-        # Корректировка запроса для фильтрации по дате
-        conditions.append("date(ar.result_date) >= ?")
-        params.append(from_date)
-        
-        conditions.append("date(ar.result_date) <= ?")
-        params.append(to_date)
+        # Фильтрация по дате полуоткрытым интервалом, чтобы использовался индекс
+        conditions.add_date_range("ar.result_date", from_date, to_date)
         
         # Формирование и выполнение запроса
-        where_clause = " AND ".join(conditions) if conditions else "1=1"
+        where_clause = conditions.where_clause()
+        params = conditions.params
         
         query = f"""
             SELECT ar.id as id, p.full_name as patient_name, p.birth_date, at.name as analysis_type, 
@@ -1695,92 +1620,20 @@ class AnalysisResultsWidget(QWidget):
             WHERE {where_clause}
             ORDER BY ar.result_date DESC
         """
-        
-        print(f"SQL запрос: {query}")
-        print(f"Параметры: {params}")
-        
-        results = db.fetch_all(query, tuple(params))
-        
-        # Отладочный вывод результатов запроса
-        print(f"Получено {len(results)} результатов анализов")
-        if len(results) > 0:
-            print(f"Первый результат: {results[0]}")
-        
-        # Обновление таблицы
-        self.results_table.setRowCount(len(results))
-        
-        for row, result in enumerate(results):
-            # Проверяем, содержит ли результат ID
-            if 'id' not in result:
-                print(f"ОШИБКА: Запись не содержит ID для строки {row}")
-                continue
-            
-            # Распаковка данных
-            result_id = result.get('id')
-            
-            # Проверка, что ID существует и является числом
-            if result_id is None:
-                print(f"ID результата отсутствует в данных")
-                continue
-            
-            # Гарантируем, что ID - целое число
-            try:
-                result_id = int(result_id)
-            except (ValueError, TypeError):
-                print(f"Ошибка преобразования ID {result_id} в число")
-                continue
-            
-            patient_name = result.get('patient_name', '')
-            birth_date = result.get('birth_date', '')
-            analysis_type = result.get('analysis_type', '')
-            result_date = result.get('result_date', '')
-            lab_technician = result.get('lab_technician', '')
-            status = result.get('status', '')
-            
-            # Форматирование даты для отображения
-            try:
-                # Обрабатываем разные форматы даты
-                if ' ' in result_date:  # Если есть время в формате
-                    date_obj = datetime.strptime(result_date, "%Y-%m-%d %H:%M:%S")
-                    formatted_date = date_obj.strftime("%d.%m.%Y %H:%M")
-                else:
-                    date_obj = datetime.strptime(result_date, "%Y-%m-%d")
-                    formatted_date = date_obj.strftime("%d.%m.%Y")
-            except Exception as e:
-                print(f"Ошибка форматирования даты {result_date}: {str(e)}")
-                formatted_date = result_date
-            
-            # Установка данных в ячейки таблицы
-            self.results_table.setItem(row, 0, QTableWidgetItem(formatted_date))
-            self.results_table.setItem(row, 1, QTableWidgetItem(f"{patient_name} ({birth_date})"))
-            self.results_table.setItem(row, 2, QTableWidgetItem(analysis_type))
-            self.results_table.setItem(row, 3, QTableWidgetItem(self.translate_status(status)))
-            self.results_table.setItem(row, 4, QTableWidgetItem(lab_technician))
-            
-            # Кнопки для работы с документами
-            doc_widget = QWidget()
-            doc_layout = QHBoxLayout(doc_widget)
-            doc_layout.setContentsMargins(0, 0, 0, 0)
-            
-            view_button = QPushButton("Просмотр")
-            view_button.setProperty("result_id", result_id)
-            view_button.clicked.connect(self.view_analysis_result)
-            
-            export_button = QPushButton("Word")
-            export_button.setProperty("result_id", result_id)
-            export_button.clicked.connect(self.export_to_word)
-            
-            doc_layout.addWidget(view_button)
-            doc_layout.addWidget(export_button)
-            
-            self.results_table.setCellWidget(row, 5, doc_widget)
-            
-            # Кнопка отправки по email
-            email_button = QPushButton("Отправить")
-            email_button.setProperty("result_id", result_id)
-            email_button.clicked.connect(self.send_by_email)
-            
-            self.results_table.setCellWidget(row, 6, email_button)
+        return query, params
+    
+    def format_result_date(self, result_date):
+        """Форматирование даты результата анализа для отображения"""
+        try:
+            # Обрабатываем разные форматы даты
+            if ' ' in result_date:  # Если есть время в формате
+                date_obj = datetime.strptime(result_date, "%Y-%m-%d %H:%M:%S")
+                return date_obj.strftime("%d.%m.%Y %H:%M")
+            date_obj = datetime.strptime(result_date, "%Y-%m-%d")
+            return date_obj.strftime("%d.%m.%Y")
+        except Exception as e:
+            logger.debug("Ошибка форматирования даты %s: %s", result_date, e)
+            return result_date
     
     def clear_filters(self):
         """Сброс фильтров"""
@@ -1802,11 +1655,12 @@ class AnalysisResultsWidget(QWidget):
         }
         return status_map.get(status, status)
     
-    def view_analysis_result(self):
+    def view_analysis_result(self, result_id=None):
         """Просмотр результата анализа"""
-        # Получение ID результата
-        sender = self.sender()
-        result_id = sender.property("result_id")
+        # Получение ID результата, если он не был передан
+        if result_id is None:
+            sender = self.sender()
+            result_id = sender.property("result_id")
         
         # Проверяем, что ID является корректным
         try:
@@ -1900,7 +1754,7 @@ class AnalysisResultsWidget(QWidget):
             
             # Кнопка экспорта в Word
             word_button = QPushButton("Экспорт в Word")
-            word_button.clicked.connect(lambda: report_generator.export_analysis_to_word(result_id, dialog))
+            word_button.clicked.connect(lambda: self.export_to_word(result_id, dialog))
             buttons_layout.addWidget(word_button)
             
             # Кнопка отправки по email
@@ -1931,14 +1785,13 @@ class AnalysisResultsWidget(QWidget):
         if result_id is None:
             sender = self.sender()
             result_id = sender.property("result_id")
-            print(f"Получен ID из кнопки: {result_id}, тип: {type(result_id)}")
+            logger.debug("Получен ID из кнопки: %r", result_id)
         
         # Проверка, что ID является числом и больше 0
         try:
             result_id = int(result_id) if result_id is not None else 0
-            print(f"Преобразован ID в число: {result_id}")
             if result_id <= 0:
-                print(f"Некорректный ID: {result_id} (должен быть > 0)")
+                logger.warning("Некорректный ID результата анализа: %s", result_id)
                 # Используем новый класс диалога вместо QMessageBox
                 error_dialog = ErrorDialog(
                     dialog or self,
@@ -1950,11 +1803,10 @@ class AnalysisResultsWidget(QWidget):
                 
             # Дополнительная проверка существования записи
             check_query = "SELECT id FROM analysis_results WHERE id = ?"
-            print(f"Проверка существования записи: {check_query} с ID={result_id}")
             result_exists = db.fetch_one(check_query, (result_id,))
             
             if not result_exists:
-                print(f"Результат с ID {result_id} не найден в БД")
+                logger.warning("Результат с ID %s не найден в БД", result_id)
                 error_dialog = ErrorDialog(
                     dialog or self,
                     f"Результат анализа не найден в базе данных",
@@ -1962,11 +1814,9 @@ class AnalysisResultsWidget(QWidget):
                 )
                 error_dialog.exec()
                 return
-                
-            print(f"Результат существует: {result_exists}")
             
         except (ValueError, TypeError) as e:
-            print(f"Ошибка при преобразовании ID: {e}")
+            logger.warning("Ошибка при преобразовании ID: %s", e)
             error_dialog = ErrorDialog(
                 dialog or self,
                 "Ошибка при обработке данных анализа",
@@ -1976,6 +1826,7 @@ class AnalysisResultsWidget(QWidget):
             return
             
         # Используем функцию из модуля report_generator
+        import report_generator
         report_generator.export_analysis_to_word(result_id, dialog or self)
     
     def export_all_to_word(self):
@@ -1996,6 +1847,7 @@ class AnalysisResultsWidget(QWidget):
         filters['to_date'] = self.date_to.date().toString("yyyy-MM-dd")
         
         # Используем функцию из модуля report_generator
+        import report_generator
         report_generator.export_all_analyses_to_word(self, filters)
     
     def send_by_email(self, result_id=None, dialog=None):
@@ -2095,41 +1947,27 @@ class AnalysisResultsWidget(QWidget):
             # Генерируем документ
             file_path = self.document_generator.generate_analysis_report(result_details)
             
-            # Формируем HTML-сообщение
-            message = f"""
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; }}
-                    h2 {{ color: #2c3e50; }}
-                    table {{ border-collapse: collapse; width: 100%; }}
-                    th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                    th {{ background-color: #f2f2f2; }}
-                </style>
-            </head>
-            <body>
-                <h2>Результаты анализа: {result_details['analysis_type']['name']}</h2>
-                <p>Уважаемый(ая) <strong>{result_details['patient']['full_name']}</strong>!</p>
-                <p>Направляем Вам результаты анализа от {result_details['date_taken']}.</p>
-                <p>Полные результаты доступны во вложенном файле.</p>
-                <p>С уважением,<br>Медицинский центр</p>
-            </body>
-            </html>
-            """
+            # Формируем HTML-сообщение по общему шаблону
+            message = render_analysis_notification(
+                result_details['patient']['full_name'],
+                result_details['analysis_type']['name'],
+                result_details['date_taken']
+            )
             
             # Отправляем email
             success = self.email_sender.send_email(
                 recipient_email=email,
                 subject=f"Результаты анализа: {result_details['analysis_type']['name']}",
                 message=message,
-                attachments=[file_path]
+                attachments=[file_path],
+                analysis_result_id=result_details['id']
             )
             
             if success:
                 QMessageBox.information(
                     dialog or self, 
                     "Успех", 
-                    f"Результаты анализа отправлены на email: {email}"
+                    f"Результаты анализа поставлены в очередь отправки на email: {email}"
                 )
                 
                 # Закрываем диалог ввода email, если он был открыт
@@ -2244,7 +2082,7 @@ class AnalysisResultsWidget(QWidget):
             )
             
             if success:
-                QMessageBox.information(dialog, "Успех", f"Отчет успешно отправлен на email: {email}")
+                QMessageBox.information(dialog, "Успех", f"Отчет поставлен в очередь отправки на email: {email}")
                 dialog.accept()
             else:
                 QMessageBox.warning(dialog, "Ошибка", "Не удалось отправить отчет")
@@ -2289,11 +2127,12 @@ class AnalysisResultsWidget(QWidget):
             self.refresh_appointments()
             QMessageBox.warning(self, "Примечание", f"Произошла ошибка при обновлении записи: {str(e)}")
     
-    def delete_appointment(self):
+    def delete_appointment(self, appointment_id=None):
         """Удаление записи на прием"""
-        # Получаем ID записи
-        sender = self.sender()
-        appointment_id = sender.property("appointment_id")
+        # Получаем ID записи, если он не был передан
+        if appointment_id is None:
+            sender = self.sender()
+            appointment_id = sender.property("appointment_id")
         
         # Запрашиваем подтверждение
         reply = QMessageBox.question(
@@ -2333,8 +2172,8 @@ class AnalysisResultsWidget(QWidget):
         Экспорт результатов анализов в Excel
         
         Args:
-            return_path (bool): Если True, возвращает путь к созданному файлу
-                               вместо отображения сообщения
+            return_path (bool): Если True, файл создается сразу и возвращается
+                               путь к нему; иначе экспорт выполняет фоновая задача
                                
         Returns:
             str: Путь к файлу Excel, если return_path=True, иначе None
@@ -2350,74 +2189,71 @@ class AnalysisResultsWidget(QWidget):
                 analysis_type = f"_{self.analysis_type_combo.currentText().replace(' ', '_')}"
             
             current_date = QDate.currentDate().toString("yyyy-MM-dd")
-            filename = f"medical_report_{patient_name}{analysis_type}_{current_date}.xls"
+            filename = f"medical_report_{patient_name}{analysis_type}_{current_date}.xlsx"
             
             # Путь к файлу
             filepath = os.path.join(os.path.dirname(os.path.abspath(__file__)), filename)
             
-            # Создание Excel файла
-            workbook = xlwt.Workbook()
-            sheet = workbook.add_sheet("Результаты анализов")
-            
-            # Стили
-            header_style = xlwt.easyxf('font: bold on; align: wrap on, vert centre, horiz center')
-            normal_style = xlwt.easyxf('align: wrap on, vert centre, horiz left')
-            date_style = xlwt.easyxf('align: wrap on, vert centre, horiz left', num_format_str='DD.MM.YYYY')
-            
-            # Заголовки
-            headers = ["ID", "Дата", "Пациент", "Дата рождения", "Тип анализа", "Статус", "Лаборант"]
-            for col, header in enumerate(headers):
-                sheet.write(0, col, header, header_style)
-                sheet.col(col).width = 256 * 20  # Ширина столбца
-            
-            # Данные
-            for row in range(self.results_table.rowCount()):
-                # ID берем из скрытого свойства кнопки просмотра
-                doc_widget = self.results_table.cellWidget(row, 5)
-                view_button = doc_widget.layout().itemAt(0).widget()
-                result_id = view_button.property("result_id")
-                
-                sheet.write(row + 1, 0, result_id, normal_style)
-                
-                # Дата
-                date_text = self.results_table.item(row, 0).text()
-                sheet.write(row + 1, 1, date_text, normal_style)
-                
-                # Пациент с датой рождения
-                patient_text = self.results_table.item(row, 1).text()
-                patient_parts = patient_text.split(" (")
-                patient_name = patient_parts[0]
-                birth_date = patient_parts[1].rstrip(")") if len(patient_parts) > 1 else ""
-                
-                sheet.write(row + 1, 2, patient_name, normal_style)
-                sheet.write(row + 1, 3, birth_date, normal_style)
-                
-                # Тип анализа
-                sheet.write(row + 1, 4, self.results_table.item(row, 2).text(), normal_style)
-                
-                # Статус
-                sheet.write(row + 1, 5, self.results_table.item(row, 3).text(), normal_style)
-                
-                # Лаборант
-                sheet.write(row + 1, 6, self.results_table.item(row, 4).text(), normal_style)
-            
-            # Сохранение файла
-            workbook.save(filepath)
-            
             if return_path:
+                # Отчет для отправки по email нужен сразу
+                from excel_export import export_rows
+                export_rows(filepath, "Результаты анализов", self.excel_columns(), self.results_model.iter_all_rows())
                 return filepath
             
-            QMessageBox.information(
-                self, 
-                "Экспорт завершен", 
-                f"Отчет сохранен в файл: {filepath}"
+            # Строки читаются фоновой задачей по запросу модели таблицы
+            query = self.results_model.current_query()
+            rows = None if query else list(self.results_model.iter_all_rows())
+            job_manager.submit(
+                f"Результаты анализов (Excel): {filename}",
+                self.write_results_excel, filepath, query, rows
             )
-            
             return None
             
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось создать отчет: {str(e)}")
             return None
+    
+    def excel_columns(self):
+        """Столбцы отчета Excel с результатами анализов"""
+        from excel_export import ExcelColumn
+        return [
+            ExcelColumn("ID", lambda result: result.get('id')),
+            ExcelColumn("Дата", lambda result: self.format_result_date(result.get('result_date', ''))),
+            ExcelColumn("Пациент", lambda result: result.get('patient_name', '')),
+            ExcelColumn("Дата рождения", lambda result: result.get('birth_date', '')),
+            ExcelColumn("Тип анализа", lambda result: result.get('analysis_type', '')),
+            ExcelColumn("Статус", lambda result: self.translate_status(result.get('status', ''))),
+            ExcelColumn("Лаборант", lambda result: result.get('lab_technician', '')),
+        ]
+    
+    def write_results_excel(self, job, filepath, query, rows):
+        """
+        Запись результатов анализов в Excel (выполняется фоновой задачей)
+        
+        Args:
+            job (Job): Фоновая задача для прогресса и отмены
+            filepath (str): Путь к файлу .xlsx
+            query (tuple): Запрос модели таблицы (запрос, параметры) или None
+            rows (list): Строки таблицы, если запроса нет
+        
+        Returns:
+            str: Путь к файлу
+        """
+        if query is not None:
+            # Строки читаются курсором и сразу записываются в файл,
+            # без ограничения количества строк
+            count = db.fetch_one(f"SELECT COUNT(*) FROM ({query[0]})", query[1], row_format='tuple')
+            total = count[0] if count else 0
+            rows = iter_query_rows(*query)
+        else:
+            total = len(rows)
+        
+        from excel_export import export_rows
+        job.set_progress(0, total, "запись строк")
+        with output_file(filepath):
+            count = export_rows(filepath, "Результаты анализов", self.excel_columns(), rows, progress=job.set_progress)
+        job.set_progress(count)
+        return filepath
 
 
 class AdminWindow(QMainWindow):
@@ -2478,30 +2314,108 @@ class AdminWindow(QMainWindow):
         # Создание вкладок
         self.tab_widget = QTabWidget()
         
+        # Вкладки создаются при первом показе, данные читаются в фоновом
+        # потоке; при повторном показе вкладка обновляется, только если
+        # изменились показываемые ею таблицы (lazy_tabs)
+        
         # Вкладка пользователей
-        self.users_tab = UserListWidget()
+        self.users_tab = LazyTab(
+            lambda: UserListWidget(load=False),
+            UserListWidget.data_loader, UserListWidget.show_data,
+            depends_on=('users',)
+        )
         self.tab_widget.addTab(self.users_tab, "Пользователи")
         
         # Вкладка пациентов
-        self.patients_tab = PatientListWidget(parent=self)  # Передаем self как родителя
+        self.patients_tab = LazyTab(
+            lambda: PatientListWidget(parent=self, load=False),  # Передаем self как родителя
+            PatientListWidget.data_loader, PatientListWidget.show_data,
+            depends_on=('patients',)
+        )
         self.tab_widget.addTab(self.patients_tab, "Пациенты")
         
         # Вкладка анализов
-        self.analysis_tab = AnalysisResultsWidget(parent=self)
+        self.analysis_tab = LazyTab(
+            lambda: AnalysisResultsWidget(parent=self, load=False),
+            AnalysisResultsWidget.data_loader, AnalysisResultsWidget.show_data,
+            depends_on=('analysis_results', 'patients', 'analysis_types')
+        )
         self.tab_widget.addTab(self.analysis_tab, "Анализы")
         
         # Вкладка приемов
-        self.appointments_tab = self.create_appointments_tab()
+        self.appointments_tab = LazyTab(
+            lambda: self.create_appointments_tab(load=False),
+            lambda tab: self.appointments_loader(), lambda tab, loaded: self.show_appointments(loaded),
+            depends_on=('appointments', 'patients', 'doctors')
+        )
         self.tab_widget.addTab(self.appointments_tab, "Записи на прием")
         
         # Вкладка статистики
-        self.statistics_tab = SystemStatisticsWidget()
+        self.statistics_tab = LazyTab(
+            lambda: SystemStatisticsWidget(load=False),
+            SystemStatisticsWidget.data_loader, SystemStatisticsWidget.show_data,
+            depends_on=STATISTICS_DATA_KINDS
+        )
         self.tab_widget.addTab(self.statistics_tab, "Статистика")
         
         main_layout.addWidget(self.tab_widget)
         
-    def create_appointments_tab(self):
-        """Создание вкладки для работы с записями на прием"""
+        # Списки пациентов, врачей и типов анализов обновляются при переходе
+        # на вкладку, если после загрузки они изменились
+        self.tab_widget.currentChanged.connect(lambda index: reference_cache.refresh())
+        
+        # Панель фоновых задач (экспорт и отчеты) появляется при запуске задачи
+        self.jobs_panel = JobsPanel(job_manager)
+        self.jobs_dock = QDockWidget("Фоновые задачи", self)
+        self.jobs_dock.setObjectName("jobs_dock")
+        self.jobs_dock.setWidget(self.jobs_panel)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.jobs_dock)
+        self.jobs_dock.setVisible(bool(job_manager.jobs()))
+        job_manager.job_added.connect(self.show_jobs_panel)
+        
+        # Напоминания о завтрашних приемах ставятся в очередь периодически;
+        # приемы, о которых уже напомнили, повторно не выбираются
+        self.reminders_job = None
+        self.reminders_timer = QTimer(self)
+        self.reminders_timer.timeout.connect(lambda: self.send_appointment_reminders(automatic=True))
+        self.reminders_timer.start(REMINDER_INTERVAL)
+    
+    def show_jobs_panel(self, job=None):
+        """Отображение панели фоновых задач"""
+        self.jobs_dock.show()
+        self.jobs_dock.raise_()
+    
+    def send_appointment_reminders(self, automatic=False):
+        """
+        Запуск фоновой рассылки напоминаний о завтрашних приемах
+        
+        :param automatic: Запуск по таймеру - без сообщений, и только если
+                          есть приемы без напоминания
+        """
+        if self.reminders_job is not None and self.reminders_job.active:
+            if not automatic:
+                QMessageBox.information(self, "Напоминания", "Рассылка напоминаний уже выполняется")
+            return
+        
+        pending = pending_reminders()
+        if not pending:
+            if not automatic:
+                QMessageBox.information(self, "Напоминания",
+                                        "Нет приемов на завтра, о которых нужно напомнить пациентам")
+            return
+        
+        email_outbox.configure(self.email_sender.smtp_settings())
+        self.reminders_job = job_manager.submit(
+            f"Напоминания о приемах ({pending})", queue_reminders, sender=self.email_sender.username
+        )
+    
+    def create_appointments_tab(self, load=True):
+        """
+        Создание вкладки для работы с записями на прием
+        
+        :param load: Загрузить записи сразу; при False данные передаются
+                     через show_appointments() (см. lazy_tabs)
+        """
         appointments_tab = QWidget()
         layout = QVBoxLayout(appointments_tab)
         
@@ -2514,38 +2428,16 @@ class AdminWindow(QMainWindow):
         self.doctor_combo = QComboBox()
         self.doctor_combo.setMinimumWidth(200)
         
-        # Добавляем опцию "Все врачи"
-        self.doctor_combo.addItem("Все врачи", None)
-        
-        # Загружаем список врачей
-        doctors = db.fetch_all("""
-            SELECT d.id, d.user_id, u.full_name, d.specialization
-            FROM doctors d
-            JOIN users u ON d.user_id = u.id
-            ORDER BY u.full_name
-        """)
-        
-        for doctor in doctors:
-            self.doctor_combo.addItem(
-                f"{doctor.get('full_name', '')} ({doctor.get('specialization', '')})",
-                doctor.get('id')
-            )
+        # Общий список врачей с опцией "Все врачи"
+        reference_cache.bind_combo(self.doctor_combo, 'doctors', "Все врачи")
         
         # Выбор пациента
         patient_label = QLabel("Пациент:")
         self.appointment_patient_combo = QComboBox()
         self.appointment_patient_combo.setMinimumWidth(200)
         
-        # Добавляем опцию "Все пациенты"
-        self.appointment_patient_combo.addItem("Все пациенты", None)
-        
-        # Загружаем список пациентов
-        patients = db.get_all_patients()
-        for patient in patients:
-            self.appointment_patient_combo.addItem(
-                f"{patient.get('full_name', '')}",
-                patient.get('id')
-            )
+        # Общий список пациентов с опцией "Все пациенты"
+        reference_cache.bind_combo(self.appointment_patient_combo, 'patients', "Все пациенты")
         
         # Выбор периода дат
         date_from_label = QLabel("С:")
@@ -2588,6 +2480,11 @@ class AdminWindow(QMainWindow):
         """)
         add_appointment_button.clicked.connect(lambda: self.add_appointment_dialog())
         
+        # Кнопка рассылки напоминаний о завтрашних приемах
+        reminders_button = QPushButton("Напомнить о завтрашних приемах")
+        reminders_button.setToolTip("Поставить в очередь письма пациентам, записанным на завтра")
+        reminders_button.clicked.connect(lambda: self.send_appointment_reminders())
+        
         # Размещение элементов фильтра
         filters_layout.addWidget(doctor_label)
         filters_layout.addWidget(self.doctor_combo)
@@ -2602,28 +2499,66 @@ class AdminWindow(QMainWindow):
         filters_layout.addWidget(apply_button)
         filters_layout.addWidget(clear_button)
         filters_layout.addWidget(add_appointment_button)
+        filters_layout.addWidget(reminders_button)
         
         filters_group.setLayout(filters_layout)
         layout.addWidget(filters_group)
         
-        # Таблица записей на прием
-        self.appointments_table = QTableWidget()
-        self.appointments_table.setColumnCount(7)
-        self.appointments_table.setHorizontalHeaderLabels([
-            "Дата и время", "Пациент", "Врач", "Статус", "Примечания", "Действия", ""
-        ])
+        # Таблица записей на прием (строки загружаются порциями по мере прокрутки)
+        self.appointments_model = LazyQueryTableModel([
+            TableColumn("Дата и время", 'appointment_date'),
+            TableColumn("Пациент", 'patient_name'),
+            TableColumn("Врач", 'doctor_name', display=self.format_appointment_doctor),
+            TableColumn("Статус", 'status',
+                        display=lambda a: self.translate_appointment_status(a.get('status', '')),
+                        foreground=self.appointment_status_color),
+            TableColumn("Примечания", 'notes'),
+            TableColumn("Действия"),
+            TableColumn("")
+        ], parent=self)
+        
+        self.appointments_table = QTableView()
+        self.appointments_table.setModel(self.appointments_model)
+        self.appointments_table.setItemDelegateForColumn(5, ActionButtonsDelegate([
+            RowAction("Завершить", lambda a: self.complete_appointment(a['id']),
+                      visible=lambda a: a.get('status') != 'completed'),
+            RowAction("Отменить", lambda a: self.cancel_appointment(a['id']),
+                      visible=lambda a: a.get('status') != 'cancelled')
+        ], self.appointments_table))
+        self.appointments_table.setItemDelegateForColumn(6, ActionButtonsDelegate([
+            RowAction("Изменить", lambda a: self.edit_appointment(a['id'])),
+            RowAction("Удалить", lambda a: self.delete_appointment(a['id']))
+        ], self.appointments_table))
         self.appointments_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.appointments_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         self.appointments_table.setSortingEnabled(True)
         
         layout.addWidget(self.appointments_table)
         
         # Загрузка записей на прием
-        self.refresh_appointments()
+        if load:
+            self.refresh_appointments()
         
         return appointments_tab
     
     def refresh_appointments(self):
         """Обновление списка записей на прием с учетом фильтров"""
+        if not hasattr(self, 'appointments_model'):
+            # Вкладка еще не открывалась: записи загрузятся при первом показе
+            return
+        # Обновление таблицы: строки читаются из курсора по мере прокрутки
+        self.appointments_model.set_query(*self.appointments_query())
+    
+    def appointments_loader(self):
+        """Функция чтения первой порции записей на прием для фонового потока"""
+        return self.appointments_model.first_rows_loader(*self.appointments_query())
+    
+    def show_appointments(self, loaded):
+        """Отображение записей на прием, прочитанных appointments_loader()"""
+        self.appointments_model.set_loaded_query(loaded)
+    
+    def appointments_query(self):
+        """Запрос записей на прием с учетом фильтров: (запрос, параметры)"""
         # Получение параметров фильтрации
         doctor_id = self.doctor_combo.currentData()
         patient_id = self.appointment_patient_combo.currentData()
@@ -2632,23 +2567,11 @@ class AdminWindow(QMainWindow):
         status = self.status_combo.currentData()
         
         # Подготовка условий запроса
-        conditions = ["1=1"]  # Всегда истинное условие для удобства
-        params = []
-        
-        if doctor_id:
-            conditions.append("a.doctor_id = ?")
-            params.append(doctor_id)
-        
-        if patient_id:
-            conditions.append("a.patient_id = ?")
-            params.append(patient_id)
-        
-        if status:
-            conditions.append("a.status = ?")
-            params.append(status)
-        
-        conditions.append("date(a.appointment_date) BETWEEN ? AND ?")
-        params.extend([from_date, to_date])
+        conditions = QueryConditions()
+        conditions.add_equals("a.doctor_id", doctor_id)
+        conditions.add_equals("a.patient_id", patient_id)
+        conditions.add_equals("a.status", status)
+        conditions.add_date_range("a.appointment_date", from_date, to_date)
         
         # Формирование и выполнение запроса
         query = f"""
@@ -2659,82 +2582,25 @@ class AdminWindow(QMainWindow):
             JOIN patients p ON a.patient_id = p.id
             JOIN doctors d ON a.doctor_id = d.id
             JOIN users u ON d.user_id = u.id
-            WHERE {' AND '.join(conditions)}
+            WHERE {conditions.where_clause()}
              ORDER BY a.appointment_date DESC
         """
-        appointments = db.fetch_all(query, params)
-        
-        # Обновление таблицы
-        self.appointments_table.setRowCount(len(appointments))
-        
-        for row, appointment in enumerate(appointments):
-            # Дата и время
-            appointment_datetime = appointment.get('appointment_date', '')
-            self.appointments_table.setItem(row, 0, QTableWidgetItem(appointment_datetime))
-            
-            # Пациент
-            patient_name = appointment.get('patient_name', '')
-            self.appointments_table.setItem(row, 1, QTableWidgetItem(patient_name))
-            
-            # Врач с специализацией
-            doctor_name = appointment.get('doctor_name', '')
-            specialization = appointment.get('specialization', '')
-            doctor_text = f"{doctor_name} ({specialization})" if specialization else doctor_name
-            self.appointments_table.setItem(row, 2, QTableWidgetItem(doctor_text))
-            
-            # Статус
-            status = appointment.get('status', '')
-            status_text = self.translate_appointment_status(status)
-            status_item = QTableWidgetItem(status_text)
-            
-            # Цвет для статуса
-            if status == 'completed':
-                status_item.setForeground(QColor(0, 128, 0))  # Зеленый для завершенных
-            elif status == 'cancelled':
-                status_item.setForeground(QColor(255, 0, 0))  # Красный для отмененных
-            
-            self.appointments_table.setItem(row, 3, status_item)
-            
-            # Примечания
-            notes = appointment.get('notes', '')
-            self.appointments_table.setItem(row, 4, QTableWidgetItem(notes))
-            
-            # Кнопки действий
-            actions_widget = QWidget()
-            actions_layout = QHBoxLayout(actions_widget)
-            actions_layout.setContentsMargins(0, 0, 0, 0)
-            
-            # Кнопка изменения статуса
-            if status != 'completed':
-                complete_button = QPushButton("Завершить")
-                complete_button.setProperty("appointment_id", appointment.get('id'))
-                complete_button.clicked.connect(self.complete_appointment)
-                actions_layout.addWidget(complete_button)
-            
-            if status != 'cancelled':
-                cancel_button = QPushButton("Отменить")
-                cancel_button.setProperty("appointment_id", appointment.get('id'))
-                cancel_button.clicked.connect(self.cancel_appointment)
-                actions_layout.addWidget(cancel_button)
-            
-            self.appointments_table.setCellWidget(row, 5, actions_widget)
-            
-            # Дополнительные действия
-            edit_delete_widget = QWidget()
-            edit_delete_layout = QHBoxLayout(edit_delete_widget)
-            edit_delete_layout.setContentsMargins(0, 0, 0, 0)
-            
-            edit_button = QPushButton("Изменить")
-            edit_button.setProperty("appointment_id", appointment.get('id'))
-            edit_button.clicked.connect(self.edit_appointment)
-            edit_delete_layout.addWidget(edit_button)
-            
-            delete_button = QPushButton("Удалить")
-            delete_button.setProperty("appointment_id", appointment.get('id'))
-            delete_button.clicked.connect(self.delete_appointment)
-            edit_delete_layout.addWidget(delete_button)
-            
-            self.appointments_table.setCellWidget(row, 6, edit_delete_widget)
+        return query, conditions.params
+    
+    def format_appointment_doctor(self, appointment):
+        """Врач со специализацией для отображения в таблице"""
+        doctor_name = appointment.get('doctor_name', '')
+        specialization = appointment.get('specialization', '')
+        return f"{doctor_name} ({specialization})" if specialization else doctor_name
+    
+    def appointment_status_color(self, appointment):
+        """Цвет текста статуса записи на прием"""
+        status = appointment.get('status', '')
+        if status == 'completed':
+            return QColor(0, 128, 0)  # Зеленый для завершенных
+        if status == 'cancelled':
+            return QColor(255, 0, 0)  # Красный для отмененных
+        return None
     
     def clear_appointment_filters(self):
         """Сброс фильтров записей на прием"""
@@ -2775,54 +2641,31 @@ class AdminWindow(QMainWindow):
         patient_combo.setMinimumWidth(250)
         
         try:
-            # Загружаем список пациентов
-            patients = db.get_all_patients()
-            
-            # Добавляем пациентов в комбобокс
-            for p in patients:
-                patient_id = p.get('id')
-                full_name = p.get('full_name', '')
-                patient_combo.addItem(f"{full_name}", patient_id)
+            # Общий список пациентов (перечитывается, только если изменился)
+            reference_cache.bind_combo(patient_combo, 'patients')
             
             # Если передан конкретный пациент, выбираем его
             selected_index = 0
             if patient:
                 if isinstance(patient, dict) and 'id' in patient:
                     patient_id = patient.get('id')
-                    print(f"Ищем пациента с ID: {patient_id}")
-                    for i in range(patient_combo.count()):
-                        if patient_combo.itemData(i) == patient_id:
-                            selected_index = i
-                            print(f"Найден пациент на позиции {i}")
-                            break
+                    selected_index = max(patient_combo.findData(patient_id), 0)
+                    logger.debug("Пациент с ID %s найден на позиции %d", patient_id, selected_index)
             
             # Устанавливаем выбранного пациента
             if selected_index >= 0 and selected_index < patient_combo.count():
                 patient_combo.setCurrentIndex(selected_index)
-                print(f"Установлен пациент на позицию {selected_index}")
         
         except Exception as e:
-            print(f"Ошибка при загрузке списка пациентов: {str(e)}")
+            logger.error("Ошибка при загрузке списка пациентов: %s", e)
         
         # Выбор врача
         doctor_combo = QComboBox()
         doctor_combo.setMinimumWidth(250)
         
         try:
-            # Загружаем список врачей
-            doctors = db.fetch_all("""
-                SELECT d.id, d.user_id, u.full_name, d.specialization
-                FROM doctors d
-                JOIN users u ON d.user_id = u.id
-                ORDER BY u.full_name
-            """)
-            
-            for doctor in doctors:
-                doctor_id = doctor.get('id')
-                doctor_name = doctor.get('full_name', '')
-                specialization = doctor.get('specialization', '')
-                display_text = f"{doctor_name} ({specialization})" if specialization else doctor_name
-                doctor_combo.addItem(display_text, doctor_id)
+            # Общий список врачей
+            reference_cache.bind_combo(doctor_combo, 'doctors')
             
             # Если нет врачей, показываем сообщение
             if doctor_combo.count() == 0:
@@ -2920,11 +2763,12 @@ class AdminWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Произошла ошибка: {str(e)}")
     
-    def edit_appointment(self):
+    def edit_appointment(self, appointment_id=None):
         """Редактирование существующей записи на прием"""
-        # Получаем ID записи
-        sender = self.sender()
-        appointment_id = sender.property("appointment_id")
+        # Получаем ID записи, если он не был передан
+        if appointment_id is None:
+            sender = self.sender()
+            appointment_id = sender.property("appointment_id")
         
         # Получаем данные о записи
         appointment = db.fetch_one(
@@ -2956,10 +2800,8 @@ class AdminWindow(QMainWindow):
         patient_combo = QComboBox()
         patient_combo.setMinimumWidth(250)
         
-        # Загружаем список пациентов
-        patients = db.get_all_patients()
-        for p in patients:
-            patient_combo.addItem(f"{p.get('full_name', '')}", p.get('id'))
+        # Общий список пациентов
+        reference_cache.bind_combo(patient_combo, 'patients')
         
         # Выбираем текущего пациента
         patient_index = patient_combo.findData(appointment.get('patient_id'))
@@ -2970,19 +2812,8 @@ class AdminWindow(QMainWindow):
         doctor_combo = QComboBox()
         doctor_combo.setMinimumWidth(250)
         
-        # Загружаем список врачей
-        doctors = db.fetch_all("""
-            SELECT d.id, d.user_id, u.full_name, d.specialization
-            FROM doctors d
-            JOIN users u ON d.user_id = u.id
-            ORDER BY u.full_name
-        """)
-        
-        for doctor in doctors:
-            doctor_combo.addItem(
-                f"{doctor.get('full_name', '')} ({doctor.get('specialization', '')})",
-                doctor.get('id')
-            )
+        # Общий список врачей
+        reference_cache.bind_combo(doctor_combo, 'doctors')
         
         # Выбираем текущего врача
         doctor_index = doctor_combo.findData(appointment.get('doctor_id'))
@@ -3070,11 +2901,12 @@ class AdminWindow(QMainWindow):
         # Показываем диалог
         dialog.exec()
         
-    def complete_appointment(self):
+    def complete_appointment(self, appointment_id=None):
         """Отметить запись на прием как завершенную"""
-        # Получаем ID записи
-        sender = self.sender()
-        appointment_id = sender.property("appointment_id")
+        # Получаем ID записи, если он не был передан
+        if appointment_id is None:
+            sender = self.sender()
+            appointment_id = sender.property("appointment_id")
         
         try:
             # Обновляем статус записи
@@ -3094,11 +2926,12 @@ class AdminWindow(QMainWindow):
             # Обновляем таблицу в любом случае
             self.refresh_appointments()
     
-    def cancel_appointment(self):
+    def cancel_appointment(self, appointment_id=None):
         """Отметить запись на прием как отмененную"""
-        # Получаем ID записи
-        sender = self.sender()
-        appointment_id = sender.property("appointment_id")
+        # Получаем ID записи, если он не был передан
+        if appointment_id is None:
+            sender = self.sender()
+            appointment_id = sender.property("appointment_id")
         
         try:
             # Обновляем статус записи
@@ -3118,11 +2951,12 @@ class AdminWindow(QMainWindow):
             # Обновляем таблицу в любом случае
             self.refresh_appointments()
     
-    def delete_appointment(self):
+    def delete_appointment(self, appointment_id=None):
         """Удаление записи на прием"""
-        # Получаем ID записи
-        sender = self.sender()
-        appointment_id = sender.property("appointment_id")
+        # Получаем ID записи, если он не был передан
+        if appointment_id is None:
+            sender = self.sender()
+            appointment_id = sender.property("appointment_id")
         
         # Запрашиваем подтверждение
         reply = QMessageBox.question(
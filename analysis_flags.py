@@ -0,0 +1,264 @@
+"""
+Пакетная проверка результатов анализов по нормам.
+
+Значения берутся из таблицы parameter_values (без разбора JSON),
+нормы - из общего индекса reference_ranges. Состояние (ниже нормы,
+в норме, выше нормы) и отклонение от нормы вычисляются для всех
+параметров пакета результатов сразу столбцами pandas/numpy; диапазон
+подбирается один раз для каждого сочетания параметра, пола и возраста.
+
+Итог по каждому результату (ResultFlags) кэшируется по ID результата,
+поэтому таблицы результатов выделяют строки со значениями вне нормы
+без повторных запросов. Значения сохраненного результата не меняются,
+кэш сбрасывается только при изменении справочника норм.
+"""
+import logging
+from collections import namedtuple
+
+from database_connection import db
+from reference_ranges import reference_ranges, STATUS_LOW, STATUS_NORMAL, STATUS_HIGH, STATUS_UNKNOWN
+
+logger = logging.getLogger(__name__)
+
+# Количество ID результатов в одном запросе (ограничение числа параметров SQLite)
+QUERY_CHUNK_SIZE = 500
+
+PARAMETER_COLUMNS = ['result_id', 'parameter', 'value', 'sex', 'age']
+
+
+class ResultFlags(namedtuple('ResultFlags', 'low_count high_count max_deviation abnormal_parameters')):
+    """
+    Итог проверки результата анализа по нормам
+    
+    low_count, high_count - количество параметров ниже и выше нормы;
+    max_deviation - наибольшее отклонение от границы нормы в долях ширины
+    диапазона (0 - все значения в норме); abnormal_parameters - кортеж
+    пар (параметр, STATUS_LOW или STATUS_HIGH).
+    """
+    
+    __slots__ = ()
+    
+    @property
+    def abnormal(self):
+        return bool(self.low_count or self.high_count)
+    
+    def describe(self):
+        """Текст для подсказки: "Вне нормы: Глюкоза (выше), СОЭ (ниже)" """
+        if not self.abnormal:
+            return "Все показатели в норме"
+        parts = [f"{name} ({'ниже' if status == STATUS_LOW else 'выше'})"
+                 for name, status in self.abnormal_parameters]
+        return "Вне нормы: " + ", ".join(parts)
+
+
+NO_FLAGS = ResultFlags(0, 0, 0.0, ())
+
+
+def flag_parameter_values(frame):
+    """
+    Проверка значений параметров по нормам
+    
+    :param frame: DataFrame со столбцами PARAMETER_COLUMNS (пол - 'М', 'Ж'
+                  или None, возраст в полных годах на дату анализа)
+    :return: Тот же DataFrame с добавленными столбцами low, high,
+             status (STATUS_*) и deviation (отклонение от границы нормы
+             в долях ширины диапазона: < 0 - ниже, > 0 - выше, 0 - в норме,
+             NaN - значение не число или норма не задана)
+    """
+    import numpy as np
+    import pandas as pd
+    
+    # Диапазоны подбираются только для различных сочетаний параметра, пола и возраста
+    keys = frame[['parameter', 'sex', 'age']].drop_duplicates()
+    low, high, _ = reference_ranges.evaluate(
+        keys['parameter'].tolist(),
+        [None] * len(keys),
+        [None if pd.isna(value) else value for value in keys['sex']],
+        [None if pd.isna(value) else int(value) for value in keys['age']],
+    )
+    keys = keys.assign(low=low, high=high)
+    frame = frame.merge(keys, on=['parameter', 'sex', 'age'], how='left')
+    
+    value = frame['value'].to_numpy(dtype=float, na_value=np.nan)
+    low = frame['low'].to_numpy(dtype=float)
+    high = frame['high'].to_numpy(dtype=float)
+    
+    # Ширина диапазона для нормировки отклонения; для вырожденных
+    # и односторонних диапазонов отклонение считается от модуля границы
+    width = high - low
+    with np.errstate(invalid='ignore'):
+        fallback = np.fmax(np.fmax(np.abs(low), np.abs(high)), 1.0)
+        width = np.where(width > 0, width, fallback)
+        below = value < low
+        above = value > high
+        known = ~np.isnan(value) & ~(np.isnan(low) & np.isnan(high))
+        
+        deviation = np.where(below, (value - low) / width, np.where(above, (value - high) / width, 0.0))
+    deviation[~known] = np.nan
+    
+    status = np.full(len(frame), STATUS_UNKNOWN, dtype=np.int8)
+    status[known] = STATUS_NORMAL
+    status[known & below] = STATUS_LOW
+    status[known & above] = STATUS_HIGH
+    
+    frame['status'] = status
+    frame['deviation'] = deviation
+    return frame
+
+
+def summarize_flags(frame):
+    """
+    Итог проверки по каждому результату
+    
+    :param frame: Результат flag_parameter_values
+    :return: Словарь {ID результата: ResultFlags}
+    """
+    import numpy as np
+    
+    status = frame['status']
+    summary = frame.assign(
+        is_low=status == STATUS_LOW,
+        is_high=status == STATUS_HIGH,
+        abs_deviation=np.abs(frame['deviation']),
+    ).groupby('result_id').agg(
+        low_count=('is_low', 'sum'),
+        high_count=('is_high', 'sum'),
+        max_deviation=('abs_deviation', 'max'),
+    )
+    
+    abnormal = frame[(status == STATUS_LOW) | (status == STATUS_HIGH)]
+    parameters = {}
+    for result_id, name, value_status in zip(
+        abnormal['result_id'].tolist(), abnormal['parameter'].tolist(), abnormal['status'].tolist()
+    ):
+        parameters.setdefault(result_id, []).append((name, value_status))
+    
+    max_deviation = np.nan_to_num(summary['max_deviation'].to_numpy(dtype=float)).tolist()
+    flags = {}
+    for result_id, low_count, high_count, deviation in zip(
+        summary.index.tolist(), summary['low_count'].tolist(), summary['high_count'].tolist(), max_deviation
+    ):
+        flags[result_id] = ResultFlags(low_count, high_count, deviation, tuple(parameters.get(result_id, ())))
+    return flags
+
+
+def id_condition(column, ids):
+    """
+    Условие отбора строк по списку ID
+    
+    Для почти непрерывного отсортированного списка (например, всех
+    результатов) используется диапазон BETWEEN - просмотр индекса подряд
+    быстрее поиска каждого ID из IN; лишние строки диапазона нужно
+    отфильтровать после чтения.
+    
+    :param ids: Отсортированный список ID
+    :return: Кортеж (условие, параметры, True если условие - диапазон)
+    """
+    if len(ids) > 1 and ids[-1] - ids[0] < 2 * len(ids):
+        return f"{column} BETWEEN ? AND ?", (ids[0], ids[-1]), True
+    return f"{column} IN ({', '.join('?' * len(ids))})", tuple(ids), False
+
+
+class AnalysisFlags:
+    """Кэш итогов проверки результатов анализов по ID результата"""
+    
+    def __init__(self, database=None):
+        self._db = database or db
+        self._cache = {}
+        self._ranges_version = reference_ranges.version
+    
+    def _check_ranges_version(self):
+        # Справочник норм изменился - все итоги нужно пересчитать
+        if self._ranges_version != reference_ranges.version:
+            self._cache.clear()
+            self._ranges_version = reference_ranges.version
+    
+    def invalidate(self, result_ids=None):
+        """Сброс кэша для указанных результатов (или полностью)"""
+        if result_ids is None:
+            self._cache.clear()
+            return
+        for result_id in result_ids:
+            self._cache.pop(result_id, None)
+    
+    def parameter_flags(self, result_ids):
+        """
+        Проверка всех параметров указанных результатов
+        
+        :param result_ids: ID результатов анализов
+        :return: DataFrame (см. flag_parameter_values)
+        """
+        import pandas as pd
+        
+        result_ids = sorted(set(result_ids))
+        patients = []
+        values = []
+        ranged = False
+        # Пол и возраст вычисляются для результата, а не для каждого его значения
+        for start in range(0, len(result_ids), QUERY_CHUNK_SIZE):
+            chunk = result_ids[start:start + QUERY_CHUNK_SIZE]
+            condition, params, is_range = id_condition('ar.id', chunk)
+            ranged = ranged or is_range
+            patients.extend(self._db.fetch_all(f"""
+                SELECT ar.id,
+                       CASE WHEN substr(p.gender, 1, 1) IN ('М', 'м') THEN 'М'
+                            WHEN substr(p.gender, 1, 1) IN ('Ж', 'ж') THEN 'Ж' END,
+                       CAST(strftime('%Y', ar.result_date) AS INTEGER)
+                           - CAST(strftime('%Y', p.birth_date) AS INTEGER)
+                           - (strftime('%m%d', ar.result_date) < strftime('%m%d', p.birth_date))
+                FROM analysis_results ar
+                JOIN patients p ON p.id = ar.patient_id
+                WHERE {condition}
+            """, params, row_format='tuple'))
+            condition, params, _ = id_condition('analysis_result_id', chunk)
+            values.extend(self._db.fetch_all(
+                f"SELECT analysis_result_id, parameter_id, value FROM parameter_values WHERE {condition}",
+                params, row_format='tuple'
+            ))
+        
+        names = dict(self._db.fetch_all("SELECT id, name FROM analysis_parameters", row_format='tuple'))
+        
+        frame = pd.DataFrame.from_records(values, columns=['result_id', 'parameter_id', 'value'])
+        if ranged:
+            frame = frame[frame['result_id'].isin(result_ids)]
+        frame['parameter'] = frame['parameter_id'].map(names)
+        frame = frame.join(
+            pd.DataFrame.from_records(patients, columns=['result_id', 'sex', 'age'], index='result_id'),
+            on='result_id', how='inner'
+        )
+        return flag_parameter_values(frame)
+    
+    def flag_results(self, results):
+        """
+        Проверка набора результатов (например, get_all_analysis_results)
+        
+        Запросы выполняются только для результатов, итогов которых еще нет в кэше.
+        
+        :param results: Строки результатов с полем 'id' или ID результатов
+        :return: Словарь {ID результата: ResultFlags}
+        """
+        self._check_ranges_version()
+        ids = [row if isinstance(row, int) else row['id'] for row in results]
+        missing = [result_id for result_id in dict.fromkeys(ids) if result_id not in self._cache]
+        if missing:
+            flags = summarize_flags(self.parameter_flags(missing))
+            for result_id in missing:
+                self._cache[result_id] = flags.get(result_id, NO_FLAGS)
+            logger.debug("Проверено по нормам результатов: %d", len(missing))
+        return {result_id: self._cache[result_id] for result_id in ids}
+    
+    def get(self, result_id):
+        """Итог проверки результата (при отсутствии в кэше выполняется запрос)"""
+        self._check_ranges_version()
+        flags = self._cache.get(result_id)
+        if flags is None:
+            flags = self.flag_results([result_id])[result_id]
+        return flags
+    
+    def is_abnormal(self, result_id):
+        """Есть ли в результате значения вне нормы"""
+        return self.get(result_id).abnormal
+
+
+# Общий кэш для окон и отчетов
+analysis_flags = AnalysisFlags()
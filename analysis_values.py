@@ -0,0 +1,146 @@
+"""
+Нормализованное хранение значений параметров анализов.
+
+Кроме JSON в analysis_results.result_data, каждое значение параметра
+записывается строкой таблицы parameter_values: числовое значение (REAL)
+для запросов по диапазону и исходный текст для отображения. Параметры
+типа анализа хранятся в таблице analysis_parameters.
+"""
+import json
+import re
+
+# Число с необязательной единицей измерения: "140 г/л", "6,1", "5.8".
+# Значения вида "0-1 в п/зр" или "Отрицательно" числом не считаются.
+_NUMBER_PATTERN = re.compile(r'^\s*([-+]?\d+(?:[.,]\d+)?)(?:\s+(\D.*?))?\s*$')
+
+
+def parse_parameter_value(value):
+    """
+    Разбор значения параметра анализа
+    
+    :param value: Значение из result_data (строка или число)
+    :return: Кортеж (число или None, текст значения, единица измерения или None)
+    """
+    if value is None:
+        return None, None, None
+    if isinstance(value, bool):
+        return None, str(value), None
+    if isinstance(value, (int, float)):
+        return float(value), str(value), None
+    
+    text = str(value).strip()
+    match = _NUMBER_PATTERN.match(text)
+    if not match:
+        return None, text, None
+    return float(match.group(1).replace(',', '.')), text, match.group(2)
+
+
+def load_result_data(result_data):
+    """
+    Словарь значений из поля result_data
+    
+    :return: Словарь {параметр: значение} или пустой словарь, если это не JSON-объект
+    """
+    if isinstance(result_data, dict):
+        return result_data
+    try:
+        data = json.loads(result_data) if result_data else {}
+    except (TypeError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def parameter_ids(cursor, analysis_type_id, names, known=None):
+    """
+    ID параметров типа анализа; отсутствующие параметры создаются
+    
+    :param cursor: Курсор соединения, в транзакции которого выполняется запись
+    :param known: Словарь уже известных ID параметров этого типа анализа
+                  (дополняется на месте); если в нем есть все имена,
+                  запрос к базе данных не выполняется
+    :return: Словарь {имя параметра: id}
+    """
+    if known is not None and all(name in known for name in names):
+        return known
+    
+    cur = cursor.connection.cursor()
+    cur.row_factory = None
+    
+    ids = known if known is not None else {}
+    ids.update(cur.execute(
+        "SELECT name, id FROM analysis_parameters WHERE analysis_type_id = ?",
+        (analysis_type_id,)
+    ).fetchall())
+    
+    missing = [name for name in dict.fromkeys(names) if name not in ids]
+    if missing:
+        position = cur.execute(
+            "SELECT COALESCE(MAX(position), 0) FROM analysis_parameters WHERE analysis_type_id = ?",
+            (analysis_type_id,)
+        ).fetchone()[0]
+        for offset, name in enumerate(missing, 1):
+            cur.execute(
+                "INSERT INTO analysis_parameters (analysis_type_id, name, position) VALUES (?, ?, ?)",
+                (analysis_type_id, name, position + offset)
+            )
+            ids[name] = cur.lastrowid
+    return ids
+
+
+def save_parameter_values(cursor, analysis_result_id, analysis_type_id, result_data, known_ids=None):
+    """
+    Запись значений параметров результата анализа в parameter_values
+    
+    :param cursor: Курсор соединения, в транзакции которого выполняется запись
+    :param result_data: Словарь значений или JSON-строка
+    :param known_ids: Кэш ID параметров типа анализа (см. parameter_ids)
+    :return: Количество записанных значений
+    """
+    data = load_result_data(result_data)
+    if not data:
+        return 0
+    
+    ids = parameter_ids(cursor, analysis_type_id, list(data), known_ids)
+    rows = []
+    units = []
+    for name, value in data.items():
+        number, text, unit = parse_parameter_value(value)
+        rows.append((analysis_result_id, ids[name], number, text))
+        if unit:
+            units.append((unit, ids[name]))
+    
+    cur = cursor.connection.cursor()
+    cur.executemany(
+        "INSERT OR REPLACE INTO parameter_values (analysis_result_id, parameter_id, value, value_text) "
+        "VALUES (?, ?, ?, ?)",
+        rows
+    )
+    # Единица измерения параметра берется из первого значения с единицей
+    cur.executemany(
+        "UPDATE analysis_parameters SET unit = ? WHERE id = ? AND unit IS NULL",
+        units
+    )
+    return len(rows)
+
+
+def backfill_parameter_values(cursor):
+    """Заполнение analysis_parameters и parameter_values из существующих данных"""
+    cur = cursor.connection.cursor()
+    cur.row_factory = None
+    
+    # Параметры в порядке, заданном в типах анализов
+    known = {}
+    for analysis_type_id, parameters in cur.execute(
+        "SELECT id, parameters FROM analysis_types WHERE parameters IS NOT NULL"
+    ).fetchall():
+        names = [name.strip() for name in parameters.split(',') if name.strip()]
+        known[analysis_type_id] = parameter_ids(cur, analysis_type_id, names, {})
+    
+    results = cur.execute(
+        "SELECT id, analysis_type_id, result_data FROM analysis_results WHERE result_data IS NOT NULL"
+    ).fetchall()
+    for analysis_result_id, analysis_type_id, result_data in results:
+        save_parameter_values(
+            cur, analysis_result_id, analysis_type_id, result_data,
+            known.setdefault(analysis_type_id, {})
+        )
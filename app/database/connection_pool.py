@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+
+# PRAGMA, применяемые к каждому новому соединению
+DEFAULT_PRAGMAS = {
+    'cache_size': -8000,      # 8 МБ кэша страниц
+    'temp_store': 'MEMORY'    # временные таблицы и индексы в памяти
+}
+
+# Размер кэша подготовленных выражений для каждого соединения
+DEFAULT_CACHED_STATEMENTS = 256
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Пул соединений с базой данных SQLite: одно соединение на поток"""
+    
+    def __init__(self, db_path, pragmas=None, cached_statements=DEFAULT_CACHED_STATEMENTS):
+        self.db_path = db_path
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self.cached_statements = cached_statements
+        
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+    
+    def get_connection(self):
+        """Получить соединение текущего потока (создается при первом обращении)"""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            # Соединение используется только своим потоком; проверка отключена,
+            # чтобы close_all мог закрыть соединения всех потоков
+            conn = sqlite3.connect(
+                self.db_path,
+                cached_statements=self.cached_statements,
+                check_same_thread=False
+            )
+            for name, value in self.pragmas.items():
+                # PRAGMA не поддерживает параметры запроса
+                conn.execute(f"PRAGMA {name} = {value}")
+            
+            self._local.connection = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    def close_all(self):
+        """Закрыть все соединения пула"""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+
+def get_pool(db_path, pragmas=None, cached_statements=DEFAULT_CACHED_STATEMENTS):
+    """
+    Получить общий пул соединений для файла базы данных
+    
+    Параметры pragmas и cached_statements учитываются только при создании пула.
+    """
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path, pragmas, cached_statements)
+            _pools[db_path] = pool
+        return pool
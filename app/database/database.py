@@ -1,33 +1,46 @@
 import sqlite3
 from app.database.schema import get_db_path, hash_password
+from app.database.connection_pool import get_pool
 
 class Database:
-    def __init__(self):
-        self.db_path = get_db_path()
+    def __init__(self, db_path=None, pragmas=None):
+        self.db_path = db_path or get_db_path()
+        # Соединения не открываются на каждый запрос, а берутся из общего пула
+        self.pool = get_pool(self.db_path, pragmas)
     
     def _get_connection(self):
-        """Получить соединение с базой данных"""
-        return sqlite3.connect(self.db_path)
+        """Получить соединение с базой данных для текущего потока"""
+        return self.pool.get_connection()
     
     def execute_query(self, query, parameters=(), fetchone=False):
         """Выполнить запрос к базе данных"""
         conn = self._get_connection()
         cursor = conn.cursor()
-        cursor.execute(query, parameters)
-        
-        result = None
-        if query.lstrip().upper().startswith('SELECT'):
-            if fetchone:
-                result = cursor.fetchone()
+        try:
+            cursor.execute(query, parameters)
+            
+            result = None
+            if query.lstrip().upper().startswith('SELECT'):
+                if fetchone:
+                    result = cursor.fetchone()
+                else:
+                    result = cursor.fetchall()
             else:
-                result = cursor.fetchall()
-        else:
-            conn.commit()
-            result = cursor.lastrowid
+                conn.commit()
+                result = cursor.lastrowid
+        except sqlite3.Error:
+            # Соединение переиспользуется, поэтому незавершенную транзакцию нужно откатить
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
         
-        conn.close()
         return result
     
+    def close(self):
+        """Закрыть все соединения с базой данных"""
+        self.pool.close_all()
+    
     def authenticate_user(self, username, password):
         """Аутентификация пользователя"""
         hashed_password = hash_password(password)
@@ -108,6 +121,63 @@ class Database:
         """
         return self.execute_query(query, (analysis_result_id, parameter_id, value))
     
+    def add_analysis_result_with_values(self, patient_id, analysis_type_id, date_taken, lab_technician_id, values):
+        """
+        Добавить результат анализа вместе со значениями параметров в одной транзакции
+        
+        values - список пар (parameter_id, value)
+        """
+        conn = self._get_connection()
+        with conn:
+            analysis_result_id = self._insert_analysis_result(
+                conn, patient_id, analysis_type_id, date_taken, lab_technician_id, values
+            )
+        return analysis_result_id
+    
+    def import_analysis_results(self, results):
+        """
+        Массовый импорт результатов анализов в одной транзакции
+        
+        results - итерируемый набор словарей с ключами patient_id, analysis_type_id,
+        date_taken, lab_technician_id и values (список пар (parameter_id, value)).
+        Если хотя бы один результат не удалось сохранить, импорт отменяется целиком.
+        Возвращает количество импортированных результатов.
+        """
+        conn = self._get_connection()
+        count = 0
+        with conn:
+            for result in results:
+                self._insert_analysis_result(
+                    conn,
+                    result['patient_id'],
+                    result['analysis_type_id'],
+                    result['date_taken'],
+                    result['lab_technician_id'],
+                    result['values']
+                )
+                count += 1
+        return count
+    
+    def _insert_analysis_result(self, conn, patient_id, analysis_type_id, date_taken, lab_technician_id, values):
+        """Вставка заголовка результата и значений параметров (без фиксации транзакции)"""
+        cursor = conn.execute(
+            """
+            INSERT INTO analysis_results (patient_id, analysis_type_id, date_taken, lab_technician_id, status) 
+            VALUES (?, ?, ?, ?, 'новый')
+            """,
+            (patient_id, analysis_type_id, date_taken, lab_technician_id)
+        )
+        analysis_result_id = cursor.lastrowid
+        
+        conn.executemany(
+            """
+            INSERT INTO parameter_values (analysis_result_id, parameter_id, value) 
+            VALUES (?, ?, ?)
+            """,
+            [(analysis_result_id, parameter_id, value) for parameter_id, value in values]
+        )
+        return analysis_result_id
+    
     def get_analysis_results(self, patient_id=None, analysis_type_id=None, from_date=None, to_date=None):
         """Получить результаты анализов с фильтрацией"""
         query = """
@@ -11,6 +11,32 @@ def hash_password(password):
     """Хеширование пароля для безопасного хранения"""
     return hashlib.sha256(password.encode()).hexdigest()
 
+# Версия набора индексов (хранится в PRAGMA user_version)
+INDEX_VERSION = 1
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_analysis_results_patient_date ON analysis_results (patient_id, date_taken)",
+    "CREATE INDEX IF NOT EXISTS idx_analysis_results_type_date ON analysis_results (analysis_type_id, date_taken)",
+    "CREATE INDEX IF NOT EXISTS idx_analysis_results_lab_date ON analysis_results (lab_technician_id, date_taken)",
+    "CREATE INDEX IF NOT EXISTS idx_analysis_results_date ON analysis_results (date_taken)",
+    "CREATE INDEX IF NOT EXISTS idx_parameter_values_result ON parameter_values (analysis_result_id)",
+    "CREATE INDEX IF NOT EXISTS idx_analysis_parameters_type ON analysis_parameters (analysis_type_id)",
+    "CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date ON appointments (doctor_id, appointment_date)",
+    "CREATE INDEX IF NOT EXISTS idx_appointments_status_date ON appointments (status, appointment_date)",
+    "CREATE INDEX IF NOT EXISTS idx_appointments_patient_date ON appointments (patient_id, appointment_date)"
+]
+
+def apply_indexes(cursor):
+    """Создание индексов, если версия схемы в базе данных устарела"""
+    cursor.execute("PRAGMA user_version")
+    if cursor.fetchone()[0] >= INDEX_VERSION:
+        return
+        
+    for statement in INDEXES:
+        cursor.execute(statement)
+        
+    cursor.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
 def init_db():
     """Инициализация базы данных и создание таблиц"""
     db_path = get_db_path()
@@ -107,6 +133,9 @@ def init_db():
     )
     ''')
     
+    # Индексы для фильтрации результатов анализов и расписания
+    apply_indexes(cursor)
+    
     # Добавим несколько тестовых пользователей
     # Проверим, есть ли уже пользователи
     cursor.execute("SELECT COUNT(*) FROM users")
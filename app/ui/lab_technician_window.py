@@ -1,12 +1,15 @@
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
                              QComboBox, QPushButton, QTableWidget, QTableWidgetItem, 
                              QMessageBox, QDateEdit, QStackedWidget, QGroupBox, 
-                             QFormLayout, QLineEdit, QSpinBox, QDoubleSpinBox, QScrollArea)
+                             QFormLayout, QLineEdit, QSpinBox, QDoubleSpinBox, QScrollArea,
+                             QFileDialog)
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtGui import QFont
 from datetime import datetime
+import sqlite3
 
 from app.database.database import Database
+from app.utils.analyzer_import import import_analyzer_files, AnalyzerFileError
 from app.models.models import UserRole, AnalysisResult
 
 class LabTechnicianWindow(QMainWindow):
@@ -78,6 +81,12 @@ class LabTechnicianWindow(QMainWindow):
         self.start_button.clicked.connect(self.show_analysis_form)
         
         start_button_layout.addWidget(self.start_button)
+        
+        self.import_button = QPushButton("Импорт из анализатора")
+        self.import_button.setFixedSize(180, 40)
+        self.import_button.clicked.connect(self.import_analyzer_results)
+        
+        start_button_layout.addWidget(self.import_button)
         start_button_layout.addStretch()
         
         patient_layout.addLayout(start_button_layout)
@@ -237,25 +246,23 @@ class LabTechnicianWindow(QMainWindow):
         analysis_type_id = self.analysis_combo.currentData()
         date_taken = self.date_edit.date().toString("yyyy-MM-dd")
         
-        # Создаем результат анализа
-        analysis_result_id = self.db.add_analysis_result(
-            patient_id, 
-            analysis_type_id, 
-            date_taken, 
-            self.user_data['id']
-        )
-        
-        # Сохраняем значения параметров
+        # Собираем значения параметров
+        values = []
         for row in range(self.parameters_layout.rowCount()):
             # Получаем виджет значения (в каждой строке два виджета: метка и поле ввода)
             value_widget = self.parameters_layout.itemAt(row * 2 + 1).widget()
             
             if isinstance(value_widget, QDoubleSpinBox):
-                param_id = value_widget.property("param_id")
-                value = value_widget.value()
-                
-                # Сохраняем значение параметра
-                self.db.add_parameter_value(analysis_result_id, param_id, value)
+                values.append((value_widget.property("param_id"), value_widget.value()))
+        
+        # Результат анализа и все значения параметров сохраняются в одной транзакции
+        self.db.add_analysis_result_with_values(
+            patient_id, 
+            analysis_type_id, 
+            date_taken, 
+            self.user_data['id'],
+            values
+        )
         
         # Показываем сообщение об успехе
         QMessageBox.information(self, "Успешно", "Результаты анализа сохранены")
@@ -267,6 +274,23 @@ class LabTechnicianWindow(QMainWindow):
         self.analysis_form_group.setVisible(False)
         self.clear_parameters_layout()
     
+    def import_analyzer_results(self):
+        """Импорт результатов из файлов выгрузки анализатора"""
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self, "Файлы анализатора", "", "CSV файлы (*.csv);;Все файлы (*)"
+        )
+        if not file_paths:
+            return
+        
+        try:
+            count = import_analyzer_files(self.db, file_paths, self.user_data['id'])
+        except (AnalyzerFileError, OSError, sqlite3.Error) as e:
+            QMessageBox.critical(self, "Ошибка импорта", f"Импорт отменен: {e}")
+            return
+        
+        QMessageBox.information(self, "Успешно", f"Импортировано результатов анализов: {count}")
+        self.refresh_history()
+    
     def cancel_analysis(self):
         """Отмена заполнения анализа"""
         self.analysis_form_group.setVisible(False)
@@ -0,0 +1,77 @@
+import csv
+
+# Обязательные столбцы файла выгрузки анализатора
+REQUIRED_COLUMNS = ('sample_id', 'patient_id', 'analysis_type_id', 'date_taken', 'parameter_id', 'value')
+
+
+class AnalyzerFileError(ValueError):
+    """Ошибка формата файла выгрузки анализатора"""
+
+
+def read_analyzer_file(file_path, lab_technician_id):
+    """
+    Прочитать результаты анализов из CSV-файла анализатора
+    
+    Каждая строка файла - значение одного параметра. Строки с одинаковым
+    sample_id объединяются в один результат анализа.
+    
+    Args:
+        file_path (str): Путь к CSV-файлу (разделитель ',' или ';')
+        lab_technician_id (int): ID лаборанта, выполняющего импорт
+    
+    Returns:
+        list: Список словарей для Database.import_analysis_results
+    """
+    # Ошибки кодировки (например, выгрузка в cp1251) и формата CSV возникают
+    # при чтении строк, поэтому перехватываются для всего чтения файла
+    try:
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            header = f.readline()
+            delimiter = ';' if header.count(';') > header.count(',') else ','
+            f.seek(0)
+            reader = csv.DictReader(f, delimiter=delimiter)
+            
+            missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+            if missing:
+                raise AnalyzerFileError(f"{file_path}: отсутствуют столбцы {', '.join(missing)}")
+            
+            samples = {}
+            for line_number, row in enumerate(reader, start=2):
+                try:
+                    parameter = (int(row['parameter_id']), float(row['value'].replace(',', '.')))
+                    sample_key = row['sample_id']
+                    if sample_key not in samples:
+                        samples[sample_key] = {
+                            'patient_id': int(row['patient_id']),
+                            'analysis_type_id': int(row['analysis_type_id']),
+                            'date_taken': row['date_taken'].strip(),
+                            'lab_technician_id': lab_technician_id,
+                            'values': []
+                        }
+                except (TypeError, ValueError, AttributeError) as e:
+                    raise AnalyzerFileError(f"{file_path}, строка {line_number}: {e}")
+                
+                samples[sample_key]['values'].append(parameter)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise AnalyzerFileError(f"{file_path}: {e}")
+    
+    return list(samples.values())
+
+
+def import_analyzer_files(db, file_paths, lab_technician_id):
+    """
+    Импортировать результаты из нескольких файлов анализатора в одной транзакции
+    
+    Args:
+        db (Database): Объект базы данных
+        file_paths (list): Пути к CSV-файлам
+        lab_technician_id (int): ID лаборанта, выполняющего импорт
+    
+    Returns:
+        int: Количество импортированных результатов анализов
+    """
+    results = []
+    for file_path in file_paths:
+        results.extend(read_analyzer_file(file_path, lab_technician_id))
+    
+    return db.import_analysis_results(results)
@@ -0,0 +1,117 @@
+"""
+Рассылка напоминаний о приемах на следующий день.
+
+Запланированные приемы выбираются одним запросом по индексу
+idx_appointments_status_date (status, appointment_date). Письма
+формируются по общему шаблону email_templates, который разбирается
+один раз, и ставятся в очередь email_outbox; доставку выполняет поток
+очереди через пул SMTP-соединений.
+
+Для каждого приема в таблицу appointment_reminders записывается ID
+письма в той же транзакции, что и само письмо, поэтому повторный
+запуск рассылки (кнопкой или по таймеру) не отправляет пациенту
+второе напоминание.
+"""
+import logging
+from datetime import date, timedelta
+
+from database_connection import db
+from email_outbox import email_outbox, build_message, insert_message
+from email_templates import render_appointment_reminder
+from query_builder import QueryConditions
+
+logger = logging.getLogger(__name__)
+
+# Интервал автоматического запуска рассылки в окне администратора (в миллисекундах)
+REMINDER_INTERVAL = 60 * 60 * 1000
+
+# Запланированные приемы за день, напоминание о которых еще не отправлено
+REMINDERS_QUERY = """
+    SELECT a.id, a.appointment_date, a.notes, p.full_name, p.email, u.full_name, d.specialization
+    FROM appointments a
+    JOIN patients p ON p.id = a.patient_id
+    JOIN doctors d ON d.id = a.doctor_id
+    JOIN users u ON u.id = d.user_id
+    WHERE {where}
+      AND p.email IS NOT NULL AND p.email <> ''
+      AND NOT EXISTS (SELECT 1 FROM appointment_reminders r WHERE r.appointment_id = a.id)
+    ORDER BY a.appointment_date, a.id
+"""
+
+
+def reminders_query(day):
+    """
+    Запрос приемов для рассылки напоминаний
+    
+    :param day: Дата приемов ('YYYY-MM-DD', date или QDate)
+    :return: Кортеж (запрос, параметры)
+    """
+    conditions = QueryConditions().add("a.status = ?", 'scheduled').add_date_range("a.appointment_date", day, day)
+    return REMINDERS_QUERY.format(where=conditions.where_clause()), tuple(conditions.params)
+
+
+def pending_reminders(day=None):
+    """Количество приемов за день (по умолчанию завтра), напоминание о которых еще не отправлено"""
+    query, params = reminders_query(day or date.today() + timedelta(days=1))
+    row = db.fetch_one(f"SELECT COUNT(*) FROM ({query})", params, row_format='tuple')
+    return row[0] if row else 0
+
+
+def queue_reminders(job=None, day=None, sender=None):
+    """
+    Постановка в очередь напоминаний о приемах за день
+    
+    Может выполняться как фоновая задача job_manager.
+    
+    :param job: Фоновая задача для отображения прогресса (опционально)
+    :param day: Дата приемов; по умолчанию завтрашний день
+    :param sender: Адрес отправителя; по умолчанию логин SMTP очереди писем
+    :return: Количество писем, поставленных в очередь
+    """
+    day = day or date.today() + timedelta(days=1)
+    sender = sender or email_outbox.settings.username
+    # Письма отправляются через профиль SMTP, настроенный перед рассылкой
+    smtp_profile = email_outbox.default_profile()
+    query, params = reminders_query(day)
+    appointments = db.fetch_all(query, params, row_format='tuple')
+    if not appointments:
+        return 0
+    
+    total = len(appointments)
+    reminders = []
+    for number, (appointment_id, appointment_date, notes, patient_name, email,
+                 doctor_name, specialization) in enumerate(appointments, 1):
+        day_part, _, time_part = appointment_date.partition(' ')
+        subject = f"Напоминание о приеме {day_part}"
+        body = render_appointment_reminder(patient_name, doctor_name, day_part, time_part[:5], specialization, notes)
+        message = build_message(sender, email, subject, body)
+        reminders.append((appointment_id, email, subject, message.as_string()))
+        if job is not None:
+            job.set_progress(number, total, "Подготовка писем")
+    
+    def enqueue_reminders(cursor):
+        queued = 0
+        for appointment_id, email, subject, message in reminders:
+            # Отметка о напоминании ставится первой: если другой запуск
+            # рассылки уже записал этот прием, письмо не добавляется
+            cursor.execute(
+                "INSERT OR IGNORE INTO appointment_reminders (appointment_id) VALUES (?)", (appointment_id,)
+            )
+            if cursor.rowcount == 0:
+                continue
+            outbox_id = insert_message(cursor, email, subject, message, smtp_profile=smtp_profile)
+            cursor.execute(
+                "UPDATE appointment_reminders SET outbox_id = ? WHERE appointment_id = ?", (outbox_id, appointment_id)
+            )
+            queued += 1
+        return queued
+    
+    queued = db.run_in_transaction(enqueue_reminders)
+    if queued is None:
+        raise RuntimeError("Не удалось поставить напоминания в очередь")
+    if job is not None:
+        job.set_progress(total, total, f"Поставлено в очередь: {queued}")
+    if queued:
+        email_outbox.notify()
+    logger.info("Напоминания о приемах %s: поставлено в очередь %d", day, queued)
+    return queued
@@ -0,0 +1,396 @@
+"""
+Фоновые задачи: экспорт данных и формирование отчетов.
+
+Задача выполняется в пуле потоков QThreadPool и не блокирует окно,
+несколько задач могут выполняться одновременно. Функция задачи
+получает объект Job, через который сообщает прогресс (job.set_progress)
+и проверяет, не отменена ли задача (job.check_cancelled). Изменения
+состояния задач передаются сигналами JobManager и в главном потоке
+отображаются панелью JobsPanel.
+
+Функция задачи не должна обращаться к виджетам: все значения из
+интерфейса (фильтры, путь к файлу) собираются до запуска задачи.
+Запросы к базе данных из потока пула выполняются отдельным соединением
+этого потока (см. DatabaseConnection._connection), оно закрывается
+после завершения задачи.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, QCoreApplication, QUrl, Qt, Signal
+from PySide6.QtGui import QDesktopServices
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem,
+                               QHeaderView, QAbstractItemView, QProgressBar, QPushButton)
+
+from database_connection import db
+
+logger = logging.getLogger(__name__)
+
+# Состояния задачи
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_FINISHED = 'finished'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+JOB_STATUS_NAMES = {
+    JOB_QUEUED: 'В очереди',
+    JOB_RUNNING: 'Выполняется',
+    JOB_FINISHED: 'Готово',
+    JOB_FAILED: 'Ошибка',
+    JOB_CANCELLED: 'Отменено',
+}
+
+# Количество одновременно выполняемых задач
+MAX_THREADS = 3
+
+# Минимальный интервал между сигналами о прогрессе одной задачи (в секундах),
+# чтобы экспорт миллиона строк не переполнял очередь событий окна
+PROGRESS_INTERVAL = 0.1
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем"""
+
+
+@contextmanager
+def output_file(file_path):
+    """
+    Запись файла в функции задачи: если задача отменена или завершилась
+    ошибкой, недописанный файл удаляется
+    """
+    try:
+        yield file_path
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+
+class Job(QRunnable):
+    """
+    Фоновая задача
+    
+    Функция задачи вызывается как func(job, *args, **kwargs) и возвращает
+    результат (как правило, путь к созданному файлу).
+    """
+    
+    def __init__(self, manager, job_id, title, func, args=(), kwargs=None):
+        super().__init__()
+        # Объектом владеет JobManager, а не пул потоков
+        self.setAutoDelete(False)
+        self._manager = manager
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs or {}
+        self._cancel_event = threading.Event()
+        self._last_progress = 0.0
+        
+        self.id = job_id
+        self.title = title
+        self.status = JOB_QUEUED
+        self.done = 0
+        self.total = 0
+        self.message = ""
+        self.result = None
+        self.error = None
+    
+    @property
+    def active(self):
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+    
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+    
+    @property
+    def file_path(self):
+        """Путь к созданному файлу, если результат задачи - существующий файл"""
+        if isinstance(self.result, str) and os.path.isfile(self.result):
+            return self.result
+        return None
+    
+    def cancel(self):
+        """Запрос отмены; выполняющаяся задача завершится при следующей проверке"""
+        self._cancel_event.set()
+    
+    def check_cancelled(self):
+        """Прерывание функции задачи, если задача отменена"""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+    
+    def set_progress(self, done, total=None, message=None):
+        """
+        Сообщение о прогрессе из функции задачи
+        
+        Заодно проверяет отмену, поэтому функции, сообщающей прогресс
+        в цикле, не нужно отдельно вызывать check_cancelled().
+        
+        :param done: Количество обработанных элементов
+        :param total: Общее количество элементов (0 - неизвестно)
+        :param message: Описание текущего этапа
+        """
+        self.check_cancelled()
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        
+        now = time.monotonic()
+        if now - self._last_progress >= PROGRESS_INTERVAL or (self.total and done >= self.total):
+            self._last_progress = now
+            self._manager.job_changed.emit(self)
+    
+    def run(self):
+        """Выполнение задачи в потоке пула"""
+        if self._cancel_event.is_set():
+            self.status = JOB_CANCELLED
+            self._manager.job_changed.emit(self)
+            return
+        
+        self.status = JOB_RUNNING
+        self._manager.job_changed.emit(self)
+        started = time.perf_counter()
+        try:
+            self.result = self._func(self, *self._args, **self._kwargs)
+            self.status = JOB_FINISHED
+        except JobCancelled:
+            self.status = JOB_CANCELLED
+        except Exception as e:
+            logger.exception("Ошибка фоновой задачи %r", self.title)
+            self.error = str(e)
+            self.status = JOB_FAILED
+        finally:
+            db.close_thread_connection()
+        
+        logger.info("Фоновая задача %r: %s за %.2f с", self.title, self.status, time.perf_counter() - started)
+        self._manager.job_changed.emit(self)
+
+
+class JobManager(QObject):
+    """Запуск фоновых задач и отслеживание их состояния"""
+    
+    # Сигналы принимаются в главном потоке (соединение через очередь событий)
+    job_added = Signal(object)
+    job_changed = Signal(object)
+    job_removed = Signal(object)
+    
+    def __init__(self, max_threads=MAX_THREADS, parent=None):
+        super().__init__(parent)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(max_threads)
+        self._jobs = OrderedDict()
+        self._next_id = 1
+        self._quit_connected = False
+    
+    def submit(self, title, func, *args, **kwargs):
+        """
+        Постановка задачи в очередь
+        
+        :param title: Название задачи для панели задач
+        :param func: Функция func(job, *args, **kwargs)
+        :return: Job
+        """
+        job = Job(self, self._next_id, title, func, args, kwargs)
+        self._next_id += 1
+        self._jobs[job.id] = job
+        
+        # При выходе из приложения незавершенные задачи отменяются
+        app = QCoreApplication.instance()
+        if app is not None and not self._quit_connected:
+            app.aboutToQuit.connect(self.shutdown)
+            self._quit_connected = True
+        
+        self.job_added.emit(job)
+        self._pool.start(job)
+        return job
+    
+    def jobs(self):
+        """Все задачи в порядке запуска"""
+        return list(self._jobs.values())
+    
+    def active_jobs(self):
+        """Задачи в очереди и выполняющиеся"""
+        return [job for job in self._jobs.values() if job.active]
+    
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+    
+    def cancel(self, job_id):
+        """Отмена задачи; задача из очереди снимается сразу"""
+        job = self._jobs.get(job_id)
+        if job is None or not job.active:
+            return
+        job.cancel()
+        if job.status == JOB_QUEUED and self._pool.tryTake(job):
+            job.status = JOB_CANCELLED
+            self.job_changed.emit(job)
+    
+    def remove_finished(self):
+        """Удаление завершенных задач из списка"""
+        for job in [job for job in self._jobs.values() if not job.active]:
+            del self._jobs[job.id]
+            self.job_removed.emit(job)
+    
+    def wait(self, msecs=-1):
+        """Ожидание завершения всех задач; False, если время ожидания истекло"""
+        return self._pool.waitForDone(msecs)
+    
+    def shutdown(self):
+        """Отмена всех задач и ожидание завершения выполняющихся"""
+        for job in self.active_jobs():
+            self.cancel(job.id)
+        self.wait()
+
+
+class JobsPanel(QWidget):
+    """Панель фоновых задач: прогресс, отмена и открытие созданных файлов"""
+    
+    COLUMNS = ["Задача", "Состояние", "Прогресс", "Файл"]
+    
+    def __init__(self, manager=None, parent=None):
+        super().__init__(parent)
+        self.manager = manager or job_manager
+        # ID задачи -> номер строки таблицы
+        self._rows = {}
+        self.setup_ui()
+        
+        for job in self.manager.jobs():
+            self.add_job(job)
+        self.manager.job_added.connect(self.add_job)
+        self.manager.job_changed.connect(self.update_job)
+        self.manager.job_removed.connect(self.rebuild)
+    
+    def setup_ui(self):
+        """Настройка интерфейса"""
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.verticalHeader().setVisible(False)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.Stretch)
+        header.setSectionResizeMode(3, QHeaderView.Stretch)
+        self.table.itemSelectionChanged.connect(self.update_buttons)
+        self.table.itemDoubleClicked.connect(lambda item: self.open_file())
+        layout.addWidget(self.table)
+        
+        buttons_layout = QHBoxLayout()
+        self.cancel_button = QPushButton("Отменить")
+        self.cancel_button.clicked.connect(self.cancel_job)
+        self.open_button = QPushButton("Открыть файл")
+        self.open_button.clicked.connect(self.open_file)
+        self.open_folder_button = QPushButton("Открыть папку")
+        self.open_folder_button.clicked.connect(self.open_folder)
+        clear_button = QPushButton("Очистить завершенные")
+        clear_button.clicked.connect(self.manager.remove_finished)
+        
+        buttons_layout.addWidget(self.cancel_button)
+        buttons_layout.addWidget(self.open_button)
+        buttons_layout.addWidget(self.open_folder_button)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(clear_button)
+        layout.addLayout(buttons_layout)
+        
+        self.update_buttons()
+    
+    def add_job(self, job):
+        """Добавление строки задачи"""
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        self._rows[job.id] = row
+        
+        title_item = QTableWidgetItem(job.title)
+        title_item.setData(Qt.UserRole, job.id)
+        self.table.setItem(row, 0, title_item)
+        self.table.setItem(row, 1, QTableWidgetItem())
+        progress = QProgressBar()
+        progress.setTextVisible(True)
+        self.table.setCellWidget(row, 2, progress)
+        self.table.setItem(row, 3, QTableWidgetItem())
+        self.update_job(job)
+    
+    def update_job(self, job):
+        """Обновление строки задачи по ее текущему состоянию"""
+        row = self._rows.get(job.id)
+        if row is None:
+            return
+        
+        status_text = JOB_STATUS_NAMES.get(job.status, job.status)
+        if job.status == JOB_RUNNING and job.message:
+            status_text = f"{status_text}: {job.message}"
+        status_item = self.table.item(row, 1)
+        status_item.setText(status_text)
+        status_item.setToolTip(job.error or "")
+        
+        progress = self.table.cellWidget(row, 2)
+        if job.status == JOB_FINISHED:
+            progress.setRange(0, 1)
+            progress.setValue(1)
+        elif job.total:
+            progress.setRange(0, job.total)
+            progress.setValue(min(job.done, job.total))
+        elif job.status == JOB_RUNNING:
+            # Общее количество неизвестно - индикатор без шкалы
+            progress.setRange(0, 0)
+        else:
+            progress.setRange(0, 1)
+            progress.setValue(0)
+        
+        file_item = self.table.item(row, 3)
+        file_path = job.file_path
+        file_item.setText(os.path.basename(file_path) if file_path else "")
+        file_item.setToolTip(file_path or "")
+        
+        self.update_buttons()
+    
+    def rebuild(self, *args):
+        """Перестроение таблицы после удаления задач"""
+        self.table.setRowCount(0)
+        self._rows.clear()
+        for job in self.manager.jobs():
+            self.add_job(job)
+    
+    def selected_job(self):
+        """Выбранная задача"""
+        row = self.table.currentRow()
+        if row < 0 or not self.table.selectionModel().hasSelection():
+            return None
+        item = self.table.item(row, 0)
+        return self.manager.get(item.data(Qt.UserRole)) if item else None
+    
+    def update_buttons(self):
+        job = self.selected_job()
+        self.cancel_button.setEnabled(bool(job and job.active))
+        self.open_button.setEnabled(bool(job and job.file_path))
+        self.open_folder_button.setEnabled(bool(job and job.file_path))
+    
+    def cancel_job(self):
+        job = self.selected_job()
+        if job is not None:
+            self.manager.cancel(job.id)
+    
+    def open_file(self):
+        """Открытие созданного файла приложением по умолчанию"""
+        job = self.selected_job()
+        if job is not None and job.file_path:
+            QDesktopServices.openUrl(QUrl.fromLocalFile(job.file_path))
+    
+    def open_folder(self):
+        """Открытие папки с созданным файлом"""
+        job = self.selected_job()
+        if job is not None and job.file_path:
+            QDesktopServices.openUrl(QUrl.fromLocalFile(os.path.dirname(job.file_path)))
+
+
+# Общий менеджер задач приложения
+job_manager = JobManager()
@@ -0,0 +1,1480 @@
+"""
+Замеры производительности запросов к базе данных.
+
+Каждый замер создает временную базу данных SQLite, заполняет ее
+синтетическими данными и выводит время выполнения запросов.
+
+Использование:
+    python benchmarks.py                 # все замеры
+    python benchmarks.py date_range      # только указанный замер
+    python benchmarks.py date_range --rows 100000
+"""
+import argparse
+import os
+import random
+import shutil
+import socketserver
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from query_builder import QueryConditions
+
+
+def timed(func, repeat=5):
+    """Лучшее время выполнения функции из нескольких повторов (в секундах)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def create_analysis_results(connection, rows):
+    """Создание таблицы результатов анализов с синтетическими данными"""
+    connection.execute("""
+        CREATE TABLE analysis_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER NOT NULL,
+            analysis_type_id INTEGER NOT NULL,
+            lab_user_id INTEGER NOT NULL,
+            result_data TEXT,
+            result_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            status TEXT DEFAULT 'pending'
+        )
+    """)
+    
+    random.seed(42)
+    start = datetime(2020, 1, 1)
+    span_seconds = 5 * 365 * 24 * 3600
+    
+    def generate():
+        for _ in range(rows):
+            moment = start + timedelta(seconds=random.randrange(span_seconds))
+            yield (
+                random.randint(1, 10000),
+                random.randint(1, 10),
+                random.randint(1, 20),
+                '{}',
+                moment.strftime("%Y-%m-%d %H:%M:%S"),
+                'completed'
+            )
+            
+    connection.executemany(
+        "INSERT INTO analysis_results (patient_id, analysis_type_id, lab_user_id, result_data, result_date, status) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        generate()
+    )
+    connection.execute("CREATE INDEX idx_analysis_results_date ON analysis_results(result_date)")
+    connection.commit()
+
+
+class SmtpSink:
+    """
+    Локальный SMTP-сервер для замеров: принимает письма и не доставляет их
+    
+    Поддерживает команды, которые использует smtplib без STARTTLS и входа.
+    reply_delay имитирует задержку сети перед каждым ответом сервера,
+    fail_rcpt - количество первых команд RCPT с временной ошибкой 451.
+    """
+    
+    def __init__(self, reply_delay=0.0, fail_rcpt=0):
+        self.reply_delay = reply_delay
+        self.fail_rcpt = fail_rcpt
+        self.messages = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        sink = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                if sink.reply_delay:
+                    time.sleep(sink.reply_delay)
+                self.wfile.write(line.encode() + b"\r\n")
+            
+            def handle(self):
+                with sink._lock:
+                    sink.connections += 1
+                self.reply("220 localhost ESMTP")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode('ascii', 'replace').strip().upper()
+                    if command.startswith("EHLO"):
+                        self.wfile.write(b"250-localhost\r\n")
+                        self.reply("250 8BITMIME")
+                    elif command.startswith("RCPT"):
+                        with sink._lock:
+                            failed = sink.fail_rcpt > 0
+                            sink.fail_rcpt -= failed
+                        self.reply("451 Try again later" if failed else "250 OK")
+                    elif command == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                        while self.rfile.readline() not in (b".\r\n", b""):
+                            pass
+                        with sink._lock:
+                            sink.messages += 1
+                        self.reply("250 OK")
+                    elif command == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        # HELO, MAIL, RSET, NOOP
+                        self.reply("250 OK")
+        
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    
+    def __enter__(self):
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def benchmark_date_range(rows):
+    """Фильтр по периоду: date(столбец) BETWEEN против полуоткрытого интервала"""
+    print(f"== Фильтр по периоду, строк: {rows} ==")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        connection = sqlite3.connect(os.path.join(temp_dir, 'benchmark.db'))
+        try:
+            started = time.perf_counter()
+            create_analysis_results(connection, rows)
+            print(f"Заполнение базы данных: {time.perf_counter() - started:.2f} с")
+            
+            start_date, end_date = "2022-03-01", "2022-03-07"
+            
+            wrapped_query = (
+                "SELECT COUNT(*) FROM analysis_results "
+                "WHERE date(result_date) BETWEEN ? AND ?"
+            )
+            wrapped_params = (start_date, end_date)
+            
+            conditions = QueryConditions().add_date_range("result_date", start_date, end_date)
+            range_query = f"SELECT COUNT(*) FROM analysis_results WHERE {conditions.where_clause()}"
+            range_params = tuple(conditions.params)
+            
+            for title, query, params in (
+                ("date(result_date) BETWEEN", wrapped_query, wrapped_params),
+                ("полуоткрытый интервал", range_query, range_params),
+            ):
+                plan = connection.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+                elapsed, result = timed(lambda: connection.execute(query, params).fetchone()[0])
+                print(f"{title}: {elapsed * 1000:.2f} мс, строк: {result}")
+                for row in plan:
+                    print(f"    {row[-1]}")
+        finally:
+            connection.close()
+
+
+def benchmark_table_model(rows):
+    """Обновление таблицы пациентов через LazyQueryTableModel при росте числа строк"""
+    import tracemalloc
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication, QTableView
+    from database_connection import db, DatabaseConnection
+    from table_models import LazyQueryTableModel, TableColumn, ActionButtonsDelegate, RowAction
+    
+    app = QApplication.instance() or QApplication([])
+    print(f"== Таблица пациентов (LazyQueryTableModel), строк: до {rows} ==")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Схема берется из рабочей базы данных приложения
+        db.db_path = os.path.join(temp_dir, 'benchmark.db')
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db'), db.db_path)
+        if not db.connect(DatabaseConnection._db_password):
+            return
+        try:
+            view = QTableView()
+            model = LazyQueryTableModel([
+                TableColumn("ID", 'id'),
+                TableColumn("ФИО", 'full_name'),
+                TableColumn("Дата рождения", 'birth_date'),
+                TableColumn("Действия")
+            ])
+            view.setModel(model)
+            view.setItemDelegateForColumn(3, ActionButtonsDelegate([
+                RowAction("Редактировать", print),
+                RowAction("Удалить", print)
+            ], view))
+            view.resize(800, 600)
+            view.show()
+            
+            inserted = 0
+            for total in (rows // 10, rows):
+                db._connection.executemany(
+                    "INSERT INTO patients (full_name, birth_date, gender) VALUES (?, ?, 'Мужской')",
+                    ((f"Пациент {number}", "1980-01-01") for number in range(inserted, total))
+                )
+                db._connection.commit()
+                inserted = total
+                
+                tracemalloc.start()
+                started = time.perf_counter()
+                model.set_query("SELECT * FROM patients")
+                app.processEvents()
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                
+                print(f"Строк в таблице БД: {total}, загружено в модель: {model.rowCount()}, "
+                      f"обновление: {elapsed * 1000:.2f} мс, пик памяти Python: {peak / 1024:.0f} КБ")
+        finally:
+            db.disconnect()
+
+
+def benchmark_connection_pool(rows):
+    """app.database.Database: соединение на каждый запрос против пула соединений"""
+    from app.database.database import Database
+    
+    print(f"== Пул соединений app.database.Database, запросов: {rows} ==")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'benchmark.db')
+        connection = sqlite3.connect(db_path)
+        connection.execute("""
+            CREATE TABLE parameter_values (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                analysis_result_id INTEGER NOT NULL,
+                parameter_id INTEGER NOT NULL,
+                value REAL NOT NULL
+            )
+        """)
+        connection.commit()
+        connection.close()
+        
+        insert_query = "INSERT INTO parameter_values (analysis_result_id, parameter_id, value) VALUES (?, ?, ?)"
+        select_query = "SELECT id, value FROM parameter_values WHERE id = ?"
+        
+        def open_per_call(query, parameters):
+            # Прежнее поведение Database.execute_query
+            conn = sqlite3.connect(db_path)
+            cursor = conn.cursor()
+            cursor.execute(query, parameters)
+            if query.lstrip().upper().startswith('SELECT'):
+                result = cursor.fetchone()
+            else:
+                conn.commit()
+                result = cursor.lastrowid
+            conn.close()
+            return result
+        
+        database = Database(db_path)
+        
+        def pooled(query, parameters):
+            return database.execute_query(query, parameters, fetchone=True)
+        
+        try:
+            for title, execute in (("соединение на запрос", open_per_call), ("пул соединений", pooled)):
+                started = time.perf_counter()
+                for number in range(rows):
+                    execute(insert_query, (number, number % 10, 1.5))
+                insert_elapsed = time.perf_counter() - started
+                
+                started = time.perf_counter()
+                for number in range(1, rows + 1):
+                    execute(select_query, (number,))
+                select_elapsed = time.perf_counter() - started
+                
+                print(f"{title}: INSERT {insert_elapsed / rows * 1e6:.1f} мкс/запрос, "
+                      f"SELECT {select_elapsed / rows * 1e6:.1f} мкс/запрос")
+        finally:
+            database.close()
+
+
+def benchmark_analysis_import(rows):
+    """Сохранение результатов анализов: по одному значению против пакетной вставки"""
+    from app.database.database import Database
+    
+    parameters_per_result = 10
+    print(f"== Сохранение результатов анализов, результатов: {rows}, параметров в каждом: {parameters_per_result} ==")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = os.path.join(temp_dir, 'benchmark.db')
+        connection = sqlite3.connect(db_path)
+        connection.executescript("""
+            CREATE TABLE analysis_results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patient_id INTEGER NOT NULL,
+                analysis_type_id INTEGER NOT NULL,
+                date_taken TEXT NOT NULL,
+                lab_technician_id INTEGER NOT NULL,
+                status TEXT NOT NULL
+            );
+            CREATE TABLE parameter_values (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                analysis_result_id INTEGER NOT NULL,
+                parameter_id INTEGER NOT NULL,
+                value REAL NOT NULL
+            );
+        """)
+        connection.close()
+        
+        database = Database(db_path)
+        results = [
+            {
+                'patient_id': number % 500 + 1,
+                'analysis_type_id': 1,
+                'date_taken': '2024-01-15',
+                'lab_technician_id': 3,
+                'values': [(parameter_id, 4.5 + parameter_id) for parameter_id in range(1, parameters_per_result + 1)]
+            }
+            for number in range(rows)
+        ]
+        
+        try:
+            # Прежний путь: заголовок и каждое значение отдельным запросом со своей фиксацией
+            started = time.perf_counter()
+            for result in results:
+                result_id = database.add_analysis_result(
+                    result['patient_id'], result['analysis_type_id'],
+                    result['date_taken'], result['lab_technician_id']
+                )
+                for parameter_id, value in result['values']:
+                    database.add_parameter_value(result_id, parameter_id, value)
+            single_elapsed = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            for result in results:
+                database.add_analysis_result_with_values(
+                    result['patient_id'], result['analysis_type_id'],
+                    result['date_taken'], result['lab_technician_id'], result['values']
+                )
+            per_result_elapsed = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            database.import_analysis_results(results)
+            bulk_elapsed = time.perf_counter() - started
+            
+            print(f"по одному значению: {single_elapsed:.2f} с")
+            print(f"add_analysis_result_with_values: {per_result_elapsed:.2f} с")
+            print(f"import_analysis_results (одна транзакция): {bulk_elapsed:.3f} с")
+        finally:
+            database.close()
+
+
+def benchmark_concurrent_writes(rows):
+    """Одновременный ввод результатов с нескольких рабочих мест лаборатории"""
+    import threading
+    from database_connection import DatabaseConnection
+    from db_writer import DatabaseWriter
+    
+    writers = 4
+    per_writer = rows // writers
+    insert_query = """
+        INSERT INTO analysis_results (patient_id, analysis_type_id, lab_user_id, result_data, status)
+        VALUES (?, ?, ?, ?, 'completed')
+    """
+    result_data = '{"Гемоглобин": "140", "Лейкоциты": "6.5"}'
+    source_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db')
+    
+    print(f"== Параллельный ввод результатов: {writers} потока по {per_writer} записей, "
+          f"1 поток чтения ==")
+    
+    def run(db_path, pragmas, write):
+        """Запуск потоков записи и потока чтения; возвращает время записи и число чтений"""
+        done = threading.Event()
+        reads = [0]
+        
+        def reader():
+            connection = sqlite3.connect(db_path)
+            for name, value in pragmas.items():
+                connection.execute(f"PRAGMA {name} = {value}")
+            while not done.is_set():
+                try:
+                    connection.execute(
+                        "SELECT COUNT(*) FROM analysis_results WHERE patient_id = ?", (1,)
+                    ).fetchone()
+                    reads[0] += 1
+                except sqlite3.OperationalError:
+                    pass
+                # Окно врача обновляет данные периодически, а не в цикле без пауз
+                time.sleep(0.001)
+            connection.close()
+        
+        threads = [threading.Thread(target=write, args=(number,)) for number in range(writers)]
+        reader_thread = threading.Thread(target=reader)
+        reader_thread.start()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        reader_thread.join()
+        return elapsed, reads[0]
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for title, profile, use_writer in (
+            ("журнал отката, фиксация на каждый запрос", 'compat', False),
+            ("WAL, фиксация на каждый запрос", 'wal', False),
+            ("WAL, поток-писатель", 'wal', True),
+            ("WAL + synchronous=FULL, фиксация на каждый запрос", 'wal_full', False),
+            ("WAL + synchronous=FULL, поток-писатель", 'wal_full', True),
+        ):
+            db_path = os.path.join(temp_dir, f'benchmark_{profile}_{int(use_writer)}.db')
+            shutil.copyfile(source_path, db_path)
+            if profile == 'wal_full':
+                # Фиксация с fsync: так ведет себя WAL при требовании полной надежности
+                pragmas = dict(DatabaseConnection.STORAGE_PROFILES['wal'], synchronous='FULL')
+            else:
+                pragmas = DatabaseConnection.STORAGE_PROFILES[profile]
+            
+            if use_writer:
+                writer = DatabaseWriter(db_path, pragmas)
+                writer.start()
+                
+                def write(number):
+                    # Как DatabaseConnection.execute_query: ожидание результата каждой записи
+                    for index in range(per_writer):
+                        writer.submit(insert_query, (index % 10 + 1, 1, 3, result_data)).result()
+            else:
+                def write(number):
+                    connection = sqlite3.connect(db_path, timeout=30)
+                    for name, value in pragmas.items():
+                        connection.execute(f"PRAGMA {name} = {value}")
+                    for index in range(per_writer):
+                        connection.execute(insert_query, (index % 10 + 1, 1, 3, result_data))
+                        connection.commit()
+                    connection.close()
+            
+            # Режим журнала хранится в файле базы данных
+            connection = sqlite3.connect(db_path)
+            connection.execute(f"PRAGMA journal_mode = {pragmas.get('journal_mode', 'DELETE')}")
+            connection.close()
+            
+            try:
+                elapsed, reads = run(db_path, pragmas, write)
+            finally:
+                if use_writer:
+                    writer.stop()
+            
+            total = per_writer * writers
+            print(f"{title}: {elapsed:.2f} с, {total / elapsed:.0f} записей/с, "
+                  f"чтений за время записи: {reads}")
+
+
+def benchmark_startup(rows):
+    """Подключение к базе данных: первое открытие, переподключение и запросы"""
+    from database_connection import db, DatabaseConnection
+    
+    print(f"== Подключение DatabaseConnection, переподключений: {rows} ==")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, 'benchmark.db')
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db'), db.db_path)
+        
+        try:
+            # Первое открытие: создание таблиц, миграции, проверка тестовых данных
+            started = time.perf_counter()
+            db.connect(DatabaseConnection._db_password)
+            cold_elapsed = time.perf_counter() - started
+            
+            # Прежнее поведение: инициализация схемы при каждом переподключении
+            started = time.perf_counter()
+            for _ in range(rows):
+                db.disconnect()
+                db.connect()
+                db._initialize_database()
+            old_reconnect_elapsed = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            for _ in range(rows):
+                db.disconnect()
+                db.connect()
+            reconnect_elapsed = time.perf_counter() - started
+            
+            queries = rows * 10
+            query = "SELECT id FROM users WHERE id = ?"
+            
+            # Прежнее поведение: os.path.exists перед каждым запросом
+            started = time.perf_counter()
+            for _ in range(queries):
+                os.path.exists(db.db_path)
+                db.fetch_one(query, (1,))
+            old_query_elapsed = time.perf_counter() - started
+            
+            started = time.perf_counter()
+            for _ in range(queries):
+                db.fetch_one(query, (1,))
+            query_elapsed = time.perf_counter() - started
+            
+            print(f"первое подключение (с инициализацией схемы): {cold_elapsed * 1000:.2f} мс")
+            print(f"переподключение с инициализацией схемы: {old_reconnect_elapsed / rows * 1000:.2f} мс")
+            print(f"переподключение: {reconnect_elapsed / rows * 1000:.2f} мс")
+            print(f"fetch_one с проверкой файла: {old_query_elapsed / queries * 1e6:.1f} мкс/запрос")
+            print(f"fetch_one: {query_elapsed / queries * 1e6:.1f} мкс/запрос")
+        finally:
+            db.disconnect()
+
+
+def benchmark_row_formats(rows):
+    """Создание строк результата: прежний _dict_factory против форматов row_types"""
+    from row_types import convert_rows
+    
+    def old_dict_factory(cursor, row):
+        # Прежний DatabaseConnection._dict_factory
+        d = {}
+        for idx, col in enumerate(cursor.description):
+            d[col[0]] = row[idx]
+        return d
+    
+    print(f"== Форматы строк результата (таблица пациентов, 9 столбцов), строк: до {rows} ==")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        connection = sqlite3.connect(os.path.join(temp_dir, 'benchmark.db'))
+        try:
+            connection.execute("""
+                CREATE TABLE patients (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    full_name TEXT NOT NULL,
+                    birth_date TEXT NOT NULL,
+                    gender TEXT,
+                    phone TEXT,
+                    email TEXT,
+                    address TEXT,
+                    created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            inserted = 0
+            for total in (rows // 100, rows // 10, rows):
+                connection.executemany(
+                    "INSERT INTO patients (full_name, birth_date, gender, phone, email, address) "
+                    "VALUES (?, '1980-01-01', 'Мужской', '+7 900 000-00-00', 'patient@example.com', 'Москва')",
+                    ((f"Пациент {number}",) for number in range(inserted, total))
+                )
+                connection.commit()
+                inserted = total
+                
+                cursor = connection.cursor()
+                started = time.perf_counter()
+                values = cursor.execute(f"SELECT * FROM patients LIMIT {total}").fetchall()
+                print(f"Строк: {total}, чтение кортежей: {(time.perf_counter() - started) * 1000:.1f} мс")
+                
+                # Замеряется только создание строк из уже прочитанных значений
+                for title, func in (
+                    ("_dict_factory (прежний)", lambda: [old_dict_factory(cursor, row) for row in values]),
+                    ("dict", lambda: convert_rows('dict', cursor.description, values)),
+                    ("sqlite3.Row", lambda: [sqlite3.Row(cursor, row) for row in values]),
+                    ("record", lambda: convert_rows('record', cursor.description, values)),
+                ):
+                    elapsed, _ = timed(func, repeat=3)
+                    print(f"    {title}: {elapsed * 1000:.1f} мс")
+        finally:
+            connection.close()
+
+
+def benchmark_reference_ranges(rows):
+    """Проверка значений по нормам: словарь на каждый вызов против индекса reference_ranges"""
+    from reference_ranges import DEFAULT_RANGES, ReferenceRanges
+    
+    def old_is_normal(parameter, value):
+        # Прежний подход: словарь норм создается при каждом вызове
+        normal_values = {
+            name: {'min': low, 'max': high, 'unit': unit}
+            for name, sex, age_min, age_max, low, high, unit, text in DEFAULT_RANGES if sex is None
+        }
+        normal = normal_values.get(parameter, {'min': None, 'max': None})
+        if normal['min'] is None or normal['max'] is None or value is None:
+            return None
+        return normal['min'] <= value <= normal['max']
+    
+    print(f"== Проверка значений по нормам, значений: {rows} ==")
+    generator = random.Random(42)
+    names = sorted({row[0] for row in DEFAULT_RANGES})
+    parameters = [generator.choice(names) for _ in range(rows)]
+    values = [generator.uniform(0, 200) for _ in range(rows)]
+    sexes = [generator.choice(('Мужской', 'Женский', None)) for _ in range(rows)]
+    ages = [generator.randint(18, 90) for _ in range(rows)]
+    
+    index = ReferenceRanges(DEFAULT_RANGES)
+    for title, func in (
+        ("словарь на каждый вызов (прежний)", lambda: [old_is_normal(p, v) for p, v in zip(parameters, values)]),
+        ("lookup() для каждого значения", lambda: [index.lookup(p, s, a) for p, s, a in zip(parameters, sexes, ages)]),
+        ("evaluate() пакетом (numpy)", lambda: index.evaluate(parameters, values, sexes, ages)),
+    ):
+        elapsed, _ = timed(func, repeat=3)
+        print(f"    {title}: {elapsed * 1000:.1f} мс")
+
+
+def benchmark_analysis_flags(rows):
+    """Проверка результатов по нормам: разбор JSON для каждого результата против пакета analysis_flags"""
+    import json
+    from analysis_flags import AnalysisFlags
+    from analysis_values import parse_parameter_value, save_parameter_values
+    from database_connection import db, DatabaseConnection
+    from reference_ranges import DEFAULT_RANGES
+    
+    def old_flags(result):
+        # Прежняя проверка: разбор JSON и словарь норм для каждого результата
+        normal_values = {
+            name: {'min': low, 'max': high}
+            for name, sex, age_min, age_max, low, high, unit, text in DEFAULT_RANGES if sex is None
+        }
+        abnormal = 0
+        for name, value in json.loads(result['result_data']).items():
+            normal = normal_values.get(name)
+            number = parse_parameter_value(value)[0]
+            if normal and normal['min'] is not None and number is not None:
+                abnormal += not normal['min'] <= number <= normal['max']
+        return abnormal
+    
+    print(f"== Проверка результатов анализов по нормам, результатов: {rows} ==")
+    generator = random.Random(42)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, 'benchmark.db')
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db'), db.db_path)
+        db.connect(DatabaseConnection._db_password)
+        try:
+            patient_ids = [row['id'] for row in db.fetch_all("SELECT id FROM patients")]
+            
+            def insert_results(cursor):
+                known_ids = {}
+                for _ in range(rows):
+                    values = {
+                        'Гемоглобин': f"{generator.randint(100, 180)} г/л",
+                        'Эритроциты': f"{generator.uniform(3.5, 6.0):.1f} млн/мкл",
+                        'Лейкоциты': f"{generator.uniform(3.0, 11.0):.1f} тыс/мкл",
+                        'Тромбоциты': f"{generator.randint(150, 350)} тыс/мкл",
+                        'СОЭ': f"{generator.randint(1, 20)} мм/ч",
+                    }
+                    cursor.execute(
+                        "INSERT INTO analysis_results (patient_id, analysis_type_id, lab_user_id, result_data, status) "
+                        "VALUES (?, 1, 3, ?, 'completed')",
+                        (generator.choice(patient_ids), json.dumps(values))
+                    )
+                    save_parameter_values(cursor, cursor.lastrowid, 1, values, known_ids)
+            
+            db.run_in_transaction(insert_results)
+            results = db.get_all_analysis_results()
+            print(f"Результатов в базе: {len(results)}")
+            
+            for title, func in (
+                ("JSON и словарь норм для каждого результата (прежний)", lambda: [old_flags(r) for r in results]),
+                ("analysis_flags, пустой кэш", lambda: AnalysisFlags(db).flag_results(results)),
+            ):
+                elapsed, _ = timed(func, repeat=3)
+                print(f"    {title}: {elapsed * 1000:.1f} мс")
+            
+            flags = AnalysisFlags(db)
+            flags.flag_results(results)
+            elapsed, flagged = timed(lambda: flags.flag_results(results), repeat=3)
+            print(f"    analysis_flags, из кэша: {elapsed * 1000:.1f} мс")
+            print(f"Результатов со значениями вне нормы: {sum(f.abnormal for f in flagged.values())}")
+        finally:
+            db.disconnect()
+
+
+def benchmark_statistics(rows):
+    """Статистика за период: COUNT/GROUP BY по таблицам против дневных сводок statistics_service"""
+    from database_connection import db, DatabaseConnection
+    from query_builder import date_range
+    from statistics_service import StatisticsService
+    
+    print(f"== Статистика за период, результатов анализов: {rows}, приемов: {rows // 5} ==")
+    generator = random.Random(42)
+    start = datetime(2020, 1, 1)
+    
+    def random_date():
+        return (start + timedelta(minutes=generator.randrange(5 * 365 * 24 * 60))).strftime('%Y-%m-%d %H:%M:%S')
+    
+    analyses = [
+        (generator.randint(1, 10), generator.randint(1, 3), 3, random_date(),
+         generator.choice(('pending', 'completed', 'sent')))
+        for _ in range(rows)
+    ]
+    appointments = [
+        (1, generator.randint(1, 10), random_date(), generator.choice(('scheduled', 'completed', 'cancelled')))
+        for _ in range(rows // 5)
+    ]
+    
+    def raw_statistics(start_date, end_date):
+        # Прежние запросы SystemStatisticsWidget
+        period = date_range(start_date, end_date)
+        return (
+            db.fetch_all("SELECT role, COUNT(*) as count FROM users GROUP BY role"),
+            db.fetch_one("SELECT COUNT(*) as count FROM patients"),
+            db.fetch_one("SELECT COUNT(*) as count FROM patients WHERE created_at >= ? AND created_at < ?", period),
+            db.fetch_one("SELECT COUNT(*) as count FROM analysis_results WHERE result_date >= ? AND result_date < ?",
+                         period),
+            db.fetch_all("""
+                SELECT at.name, COUNT(ar.id) as count
+                FROM analysis_results ar
+                JOIN analysis_types at ON ar.analysis_type_id = at.id
+                WHERE ar.result_date >= ? AND ar.result_date < ?
+                GROUP BY at.name
+                ORDER BY count DESC
+            """, period),
+            db.fetch_one("SELECT COUNT(*) as count FROM appointments WHERE appointment_date >= ? AND appointment_date < ?",
+                         period),
+            db.fetch_all("""
+                SELECT status, COUNT(*) as count
+                FROM appointments
+                WHERE appointment_date >= ? AND appointment_date < ?
+                GROUP BY status
+            """, period),
+        )
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, 'benchmark.db')
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db'), db.db_path)
+        db.connect(DatabaseConnection._db_password)
+        try:
+            # Стоимость поддержки сводок триггерами при записи: та же вставка
+            # без триггеров выполняется отдельным соединением и откатывается
+            insert_analyses = ("INSERT INTO analysis_results (patient_id, analysis_type_id, lab_user_id, "
+                               "result_date, status) VALUES (?, ?, ?, ?, ?)")
+            insert_appointments = ("INSERT INTO appointments (doctor_id, patient_id, appointment_date, status) "
+                                   "VALUES (?, ?, ?, ?)")
+            
+            connection = sqlite3.connect(db.db_path, isolation_level=None)
+            try:
+                connection.execute("BEGIN")
+                for (name,) in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_stat_%'"
+                ).fetchall():
+                    connection.execute(f"DROP TRIGGER {name}")
+                started = time.perf_counter()
+                connection.executemany(insert_analyses, analyses)
+                connection.executemany(insert_appointments, appointments)
+                without_triggers = time.perf_counter() - started
+                connection.execute("ROLLBACK")
+            finally:
+                connection.close()
+            
+            def insert_all(cursor):
+                cursor.executemany(insert_analyses, analyses)
+                cursor.executemany(insert_appointments, appointments)
+            
+            started = time.perf_counter()
+            db.run_in_transaction(insert_all)
+            with_triggers = time.perf_counter() - started
+            print(f"Запись {rows + rows // 5} строк: без триггеров сводок {without_triggers:.2f} с, "
+                  f"с триггерами {with_triggers:.2f} с")
+            
+            for title, start_date, end_date in (
+                ("месяц", '2023-03-01', '2023-03-31'),
+                ("год", '2023-01-01', '2023-12-31'),
+                ("весь период", '2020-01-01', '2024-12-31'),
+            ):
+                raw_elapsed, _ = timed(lambda: raw_statistics(start_date, end_date), repeat=3)
+                rollup_elapsed, _ = timed(lambda: StatisticsService(db).get_statistics(start_date, end_date), repeat=3)
+                service = StatisticsService(db)
+                service.get_statistics(start_date, end_date)
+                cached_elapsed, _ = timed(lambda: service.get_statistics(start_date, end_date), repeat=3)
+                print(f"    {title}: запросы к таблицам {raw_elapsed * 1000:.1f} мс, "
+                      f"сводки {rollup_elapsed * 1000:.2f} мс, из кэша {cached_elapsed * 1000:.3f} мс")
+        finally:
+            db.disconnect()
+
+
+def benchmark_excel_export(rows):
+    """Экспорт результатов анализов в Excel: xlwt (.xls) против потоковой записи excel_export (.xlsx)"""
+    import tracemalloc
+    import xlwt
+    from excel_export import ExcelColumn, export_rows
+    
+    xls_rows = min(rows, 65535)
+    print(f"== Экспорт в Excel, строк: {rows} (xlwt: не более {xls_rows}) ==")
+    
+    query = "SELECT id, result_date, patient_id, analysis_type_id, lab_user_id, status FROM analysis_results"
+    headers = ["ID", "Дата", "Пациент", "Тип анализа", "Лаборант", "Статус"]
+    columns = [ExcelColumn(title, lambda row, index=index: row[index]) for index, title in enumerate(headers)]
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        connection = sqlite3.connect(os.path.join(temp_dir, 'benchmark.db'))
+        try:
+            create_analysis_results(connection, rows)
+            
+            def iter_rows(limit):
+                cursor = connection.execute(f"{query} LIMIT ?", (limit,))
+                try:
+                    while True:
+                        batch = cursor.fetchmany(1000)
+                        if not batch:
+                            break
+                        yield from batch
+                finally:
+                    cursor.close()
+            
+            def export_xlwt(limit):
+                # Прежний экспорт: вся книга собирается в памяти
+                workbook = xlwt.Workbook()
+                sheet = workbook.add_sheet("Результаты анализов")
+                for col, header in enumerate(headers):
+                    sheet.write(0, col, header)
+                for row, values in enumerate(iter_rows(limit), 1):
+                    for col, value in enumerate(values):
+                        sheet.write(row, col, value)
+                workbook.save(os.path.join(temp_dir, 'export.xls'))
+            
+            def export_xlsx(limit):
+                export_rows(os.path.join(temp_dir, 'export.xlsx'), "Результаты анализов", columns, iter_rows(limit))
+            
+            for title, func, limit in (
+                ("xlwt, .xls", export_xlwt, xls_rows),
+                ("excel_export, .xlsx", export_xlsx, xls_rows),
+                ("excel_export, .xlsx", export_xlsx, rows),
+            ):
+                elapsed, _ = timed(lambda: func(limit), repeat=1)
+                print(f"    {title}, строк {limit}: {elapsed:.2f} с")
+            
+            # Пик памяти Python при экспорте (tracemalloc замедляет запись,
+            # поэтому измеряется отдельно от времени)
+            memory_rows = min(rows, 100000)
+            for title, func, limit in (
+                ("xlwt, .xls", export_xlwt, min(memory_rows, xls_rows) // 10),
+                ("xlwt, .xls", export_xlwt, min(memory_rows, xls_rows)),
+                ("excel_export, .xlsx", export_xlsx, memory_rows // 10),
+                ("excel_export, .xlsx", export_xlsx, memory_rows),
+            ):
+                tracemalloc.start()
+                func(limit)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f"    {title}, строк {limit}: пик памяти Python {peak / 1024 / 1024:.1f} МБ")
+        finally:
+            connection.close()
+
+
+def benchmark_email_outbox(rows):
+    """Отправка писем: новое SMTP-соединение на каждое письмо против очереди email_outbox"""
+    import smtplib
+    import email_outbox as outbox_module
+    from database_connection import db, DatabaseConnection
+    from email_outbox import EmailOutbox, SmtpSettings, build_message
+    
+    print(f"== Очередь писем, писем: {rows} ==")
+    html = "<html><body><p>Результаты анализа во вложении.</p></body></html>" * 20
+    messages = [
+        build_message("lab@example.com", f"patient{number}@example.com", "Результаты анализа", html).as_string()
+        for number in range(rows)
+    ]
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, 'benchmark.db')
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db'), db.db_path)
+        db.connect(DatabaseConnection._db_password)
+        try:
+            for title, delay in (("локальный сервер", 0.0), ("задержка ответа 2 мс", 0.002)):
+                with SmtpSink(reply_delay=delay) as sink:
+                    settings = SmtpSettings('127.0.0.1', sink.port, '', '', use_tls=False)
+                    
+                    # Прежняя отправка: соединение, EHLO и QUIT для каждого письма
+                    # в потоке окна (STARTTLS и вход не выполняются - сервер без TLS)
+                    started = time.perf_counter()
+                    for number, message in enumerate(messages):
+                        with smtplib.SMTP('127.0.0.1', sink.port) as server:
+                            server.sendmail("lab@example.com", f"patient{number}@example.com", message.encode())
+                    per_message = time.perf_counter() - started
+                    
+                    outbox = EmailOutbox(db, settings)
+                    started = time.perf_counter()
+                    for number, message in enumerate(messages):
+                        outbox.enqueue(f"patient{number}@example.com", "Результаты анализа", message)
+                    enqueued = time.perf_counter() - started
+                    outbox.wait_until_empty()
+                    delivered = time.perf_counter() - started
+                    outbox.stop()
+                    
+                    print(f"{title}:")
+                    print(f"    соединение на письмо: {per_message:.2f} с ({rows / per_message:.0f} писем/с)")
+                    print(f"    email_outbox: постановка в очередь {enqueued:.2f} с "
+                          f"({enqueued / rows * 1000:.2f} мс на письмо в потоке окна), "
+                          f"доставка всех {delivered:.2f} с ({rows / delivered:.0f} писем/с)")
+                    print(f"    соединений с сервером: {sink.connections}, принято писем: {sink.messages}")
+            
+            # Повторная отправка после временной ошибки 451
+            saved_delay = outbox_module.RETRY_BASE_DELAY
+            outbox_module.RETRY_BASE_DELAY = 0
+            try:
+                with SmtpSink(fail_rcpt=2) as sink:
+                    outbox = EmailOutbox(db, SmtpSettings('127.0.0.1', sink.port, '', '', use_tls=False))
+                    outbox.enqueue("patient@example.com", "Результаты анализа", messages[0])
+                    outbox.wait_until_empty(timeout=10)
+                    outbox.stop()
+                    row = db.fetch_one("SELECT status, attempts FROM email_outbox ORDER BY id DESC LIMIT 1")
+                    print(f"Временная ошибка 451 дважды: статус {row['status']}, попыток {row['attempts']}")
+            finally:
+                outbox_module.RETRY_BASE_DELAY = saved_delay
+        finally:
+            db.disconnect()
+
+
+def benchmark_reminders(rows):
+    """Рассылка напоминаний о завтрашних приемах через очередь с пулом SMTP-соединений"""
+    import smtplib
+    from appointment_reminders import queue_reminders, reminders_query
+    from database_connection import db, DatabaseConnection
+    from email_outbox import email_outbox, SmtpSettings
+    
+    print(f"== Напоминания о приемах, приемов на завтра: {rows}, всего приемов: {rows * 10} ==")
+    generator = random.Random(42)
+    tomorrow = datetime.now().date() + timedelta(days=1)
+    start = datetime.combine(tomorrow, datetime.min.time()) - timedelta(days=366)
+    
+    patients = [
+        (f"Пациент {number}", '1980-01-01', f"patient{number}@example.com")
+        for number in range(rows)
+    ]
+    
+    def appointment_time(day):
+        return f"{day.strftime('%Y-%m-%d')} {generator.randrange(8, 20):02d}:{generator.choice((0, 15, 30, 45)):02d}"
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, 'benchmark.db')
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db'), db.db_path)
+        db.connect(DatabaseConnection._db_password)
+        email_outbox.stop()
+        saved_settings, saved_pool_size = email_outbox.settings, email_outbox.pool_size
+        try:
+            def insert_patients(cursor):
+                cursor.executemany("INSERT INTO patients (full_name, birth_date, email) VALUES (?, ?, ?)", patients)
+                return cursor.execute("SELECT MAX(id) FROM patients").fetchone()[0] - rows + 1
+            
+            first_patient = db.run_in_transaction(insert_patients)
+            doctors = [row[0] for row in db.fetch_all("SELECT id FROM doctors", row_format='tuple')]
+            # Завтрашние приемы и в девять раз больше приемов за прошедший год
+            appointments = [
+                (generator.choice(doctors), first_patient + number, appointment_time(tomorrow), 'scheduled')
+                for number in range(rows)
+            ]
+            appointments += [
+                (generator.choice(doctors), first_patient + generator.randrange(rows),
+                 appointment_time(start + timedelta(days=generator.randrange(365))),
+                 generator.choice(('scheduled', 'completed', 'cancelled')))
+                for _ in range(rows * 9)
+            ]
+            db.run_in_transaction(lambda cursor: cursor.executemany(
+                "INSERT INTO appointments (doctor_id, patient_id, appointment_date, status) VALUES (?, ?, ?, ?)",
+                appointments
+            ))
+            
+            query, params = reminders_query(tomorrow)
+            select_elapsed, selected = timed(lambda: db.fetch_all(query, params, row_format='tuple'), repeat=3)
+            print(f"Выборка приемов на завтра: {select_elapsed * 1000:.1f} мс, приемов: {len(selected)}")
+            
+            for delay in (0.0, 0.002):
+                print(f"SMTP-сервер {'без задержки' if not delay else f'с задержкой ответа {delay * 1000:.0f} мс'}:")
+                for pool_size in (1, 4):
+                    db.execute_query("DELETE FROM email_outbox")
+                    db.execute_query("DELETE FROM appointment_reminders")
+                    with SmtpSink(reply_delay=delay) as sink:
+                        email_outbox.pool_size = pool_size
+                        email_outbox.configure(SmtpSettings('127.0.0.1', sink.port, '', '', use_tls=False))
+                        started = time.perf_counter()
+                        queued = queue_reminders(day=tomorrow, sender="clinic@example.com")
+                        enqueued = time.perf_counter() - started
+                        email_outbox.wait_until_empty()
+                        delivered = time.perf_counter() - started
+                        email_outbox.stop()
+                        print(f"    соединений в пуле: {pool_size}: выборка, шаблон и постановка в очередь "
+                              f"{enqueued:.2f} с, доставка всех {delivered:.2f} с ({queued / delivered:.0f} писем/с), "
+                              f"соединений с сервером: {sink.connections}, принято писем: {sink.messages}")
+                
+                # Прежняя отправка: соединение на каждое письмо, замер на части писем
+                sample = db.fetch_all("SELECT recipient, message FROM email_outbox LIMIT 500", row_format='tuple')
+                with SmtpSink(reply_delay=delay) as sink:
+                    started = time.perf_counter()
+                    for recipient, message in sample:
+                        with smtplib.SMTP('127.0.0.1', sink.port) as server:
+                            server.sendmail("clinic@example.com", recipient, message.encode())
+                    per_message = time.perf_counter() - started
+                print(f"    соединение на письмо: {len(sample) / per_message:.0f} писем/с "
+                      f"(оценка для {rows} писем: {rows / len(sample) * per_message:.1f} с)")
+            
+            # Повторный запуск рассылки не создает новых писем
+            started = time.perf_counter()
+            queued = queue_reminders(day=tomorrow, sender="clinic@example.com")
+            rerun = time.perf_counter() - started
+            total = db.fetch_one("SELECT COUNT(*) FROM email_outbox", row_format='tuple')[0]
+            print(f"Повторный запуск: поставлено в очередь {queued} за {rerun * 1000:.1f} мс, писем в очереди: {total}")
+        finally:
+            email_outbox.stop()
+            email_outbox.settings, email_outbox.pool_size = saved_settings, saved_pool_size
+            db.disconnect()
+
+
+def benchmark_email_templates(rows):
+    """Формирование писем с результатами: f-строки и += против разобранных шаблонов email_templates"""
+    from email_templates import render_analysis_results
+    
+    print(f"== Шаблоны писем, писем с результатами анализов: {rows} ==")
+    normal_values = {
+        'Гемоглобин': '120-160 г/л', 'Эритроциты': '4.0-5.5 ×10^12/л', 'Лейкоциты': '4.0-9.0 ×10^9/л',
+        'Тромбоциты': '180-320 ×10^9/л', 'СОЭ': '2-15 мм/ч', 'Гематокрит': '36-48 %',
+        'Глюкоза': '3.9-6.1 ммоль/л', 'Холестерин': '3.0-5.2 ммоль/л',
+    }
+    generator = random.Random(42)
+    results = [
+        (f"Пациент {number}", "Общий анализ крови",
+         {parameter: round(generator.uniform(1, 200), 1) for parameter in normal_values})
+        for number in range(rows)
+    ]
+    
+    def legacy_render(patient_name, analysis_name, result_data):
+        # Прежняя сборка EmailSender.send_analysis_results
+        html_content = f"""
+            <html>
+                <head>
+                    <style>
+                        body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
+                        .container {{ width: 80%; margin: 0 auto; padding: 20px; }}
+                        h1 {{ color: #2c3e50; }}
+                        h2 {{ color: #3498db; }}
+                        table {{ border-collapse: collapse; width: 100%; margin-top: 20px; }}
+                        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+                        th {{ background-color: #f2f2f2; }}
+                        tr:nth-child(even) {{ background-color: #f9f9f9; }}
+                    </style>
+                </head>
+                <body>
+                    <div class="container">
+                        <h1>Результаты анализов</h1>
+                        <p>Уважаемый(ая) <strong>{patient_name}</strong>,</p>
+                        <p>Направляем Вам результаты анализа <strong>{analysis_name}</strong>.</p>
+                        
+                        <h2>Результаты:</h2>
+                        <table>
+                            <tr>
+                                <th>Параметр</th>
+                                <th>Значение</th>
+                                <th>Нормальные значения</th>
+                            </tr>
+            """
+        for param, value in result_data.items():
+            html_content += f"""
+                    <tr>
+                        <td>{param}</td>
+                        <td>{value}</td>
+                        <td>{normal_values.get(param)}</td>
+                    </tr>
+                    """
+        html_content += """
+                        </table>
+                        
+                        <p>С уважением,<br>Медицинский центр</p>
+                    </div>
+                </body>
+            </html>
+            """
+        return html_content
+    
+    legacy, _ = timed(lambda: [legacy_render(*result) for result in results], repeat=3)
+    templated, _ = timed(
+        lambda: [render_analysis_results(*result, normal_values=normal_values.get) for result in results], repeat=3
+    )
+    print(f"f-строки и +=: {legacy:.2f} с ({legacy / rows * 1e6:.1f} мкс на письмо)")
+    print(f"email_templates: {templated:.2f} с ({templated / rows * 1e6:.1f} мкс на письмо, "
+          f"с экранированием значений)")
+
+
+def benchmark_patient_search(rows):
+    """Поиск пациентов: py_lower() LIKE по таблице против индекса FTS5 patient_search"""
+    from database_connection import db, DatabaseConnection
+    from patient_search import PatientSearch
+    
+    print(f"== Поиск пациентов, пациентов: {rows} ==")
+    generator = random.Random(42)
+    surnames = ["Иванов", "Петров", "Сидоров", "Кузнецов", "Смирнов", "Попов", "Васильев", "Соколов",
+                "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов"]
+    names = ["Иван", "Петр", "Алексей", "Сергей", "Андрей", "Дмитрий", "Николай", "Михаил", "Артём"]
+    patronymics = ["Иванович", "Петрович", "Сергеевич", "Андреевич", "Николаевич", "Михайлович"]
+    patients = []
+    for number in range(rows):
+        surname = f"{generator.choice(surnames)}{number % 997:03d}"
+        full_name = f"{surname} {generator.choice(names)} {generator.choice(patronymics)}"
+        phone = f"+7 (9{generator.randrange(100):02d}) {generator.randrange(1000):03d}-{generator.randrange(100):02d}-{number % 100:02d}"
+        patients.append((full_name, '1980-01-01', phone, f"patient{number}@example.com"))
+    
+    def like_search(text):
+        # Прежний запрос PatientListWidget.filter_patients
+        pattern = f"%{text.lower()}%"
+        return db.fetch_all(
+            "SELECT * FROM patients WHERE py_lower(full_name) LIKE ? OR py_lower(phone) LIKE ? OR py_lower(email) LIKE ?",
+            (pattern, pattern, pattern)
+        )
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, 'benchmark.db')
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db'), db.db_path)
+        db.connect(DatabaseConnection._db_password)
+        try:
+            insert = "INSERT INTO patients (full_name, birth_date, phone, email) VALUES (?, ?, ?, ?)"
+            
+            # Стоимость поддержки индекса триггерами при записи
+            connection = sqlite3.connect(db.db_path, isolation_level=None)
+            try:
+                connection.execute("BEGIN")
+                for (name,) in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_patients_fts_%'"
+                ).fetchall():
+                    connection.execute(f"DROP TRIGGER {name}")
+                started = time.perf_counter()
+                connection.executemany(insert, patients)
+                without_index = time.perf_counter() - started
+                connection.execute("ROLLBACK")
+            finally:
+                connection.close()
+            
+            started = time.perf_counter()
+            db.run_in_transaction(lambda cursor: cursor.executemany(insert, patients))
+            with_index = time.perf_counter() - started
+            print(f"Запись {rows} пациентов: без индекса {without_index:.2f} с, с индексом FTS5 {with_index:.2f} с")
+            
+            search = PatientSearch(db)
+            sample = rows // 2
+            for title, text in (
+                ("фамилия", "Фёдоров123"),
+                ("начало фамилии", "Сем"),
+                ("фамилия и имя", "смирнов5 артем"),
+                ("одна буква", "и"),
+                ("телефон", "8 " + patients[sample][2][3:12]),
+                ("email", f"patient{sample}@"),
+            ):
+                like_elapsed, like_rows = timed(lambda: like_search(text), repeat=1)
+                fts_elapsed, fts_rows = timed(lambda: search.search(text), repeat=3)
+                print(f"    {title} ({text!r}): LIKE {like_elapsed * 1000:.0f} мс ({len(like_rows)} строк), "
+                      f"FTS5 {fts_elapsed * 1000:.1f} мс ({len(fts_rows)} строк, не более {search.limit})")
+        finally:
+            db.disconnect()
+
+
+def benchmark_reference_cache(rows):
+    """Выпадающие списки пациентов и врачей: загрузка и addItem для каждого диалога против reference_cache"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication, QComboBox
+    from database_connection import db, DatabaseConnection
+    from reference_cache import ReferenceCache
+    
+    app = QApplication.instance() or QApplication([])
+    print(f"== Справочные списки для QComboBox, пациентов: {rows} ==")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, 'benchmark.db')
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db'), db.db_path)
+        if not db.connect(DatabaseConnection._db_password):
+            return
+        try:
+            db.run_in_transaction(lambda cursor: cursor.executemany(
+                "INSERT INTO patients (full_name, birth_date) VALUES (?, '1980-01-01')",
+                ((f"Пациент {number}",) for number in range(rows))
+            ))
+            
+            def open_dialog_copy():
+                # Прежний вариант add_appointment_dialog / edit_appointment
+                patient_combo = QComboBox()
+                for patient in db.get_all_patients():
+                    patient_combo.addItem(f"{patient.get('full_name', '')}", patient.get('id'))
+                doctor_combo = QComboBox()
+                for doctor in db.fetch_all("""
+                    SELECT d.id, d.user_id, u.full_name, d.specialization
+                    FROM doctors d
+                    JOIN users u ON d.user_id = u.id
+                    ORDER BY u.full_name
+                """):
+                    doctor_combo.addItem(f"{doctor.get('full_name', '')} ({doctor.get('specialization', '')})",
+                                         doctor.get('id'))
+                patient_combo.setCurrentIndex(patient_combo.findData(rows // 2))
+                patient_combo.show()
+                app.processEvents()
+                return patient_combo.count()
+            
+            cache = ReferenceCache(db)
+            
+            def open_dialog_shared():
+                patient_combo = QComboBox()
+                cache.bind_combo(patient_combo, 'patients')
+                doctor_combo = QComboBox()
+                cache.bind_combo(doctor_combo, 'doctors')
+                patient_combo.setCurrentIndex(patient_combo.findData(rows // 2))
+                patient_combo.show()
+                app.processEvents()
+                return patient_combo.count()
+            
+            copy_elapsed, count = timed(open_dialog_copy, repeat=3)
+            print(f"Диалог, загрузка и addItem: {copy_elapsed * 1000:.1f} мс ({count} строк)")
+            first_elapsed, _ = timed(open_dialog_shared, repeat=1)
+            shared_elapsed, count = timed(open_dialog_shared, repeat=5)
+            print(f"Диалог, reference_cache: первый {first_elapsed * 1000:.1f} мс, "
+                  f"следующие {shared_elapsed * 1000:.2f} мс ({count} строк)")
+            
+            # После записи перечитывается только измененный список
+            db.add_patient("Новый пациент", "1990-01-01")
+            reload_elapsed, count = timed(open_dialog_shared, repeat=1)
+            print(f"Диалог после добавления пациента: {reload_elapsed * 1000:.1f} мс ({count} строк)")
+        finally:
+            db.disconnect()
+
+
+def benchmark_lazy_tabs(rows):
+    """Окно администратора: создание всех вкладок с загрузкой данных против LazyTab"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtCore import QThreadPool
+    from PySide6.QtWidgets import QApplication
+    from database_connection import db, DatabaseConnection
+    
+    app = QApplication.instance() or QApplication([])
+    print(f"== Вкладки окна администратора, пациентов и анализов: {rows}, приемов: {rows // 5} ==")
+    generator = random.Random(42)
+    now = datetime.now()
+    
+    def recent_date():
+        return (now - timedelta(minutes=generator.randrange(60 * 24 * 60))).strftime('%Y-%m-%d %H:%M:%S')
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, 'benchmark.db')
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db'), db.db_path)
+        if not db.connect(DatabaseConnection._db_password):
+            return
+        try:
+            def insert_all(cursor):
+                cursor.executemany(
+                    "INSERT INTO patients (full_name, birth_date) VALUES (?, '1980-01-01')",
+                    ((f"Пациент {number}",) for number in range(rows))
+                )
+                cursor.executemany(
+                    "INSERT INTO analysis_results (patient_id, analysis_type_id, lab_user_id, result_date, status) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    ((generator.randint(1, rows), generator.randint(1, 3), 3, recent_date(),
+                      generator.choice(('pending', 'completed', 'sent'))) for _ in range(rows))
+                )
+                cursor.executemany(
+                    "INSERT INTO appointments (doctor_id, patient_id, appointment_date, status) VALUES (1, ?, ?, ?)",
+                    ((generator.randint(1, rows), recent_date(), generator.choice(('scheduled', 'completed')))
+                     for _ in range(rows // 5))
+                )
+            
+            db.run_in_transaction(insert_all)
+            
+            from admin_window import (AdminWindow, UserListWidget, PatientListWidget, AnalysisResultsWidget,
+                                      SystemStatisticsWidget)
+            from statistics_service import statistics_service
+            admin = db.fetch_one("SELECT * FROM users WHERE role = 'admin'")
+            
+            def wait_loaded(tab):
+                while tab.widget is None or tab.loading:
+                    QThreadPool.globalInstance().waitForDone(10)
+                    app.processEvents()
+            
+            def open_eager():
+                # Прежний вариант: все вкладки создаются и загружаются в конструкторе
+                statistics_service.invalidate()
+                window = AdminWindow(admin)
+                UserListWidget()
+                PatientListWidget(parent=window)
+                AnalysisResultsWidget(parent=window)
+                window.create_appointments_tab()
+                SystemStatisticsWidget()
+                window.deleteLater()
+            
+            def open_lazy():
+                window = AdminWindow(admin)
+                constructed = time.perf_counter()
+                window.show()
+                wait_loaded(window.users_tab)
+                return window, constructed
+            
+            eager_elapsed, _ = timed(open_eager, repeat=3)
+            print(f"Создание всех вкладок с данными: {eager_elapsed * 1000:.1f} мс")
+            
+            started = time.perf_counter()
+            window, constructed = open_lazy()
+            print(f"LazyTab: конструктор окна {(constructed - started) * 1000:.1f} мс, "
+                  f"первая вкладка с данными {(time.perf_counter() - started) * 1000:.1f} мс")
+            
+            def show_tab(index):
+                tab = window.tab_widget.widget(index)
+                started = time.perf_counter()
+                window.tab_widget.setCurrentIndex(index)
+                app.processEvents()
+                wait_loaded(tab)
+                return time.perf_counter() - started
+            
+            first = [show_tab(index) for index in range(window.tab_widget.count())]
+            print("Первый показ вкладок: " + ", ".join(f"{elapsed * 1000:.1f}" for elapsed in first) + " мс")
+            again = [show_tab(index) for index in range(window.tab_widget.count())]
+            print("Повторный показ без изменений: " + ", ".join(f"{elapsed * 1000:.2f}" for elapsed in again) + " мс")
+            
+            # После записи перечитываются только вкладки, показывающие пациентов
+            db.add_patient("Новый пациент", "1990-01-01")
+            changed = [show_tab(index) for index in range(window.tab_widget.count())]
+            print("Показ после добавления пациента: " + ", ".join(f"{elapsed * 1000:.2f}" for elapsed in changed) + " мс")
+            window.close()
+        finally:
+            QThreadPool.globalInstance().waitForDone()
+            db.disconnect()
+
+
+def benchmark_analysis_coverage(rows):
+    """Пациенты без анализа и давно не сдававшие: запросы к analysis_results против patient_analysis_coverage"""
+    from database_connection import db, DatabaseConnection
+    
+    patients = rows // 10
+    print(f"== Покрытие пациентов анализами, пациентов: {patients}, результатов анализов: {rows} ==")
+    generator = random.Random(42)
+    start = datetime(2020, 1, 1)
+    analyses = [
+        (generator.randint(1, patients), generator.randint(1, 3), 3,
+         (start + timedelta(minutes=generator.randrange(5 * 365 * 24 * 60))).strftime('%Y-%m-%d %H:%M:%S'))
+        for _ in range(rows)
+    ]
+    insert_analyses = ("INSERT INTO analysis_results (patient_id, analysis_type_id, lab_user_id, result_date, status) "
+                       "VALUES (?, ?, ?, ?, 'completed')")
+    
+    def old_without(analysis_type_id=None):
+        # Прежний get_patients_without_analysis
+        if analysis_type_id:
+            return db.fetch_all("""
+                SELECT p.* FROM patients p
+                WHERE p.id NOT IN (SELECT DISTINCT patient_id FROM analysis_results WHERE analysis_type_id = ?)
+                ORDER BY p.full_name
+            """, (analysis_type_id,))
+        return db.fetch_all("""
+            SELECT p.* FROM patients p
+            WHERE p.id NOT IN (SELECT DISTINCT patient_id FROM analysis_results)
+            ORDER BY p.full_name
+        """)
+    
+    def old_outdated(analysis_type_id, days):
+        # Тот же список без таблицы покрытия: последняя дата по analysis_results
+        return db.fetch_all("""
+            SELECT p.*, last.last_result_date
+            FROM (
+                SELECT patient_id, MAX(result_date) AS last_result_date
+                FROM analysis_results
+                WHERE analysis_type_id = ?
+                GROUP BY patient_id
+            ) last
+            JOIN patients p ON p.id = last.patient_id
+            WHERE last.last_result_date < datetime('now', ?)
+            ORDER BY last.last_result_date
+        """, (analysis_type_id, f"-{days} days"))
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, 'benchmark.db')
+        shutil.copyfile(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'med_center.db'), db.db_path)
+        if not db.connect(DatabaseConnection._db_password):
+            return
+        try:
+            db.run_in_transaction(lambda cursor: cursor.executemany(
+                "INSERT INTO patients (full_name, birth_date) VALUES (?, '1980-01-01')",
+                ((f"Пациент {number:06d}",) for number in range(patients))
+            ))
+            
+            # Стоимость поддержки покрытия триггерами при записи: та же вставка
+            # без триггеров выполняется отдельным соединением и откатывается
+            connection = sqlite3.connect(db.db_path, isolation_level=None)
+            try:
+                connection.execute("BEGIN")
+                for (name,) in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg_patient_analysis_coverage_%'"
+                ).fetchall():
+                    connection.execute(f"DROP TRIGGER {name}")
+                started = time.perf_counter()
+                connection.executemany(insert_analyses, analyses)
+                without_triggers = time.perf_counter() - started
+                connection.execute("ROLLBACK")
+            finally:
+                connection.close()
+            
+            started = time.perf_counter()
+            db.run_in_transaction(lambda cursor: cursor.executemany(insert_analyses, analyses))
+            with_triggers = time.perf_counter() - started
+            print(f"Запись {rows} результатов: без триггеров покрытия {without_triggers:.2f} с, "
+                  f"с триггерами {with_triggers:.2f} с")
+            
+            for title, analysis_type_id in (("без анализа типа 1", 1), ("без анализов вообще", None)):
+                old_elapsed, old_rows = timed(lambda: old_without(analysis_type_id), repeat=3)
+                new_elapsed, new_rows = timed(lambda: db.get_patients_without_analysis(analysis_type_id), repeat=3)
+                assert [row['id'] for row in old_rows] == [row['id'] for row in new_rows]
+                print(f"Пациенты {title}: NOT IN по analysis_results {old_elapsed * 1000:.1f} мс, "
+                      f"patient_analysis_coverage {new_elapsed * 1000:.1f} мс ({len(new_rows)} строк)")
+            
+            for days in (365, 1500):
+                old_elapsed, old_rows = timed(lambda: old_outdated(1, days), repeat=3)
+                new_elapsed, new_rows = timed(lambda: db.get_patients_with_outdated_analysis(1, days), repeat=3)
+                assert sorted(row['id'] for row in old_rows) == sorted(row['id'] for row in new_rows)
+                print(f"Последний анализ типа 1 старше {days} дн.: MAX по analysis_results {old_elapsed * 1000:.1f} мс, "
+                      f"patient_analysis_coverage {new_elapsed * 1000:.1f} мс ({len(new_rows)} строк)")
+            
+            # Удаление последнего результата пары пересчитывает дату по индексу
+            result_ids = [row[0] for row in db.fetch_all(
+                "SELECT id FROM analysis_results ORDER BY random() LIMIT 1000", row_format='tuple'
+            )]
+            started = time.perf_counter()
+            db.run_in_transaction(lambda cursor: cursor.executemany(
+                "DELETE FROM analysis_results WHERE id = ?", ((result_id,) for result_id in result_ids)
+            ))
+            print(f"Удаление {len(result_ids)} результатов: {(time.perf_counter() - started) * 1000:.1f} мс")
+        finally:
+            db.disconnect()
+
+
+def benchmark_import_time(rows):
+    """Время импорта при запуске и при входе каждой роли (python -X importtime)"""
+    from check_startup_imports import import_times
+    
+    print(f"== Импорт модулей при запуске, повторов: {rows} ==")
+    for title, code in (
+        ("Запуск (main)", "import main"),
+        ("Вход лаборанта", "import main, lab_technician_window"),
+        ("Вход врача", "import main, doctor_window"),
+        ("Вход администратора", "import main, admin_window"),
+        ("Администратор, первый экспорт", "import main, admin_window, excel_export, report_generator"),
+        ("Все окна ролей сразу", "import main, lab_technician_window, doctor_window, admin_window"),
+    ):
+        best = min(import_times(code)[1] for _ in range(rows))
+        print(f"{title}: {best / 1000:.1f} мс")
+
+
+BENCHMARKS = {
+    'date_range': (benchmark_date_range, 1000000),
+    'table_model': (benchmark_table_model, 50000),
+    'connection_pool': (benchmark_connection_pool, 2000),
+    'analysis_import': (benchmark_analysis_import, 1000),
+    'concurrent_writes': (benchmark_concurrent_writes, 4000),
+    'startup': (benchmark_startup, 200),
+    'row_formats': (benchmark_row_formats, 1000000),
+    'reference_ranges': (benchmark_reference_ranges, 1000000),
+    'analysis_flags': (benchmark_analysis_flags, 100000),
+    'statistics': (benchmark_statistics, 1000000),
+    'excel_export': (benchmark_excel_export, 1000000),
+    'email_outbox': (benchmark_email_outbox, 1000),
+    'reminders': (benchmark_reminders, 10000),
+    'email_templates': (benchmark_email_templates, 100000),
+    'patient_search': (benchmark_patient_search, 1000000),
+    'reference_cache': (benchmark_reference_cache, 100000),
+    'lazy_tabs': (benchmark_lazy_tabs, 100000),
+    'analysis_coverage': (benchmark_analysis_coverage, 1000000),
+    'import_time': (benchmark_import_time, 5),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности запросов")
+    parser.add_argument('names', nargs='*', help="Названия замеров: " + ", ".join(BENCHMARKS))
+    parser.add_argument('--rows', type=int, help="Количество строк в тестовых данных")
+    args = parser.parse_args()
+    
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error(f"Неизвестный замер: {name}")
+            
+        func, default_rows = BENCHMARKS[name]
+        func(args.rows or default_rows)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Проверка планов выполнения запросов с фильтрами (EXPLAIN QUERY PLAN).
+
+Скрипт выполняет EXPLAIN QUERY PLAN для запросов окон приложения,
+которые фильтруют данные, и завершается с ненулевым кодом, если
+какой-либо из них выполняет полный просмотр таблицы (SCAN).
+
+Запросы, выводящие все записи без фильтров, не проверяются.
+Проверка выполняется на копии базы данных, чтобы миграции
+не изменяли рабочий файл.
+
+Использование:
+    python check_query_plans.py [путь_к_базе_данных]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+from appointment_reminders import reminders_query
+from database_connection import db, DatabaseConnection
+from query_builder import QueryConditions, date_range
+
+# Период, используемый для проверки запросов с фильтром по дате
+CHECK_PERIOD = ("2023-01-01", "2023-12-31")
+
+
+def filtered_query(name, query, conditions):
+    """Формирование проверяемого запроса из условий QueryConditions"""
+    return name, query.format(where=conditions.where_clause()), tuple(conditions.params)
+
+
+# Запросы с фильтрами: (название, запрос, параметры)
+FILTERED_QUERIES = [
+    (
+        "Результаты анализов пациента (AnalysisResultsWidget, DoctorWindow)",
+        """
+        SELECT ar.id as id, p.full_name as patient_name, p.birth_date, at.name as analysis_type,
+               ar.result_date, u.full_name as lab_technician, ar.status
+        FROM analysis_results ar
+        JOIN patients p ON ar.patient_id = p.id
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        JOIN users u ON ar.lab_user_id = u.id
+        WHERE ar.patient_id = ?
+        ORDER BY ar.result_date DESC
+        """,
+        (1,)
+    ),
+    (
+        "Результаты анализов по типу (AnalysisResultsWidget)",
+        """
+        SELECT ar.id as id, p.full_name as patient_name, at.name as analysis_type, ar.result_date
+        FROM analysis_results ar
+        JOIN patients p ON ar.patient_id = p.id
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        WHERE ar.analysis_type_id = ?
+        ORDER BY ar.result_date DESC
+        """,
+        (1,)
+    ),
+    (
+        "История анализов лаборанта (LabTechnicianWindow)",
+        """
+        SELECT ar.*, p.full_name as patient_name, at.name as analysis_name
+        FROM analysis_results ar
+        JOIN patients p ON ar.patient_id = p.id
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        WHERE ar.lab_user_id = ?
+        ORDER BY ar.result_date DESC
+        """,
+        (1,)
+    ),
+    filtered_query(
+        "Расписание врача на день (DoctorWindow)",
+        """
+        SELECT a.*, p.full_name as patient_name
+        FROM appointments a
+        JOIN patients p ON a.patient_id = p.id
+        WHERE {where}
+        ORDER BY a.appointment_date
+        """,
+        QueryConditions().add("a.doctor_id = ?", 1).add_date_range("a.appointment_date", "2025-04-19", "2025-04-19")
+    ),
+    (
+        "Записи на прием по статусу (AdminWindow)",
+        """
+        SELECT a.id, a.appointment_date, a.status, p.full_name as patient_name,
+               u.full_name as doctor_name, d.specialization
+        FROM appointments a
+        JOIN patients p ON a.patient_id = p.id
+        JOIN doctors d ON a.doctor_id = d.id
+        JOIN users u ON d.user_id = u.id
+        WHERE a.status = ?
+        ORDER BY a.appointment_date DESC
+        """,
+        ('scheduled',)
+    ),
+    (
+        "Записи на прием пациента (AdminWindow)",
+        """
+        SELECT a.id, a.appointment_date, a.status, u.full_name as doctor_name
+        FROM appointments a
+        JOIN doctors d ON a.doctor_id = d.id
+        JOIN users u ON d.user_id = u.id
+        WHERE a.patient_id = ?
+        ORDER BY a.appointment_date DESC
+        """,
+        (1,)
+    ),
+    filtered_query(
+        "Результаты анализов за период (AnalysisResultsWidget)",
+        """
+        SELECT ar.id as id, p.full_name as patient_name, at.name as analysis_type, ar.result_date
+        FROM analysis_results ar
+        JOIN patients p ON ar.patient_id = p.id
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        JOIN users u ON ar.lab_user_id = u.id
+        WHERE {where}
+        ORDER BY ar.result_date DESC
+        """,
+        QueryConditions().add_date_range("ar.result_date", *CHECK_PERIOD)
+    ),
+    filtered_query(
+        "Записи на прием за период (AdminWindow)",
+        """
+        SELECT a.id, a.appointment_date, a.status, p.full_name as patient_name
+        FROM appointments a
+        JOIN patients p ON a.patient_id = p.id
+        JOIN doctors d ON a.doctor_id = d.id
+        WHERE {where}
+        ORDER BY a.appointment_date DESC
+        """,
+        QueryConditions().add_date_range("a.appointment_date", *CHECK_PERIOD)
+    ),
+    filtered_query(
+        "Следующая страница анализов пациента (DoctorWindow)",
+        """
+        SELECT ar.*, at.name as analysis_name, p.full_name as patient_name
+        FROM analysis_results ar
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        JOIN patients p ON ar.patient_id = p.id
+        WHERE {where}
+        ORDER BY ar.result_date DESC, ar.id DESC
+        LIMIT 50
+        """,
+        QueryConditions()
+        .add_equals("ar.patient_id", 1)
+        .add_date_range("ar.result_date", *CHECK_PERIOD)
+        .add("(ar.result_date, ar.id) < (?, ?)", "2023-10-10 10:00:00", 2)
+    ),
+    filtered_query(
+        "Значение параметра выше порога за период (get_parameter_value_results)",
+        """
+        SELECT ar.id, ar.result_date, p.full_name as patient_name, pv.value
+        FROM analysis_parameters ap
+        JOIN parameter_values pv ON pv.parameter_id = ap.id
+        JOIN analysis_results ar ON ar.id = pv.analysis_result_id
+        JOIN patients p ON p.id = ar.patient_id
+        WHERE {where}
+        ORDER BY ar.result_date DESC, ar.id DESC
+        """,
+        QueryConditions()
+        .add("ap.name = ?", "Глюкоза")
+        .add("pv.value > ?", 6.1)
+        .add_date_range("ar.result_date", *CHECK_PERIOD)
+    ),
+    (
+        "Новые пациенты за период (statistics_service)",
+        "SELECT COALESCE(SUM(count), 0) FROM stat_daily_patients WHERE day BETWEEN ? AND ?",
+        CHECK_PERIOD
+    ),
+    (
+        "Анализы по типам за период (statistics_service)",
+        """
+        SELECT at.name, SUM(s.count) as count
+        FROM stat_daily_analyses s
+        JOIN analysis_types at ON at.id = s.analysis_type_id
+        WHERE s.day BETWEEN ? AND ?
+        GROUP BY at.name
+        """,
+        CHECK_PERIOD
+    ),
+    (
+        "Приемы по статусам за период (statistics_service)",
+        """
+        SELECT status, SUM(count)
+        FROM stat_daily_appointments
+        WHERE day BETWEEN ? AND ?
+        GROUP BY status
+        """,
+        CHECK_PERIOD
+    ),
+    (
+        "Приемы по врачам за период (statistics_service)",
+        """
+        SELECT u.full_name, SUM(s.count) as count
+        FROM stat_daily_appointments s
+        JOIN doctors d ON d.id = s.doctor_id
+        JOIN users u ON u.id = d.user_id
+        WHERE s.day BETWEEN ? AND ?
+        GROUP BY s.doctor_id
+        """,
+        CHECK_PERIOD
+    ),
+    ("Приемы на завтра без напоминания (appointment_reminders)",) + reminders_query("2025-04-20"),
+    (
+        "Давно не сдавали анализ (LabTechnicianWindow)",
+        """
+        SELECT p.*, c.last_result_date
+        FROM patient_analysis_coverage c
+        JOIN patients p ON p.id = c.patient_id
+        WHERE c.analysis_type_id = ? AND c.last_result_date < datetime('now', ?)
+        ORDER BY c.last_result_date
+        """,
+        (1, "-365 days")
+    ),
+]
+
+
+def find_scans(plan):
+    """Поиск полных просмотров таблиц в плане выполнения"""
+    return [detail for detail in plan if detail.startswith("SCAN")]
+
+
+def check_query_plans(queries=FILTERED_QUERIES):
+    """
+    Проверка планов выполнения запросов
+    
+    :param queries: Список запросов (название, запрос, параметры)
+    :return: Количество запросов с полным просмотром таблиц
+    """
+    failures = 0
+    for name, query, params in queries:
+        plan = db.explain_query_plan(query, params)
+        scans = find_scans(plan)
+        
+        status = "SCAN" if scans else "OK"
+        print(f"[{status}] {name}")
+        for detail in plan:
+            print(f"    {detail}")
+            
+        if scans:
+            failures += 1
+            
+    return failures
+
+
+def main():
+    source_path = sys.argv[1] if len(sys.argv) > 1 else 'med_center.db'
+    if not os.path.exists(source_path):
+        print(f"Файл базы данных не найден: {source_path}")
+        return 2
+        
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db.db_path = os.path.join(temp_dir, os.path.basename(source_path))
+        shutil.copyfile(source_path, db.db_path)
+        
+        if not db.connect(DatabaseConnection._db_password):
+            return 2
+            
+        try:
+            failures = check_query_plans()
+        finally:
+            db.disconnect()
+            
+    if failures:
+        print(f"Запросов с полным просмотром таблиц: {failures}")
+        return 1
+        
+    print("Все запросы с фильтрами используют индексы")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Проверка времени запуска приложения (python -X importtime).
+
+Скрипт импортирует main.py в отдельном процессе с -X importtime и
+завершается с ненулевым кодом, если:
+
+- при запуске импортирован модуль, который должен загружаться только
+  после входа пользователя или при первом экспорте (окна ролей, отчеты
+  Word и Excel, отправка почты);
+- время импорта main превышает бюджет STARTUP_BUDGET_MS.
+
+Время берется лучшее из нескольких запусков, чтобы не зависеть от
+случайной загрузки машины.
+
+Использование:
+    python check_startup_imports.py [бюджет_в_мс]
+"""
+import os
+import subprocess
+import sys
+
+# Бюджет времени импорта main (в миллисекундах)
+STARTUP_BUDGET_MS = 500
+
+# Количество запусков для замера
+RUNS = 5
+
+# Модули, которые не должны импортироваться до входа пользователя
+DEFERRED_MODULES = (
+    'admin_window',
+    'doctor_window',
+    'lab_technician_window',
+    'report_generator',
+    'excel_export',
+    'email_outbox',
+    'docx',
+    'openpyxl',
+    'xlwt',
+    'smtplib',
+)
+
+
+def import_times(code="import main"):
+    """
+    Время импорта модулей по выводу python -X importtime
+    
+    :param code: Код, выполняемый в отдельном процессе
+    :return: Словарь {модуль: накопленное время в микросекундах} и общее время (в микросекундах)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Ошибка импорта: {result.stderr.strip().splitlines()[-1]}")
+    
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+        # Модули верхнего уровня выводятся с одним пробелом отступа
+        if not name[1:].startswith(" "):
+            total += int(cumulative)
+    return modules, total
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else STARTUP_BUDGET_MS
+    
+    best = None
+    for _ in range(RUNS):
+        modules, total = import_times()
+        if best is None or modules['main'] < best[0]['main']:
+            best = (modules, total)
+    modules, total = best
+    
+    failures = 0
+    deferred = [name for name in DEFERRED_MODULES if name in modules]
+    for name in deferred:
+        print(f"[ИМПОРТ] {name}: {modules[name] / 1000:.1f} мс при запуске")
+        failures += 1
+    
+    elapsed = modules['main'] / 1000
+    print(f"Импорт main: {elapsed:.1f} мс (бюджет {budget:.0f} мс), всего модулей: {len(modules)}, "
+          f"всего с учетом site: {total / 1000:.1f} мс")
+    if elapsed > budget:
+        print("Время запуска превышает бюджет")
+        failures += 1
+    
+    if failures:
+        return 1
+    
+    print("Запуск укладывается в бюджет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,477 @@
 import json
+import logging
 import os
 import sqlite3
 import hashlib
+import threading
+import time
 from datetime import datetime
 
+from query_builder import QueryConditions
+from db_writer import DatabaseWriter
+from query_log import log_query
+from row_types import ROW_FORMATS, row_converter, convert_rows, row_factory
+from analysis_values import save_parameter_values, backfill_parameter_values, parse_parameter_value
+from patient_search import create_patients_fts
+from reference_ranges import reference_ranges, create_reference_ranges, age_on
+
+logger = logging.getLogger(__name__)
+
 class DatabaseConnection:
     """Класс для работы с базой данных SQLite"""
     _instance = None
     _db_password = "1"  # Пароль для доступа к базе данных
     
+    # Миграции схемы: номер версии -> список SQL-команд или функций f(cursor).
+    # Применяются по порядку ко всем версиям выше текущей user_version.
+    SCHEMA_MIGRATIONS = {
+        # Индексы для фильтров по пациенту, типу анализа, лаборанту, врачу и статусу
+        1: [
+            "CREATE INDEX IF NOT EXISTS idx_analysis_results_patient_date ON analysis_results(patient_id, result_date)",
+            "CREATE INDEX IF NOT EXISTS idx_analysis_results_type_date ON analysis_results(analysis_type_id, result_date)",
+            "CREATE INDEX IF NOT EXISTS idx_analysis_results_lab_date ON analysis_results(lab_user_id, result_date)",
+            "CREATE INDEX IF NOT EXISTS idx_analysis_results_date ON analysis_results(result_date)",
+            "CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date ON appointments(doctor_id, appointment_date)",
+            "CREATE INDEX IF NOT EXISTS idx_appointments_status_date ON appointments(status, appointment_date)",
+            "CREATE INDEX IF NOT EXISTS idx_appointments_patient_date ON appointments(patient_id, appointment_date)",
+            "CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments(appointment_date)",
+            "CREATE INDEX IF NOT EXISTS idx_doctors_user ON doctors(user_id)",
+        ],
+        # Индекс для статистики новых пациентов за период
+        2: [
+            "CREATE INDEX IF NOT EXISTS idx_patients_created ON patients(created_at)",
+        ],
+        # Значения параметров анализов в отдельной таблице (вместо разбора JSON)
+        3: [
+            """
+            CREATE TABLE IF NOT EXISTS analysis_parameters (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                analysis_type_id INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                unit TEXT,
+                position INTEGER NOT NULL DEFAULT 0,
+                UNIQUE (analysis_type_id, name),
+                FOREIGN KEY (analysis_type_id) REFERENCES analysis_types(id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS parameter_values (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                analysis_result_id INTEGER NOT NULL,
+                parameter_id INTEGER NOT NULL,
+                value REAL,
+                value_text TEXT,
+                UNIQUE (analysis_result_id, parameter_id),
+                FOREIGN KEY (analysis_result_id) REFERENCES analysis_results(id),
+                FOREIGN KEY (parameter_id) REFERENCES analysis_parameters(id)
+            )
+            """,
+            # Поиск по диапазону значений параметра
+            "CREATE INDEX IF NOT EXISTS idx_parameter_values_parameter_value ON parameter_values(parameter_id, value)",
+            "CREATE INDEX IF NOT EXISTS idx_analysis_parameters_name ON analysis_parameters(name)",
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_analysis_results_delete_values
+            AFTER DELETE ON analysis_results
+            BEGIN
+                DELETE FROM parameter_values WHERE analysis_result_id = OLD.id;
+            END
+            """,
+            backfill_parameter_values,
+        ],
+        # Справочник нормальных значений по параметру, полу и возрасту
+        4: [
+            create_reference_ranges,
+            "CREATE INDEX IF NOT EXISTS idx_reference_ranges_parameter ON reference_ranges(parameter_name)",
+        ],
+        # Дневные сводки для статистики (statistics_service): количество анализов
+        # по дню, типу и статусу, приемов по дню, врачу и статусу, новых пациентов
+        # по дню. Поддерживаются триггерами при каждой записи.
+        5: [
+            """
+            CREATE TABLE IF NOT EXISTS stat_daily_analyses (
+                day TEXT NOT NULL,
+                analysis_type_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, analysis_type_id, status)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS stat_daily_appointments (
+                day TEXT NOT NULL,
+                doctor_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, doctor_id, status)
+            ) WITHOUT ROWID
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS stat_daily_patients (
+                day TEXT NOT NULL PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+            """,
+            """
+            INSERT OR REPLACE INTO stat_daily_analyses (day, analysis_type_id, status, count)
+            SELECT COALESCE(substr(result_date, 1, 10), ''), analysis_type_id, COALESCE(status, ''), COUNT(*)
+            FROM analysis_results
+            GROUP BY 1, 2, 3
+            """,
+            """
+            INSERT OR REPLACE INTO stat_daily_appointments (day, doctor_id, status, count)
+            SELECT COALESCE(substr(appointment_date, 1, 10), ''), doctor_id, COALESCE(status, ''), COUNT(*)
+            FROM appointments
+            GROUP BY 1, 2, 3
+            """,
+            """
+            INSERT OR REPLACE INTO stat_daily_patients (day, count)
+            SELECT COALESCE(substr(created_at, 1, 10), ''), COUNT(*)
+            FROM patients
+            GROUP BY 1
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_stat_analyses_insert
+            AFTER INSERT ON analysis_results
+            BEGIN
+                INSERT INTO stat_daily_analyses (day, analysis_type_id, status, count)
+                VALUES (COALESCE(substr(NEW.result_date, 1, 10), ''), NEW.analysis_type_id, COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (day, analysis_type_id, status) DO UPDATE SET count = count + 1;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_stat_analyses_delete
+            AFTER DELETE ON analysis_results
+            BEGIN
+                UPDATE stat_daily_analyses SET count = count - 1
+                WHERE day = COALESCE(substr(OLD.result_date, 1, 10), '')
+                  AND analysis_type_id = OLD.analysis_type_id AND status = COALESCE(OLD.status, '');
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_stat_analyses_update
+            AFTER UPDATE OF result_date, analysis_type_id, status ON analysis_results
+            WHEN OLD.result_date IS NOT NEW.result_date
+              OR OLD.analysis_type_id IS NOT NEW.analysis_type_id
+              OR OLD.status IS NOT NEW.status
+            BEGIN
+                UPDATE stat_daily_analyses SET count = count - 1
+                WHERE day = COALESCE(substr(OLD.result_date, 1, 10), '')
+                  AND analysis_type_id = OLD.analysis_type_id AND status = COALESCE(OLD.status, '');
+                INSERT INTO stat_daily_analyses (day, analysis_type_id, status, count)
+                VALUES (COALESCE(substr(NEW.result_date, 1, 10), ''), NEW.analysis_type_id, COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (day, analysis_type_id, status) DO UPDATE SET count = count + 1;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_stat_appointments_insert
+            AFTER INSERT ON appointments
+            BEGIN
+                INSERT INTO stat_daily_appointments (day, doctor_id, status, count)
+                VALUES (COALESCE(substr(NEW.appointment_date, 1, 10), ''), NEW.doctor_id, COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (day, doctor_id, status) DO UPDATE SET count = count + 1;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_stat_appointments_delete
+            AFTER DELETE ON appointments
+            BEGIN
+                UPDATE stat_daily_appointments SET count = count - 1
+                WHERE day = COALESCE(substr(OLD.appointment_date, 1, 10), '')
+                  AND doctor_id = OLD.doctor_id AND status = COALESCE(OLD.status, '');
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_stat_appointments_update
+            AFTER UPDATE OF appointment_date, doctor_id, status ON appointments
+            WHEN OLD.appointment_date IS NOT NEW.appointment_date
+              OR OLD.doctor_id IS NOT NEW.doctor_id
+              OR OLD.status IS NOT NEW.status
+            BEGIN
+                UPDATE stat_daily_appointments SET count = count - 1
+                WHERE day = COALESCE(substr(OLD.appointment_date, 1, 10), '')
+                  AND doctor_id = OLD.doctor_id AND status = COALESCE(OLD.status, '');
+                INSERT INTO stat_daily_appointments (day, doctor_id, status, count)
+                VALUES (COALESCE(substr(NEW.appointment_date, 1, 10), ''), NEW.doctor_id, COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (day, doctor_id, status) DO UPDATE SET count = count + 1;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_stat_patients_insert
+            AFTER INSERT ON patients
+            BEGIN
+                INSERT INTO stat_daily_patients (day, count)
+                VALUES (COALESCE(substr(NEW.created_at, 1, 10), ''), 1)
+                ON CONFLICT (day) DO UPDATE SET count = count + 1;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_stat_patients_delete
+            AFTER DELETE ON patients
+            BEGIN
+                UPDATE stat_daily_patients SET count = count - 1
+                WHERE day = COALESCE(substr(OLD.created_at, 1, 10), '');
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_stat_patients_update
+            AFTER UPDATE OF created_at ON patients
+            WHEN OLD.created_at IS NOT NEW.created_at
+            BEGIN
+                UPDATE stat_daily_patients SET count = count - 1
+                WHERE day = COALESCE(substr(OLD.created_at, 1, 10), '');
+                INSERT INTO stat_daily_patients (day, count)
+                VALUES (COALESCE(substr(NEW.created_at, 1, 10), ''), 1)
+                ON CONFLICT (day) DO UPDATE SET count = count + 1;
+            END
+            """,
+        ],
+        # Очередь исходящих писем (email_outbox): письмо хранится целиком
+        # до доставки, отправка выполняется фоновым потоком с повторами
+        6: [
+            """
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipient TEXT NOT NULL,
+                subject TEXT,
+                message TEXT NOT NULL,
+                analysis_result_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                last_error TEXT,
+                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                sent_at TEXT,
+                FOREIGN KEY (analysis_result_id) REFERENCES analysis_results(id)
+            )
+            """,
+            # Выборка писем, срок отправки которых наступил
+            "CREATE INDEX IF NOT EXISTS idx_email_outbox_status_next ON email_outbox(status, next_attempt_at)",
+        ],
+        # Отправленные напоминания о приемах: повторный запуск рассылки
+        # не ставит в очередь второе письмо для того же приема
+        7: [
+            """
+            CREATE TABLE IF NOT EXISTS appointment_reminders (
+                appointment_id INTEGER NOT NULL PRIMARY KEY,
+                outbox_id INTEGER,
+                created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (appointment_id) REFERENCES appointments(id),
+                FOREIGN KEY (outbox_id) REFERENCES email_outbox(id)
+            )
+            """,
+        ],
+        # Полнотекстовый индекс пациентов (ФИО, цифры телефона, email)
+        # для patient_search; поддерживается триггерами
+        8: [
+            create_patients_fts,
+        ],
+        # Версии справочных списков для reference_cache: триггеры
+        # увеличивают версию при любом изменении, влияющем на список
+        9: [
+            """
+            CREATE TABLE IF NOT EXISTS reference_versions (
+                kind TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            """,
+            "INSERT OR IGNORE INTO reference_versions (kind) VALUES ('patients'), ('doctors'), ('analysis_types')",
+        ] + [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_{kind}_version_{event.split()[0].lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE reference_versions SET version = version + 1 WHERE kind = '{kind}';
+            END
+            """
+            for table, kind, events in (
+                ('patients', 'patients', ("INSERT", "DELETE", "UPDATE OF full_name")),
+                ('doctors', 'doctors', ("INSERT", "DELETE", "UPDATE OF user_id, specialization")),
+                ('users', 'doctors', ("DELETE", "UPDATE OF full_name")),
+                ('analysis_types', 'analysis_types', ("INSERT", "DELETE", "UPDATE OF name")),
+            )
+            for event in events
+        ],
+        # Версии данных вкладок окна администратора (lazy_tabs): вкладка
+        # перезагружается, только если изменились таблицы, которые она показывает
+        10: [
+            "INSERT OR IGNORE INTO reference_versions (kind) VALUES ('users'), ('analysis_results'), ('appointments')",
+        ] + [
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE reference_versions SET version = version + 1 WHERE kind = '{table}';
+            END
+            """
+            for table in ('users', 'analysis_results', 'appointments')
+            for event in ("INSERT", "DELETE", "UPDATE")
+        ],
+        # Покрытие пациентов анализами: количество результатов и дата последнего
+        # по паре пациент + тип анализа. "Пациенты без анализа" и "последний
+        # анализ старше N дней" выбираются по индексам без просмотра
+        # analysis_results; таблица поддерживается триггерами.
+        11: [
+            """
+            CREATE TABLE IF NOT EXISTS patient_analysis_coverage (
+                patient_id INTEGER NOT NULL,
+                analysis_type_id INTEGER NOT NULL,
+                result_count INTEGER NOT NULL DEFAULT 0,
+                last_result_date TEXT,
+                PRIMARY KEY (patient_id, analysis_type_id)
+            ) WITHOUT ROWID
+            """,
+            # Списки "давно не сдавали" по типу анализа
+            """
+            CREATE INDEX IF NOT EXISTS idx_patient_analysis_coverage_type_date
+            ON patient_analysis_coverage(analysis_type_id, last_result_date)
+            """,
+            """
+            INSERT OR REPLACE INTO patient_analysis_coverage (patient_id, analysis_type_id, result_count, last_result_date)
+            SELECT patient_id, analysis_type_id, COUNT(*), MAX(result_date)
+            FROM analysis_results
+            GROUP BY patient_id, analysis_type_id
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_patient_analysis_coverage_insert
+            AFTER INSERT ON analysis_results
+            BEGIN
+                INSERT INTO patient_analysis_coverage (patient_id, analysis_type_id, result_count, last_result_date)
+                VALUES (NEW.patient_id, NEW.analysis_type_id, 1, NEW.result_date)
+                ON CONFLICT (patient_id, analysis_type_id) DO UPDATE SET
+                    result_count = result_count + 1,
+                    last_result_date = CASE
+                        WHEN last_result_date IS NULL OR excluded.last_result_date > last_result_date
+                        THEN excluded.last_result_date ELSE last_result_date END;
+            END
+            """,
+            # При удалении последнего по дате результата дата берется
+            # из оставшихся результатов пары. "+" перед analysis_type_id
+            # исключает индекс по типу анализа: без ANALYZE планировщик выбирает
+            # его и просматривает все результаты типа вместо результатов пациента
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_patient_analysis_coverage_delete
+            AFTER DELETE ON analysis_results
+            BEGIN
+                UPDATE patient_analysis_coverage SET
+                    result_count = result_count - 1,
+                    last_result_date = CASE
+                        WHEN last_result_date IS OLD.result_date THEN (
+                            SELECT MAX(result_date) FROM analysis_results
+                            WHERE patient_id = OLD.patient_id AND +analysis_type_id = OLD.analysis_type_id
+                        )
+                        ELSE last_result_date END
+                WHERE patient_id = OLD.patient_id AND analysis_type_id = OLD.analysis_type_id;
+                DELETE FROM patient_analysis_coverage
+                WHERE patient_id = OLD.patient_id AND analysis_type_id = OLD.analysis_type_id AND result_count <= 0;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_patient_analysis_coverage_update
+            AFTER UPDATE OF patient_id, analysis_type_id, result_date ON analysis_results
+            WHEN OLD.patient_id IS NOT NEW.patient_id
+              OR OLD.analysis_type_id IS NOT NEW.analysis_type_id
+              OR OLD.result_date IS NOT NEW.result_date
+            BEGIN
+                UPDATE patient_analysis_coverage SET
+                    result_count = result_count - 1,
+                    last_result_date = CASE
+                        WHEN last_result_date IS OLD.result_date THEN (
+                            SELECT MAX(result_date) FROM analysis_results
+                            WHERE patient_id = OLD.patient_id AND +analysis_type_id = OLD.analysis_type_id
+                        )
+                        ELSE last_result_date END
+                WHERE patient_id = OLD.patient_id AND analysis_type_id = OLD.analysis_type_id;
+                DELETE FROM patient_analysis_coverage
+                WHERE patient_id = OLD.patient_id AND analysis_type_id = OLD.analysis_type_id AND result_count <= 0;
+                INSERT INTO patient_analysis_coverage (patient_id, analysis_type_id, result_count, last_result_date)
+                VALUES (NEW.patient_id, NEW.analysis_type_id, 1, NEW.result_date)
+                ON CONFLICT (patient_id, analysis_type_id) DO UPDATE SET
+                    result_count = result_count + 1,
+                    last_result_date = CASE
+                        WHEN last_result_date IS NULL OR excluded.last_result_date > last_result_date
+                        THEN excluded.last_result_date ELSE last_result_date END;
+            END
+            """,
+        ],
+        # Профиль SMTP письма в очереди (smtp_profile, значение - email_outbox.profile_key): письмо
+        # отправляется с параметрами отправителя, который его поставил
+        12: [
+            "ALTER TABLE email_outbox ADD COLUMN smtp_profile TEXT",
+        ],
+    }
+    
+    # Версия схемы (хранится в PRAGMA user_version файла базы данных)
+    SCHEMA_VERSION = max(SCHEMA_MIGRATIONS)
+    
+    # Профили хранения: PRAGMA, применяемые к каждому соединению.
+    # 'wal' - журнал предзаписи: чтение не блокирует запись, фиксация без fsync
+    # базы данных (synchronous=NORMAL); 'compat' - исходный журнал отката.
+    STORAGE_PROFILES = {
+        'wal': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'mmap_size': 268435456,   # 256 МБ отображения файла в память
+            'cache_size': -16000,     # 16 МБ кэша страниц
+            'temp_store': 'MEMORY',
+            'busy_timeout': 5000,
+        },
+        'compat': {
+            'journal_mode': 'DELETE',
+            'busy_timeout': 5000,
+        },
+    }
+    DEFAULT_STORAGE_PROFILE = 'wal'
+    
+    # Файлы баз данных, для которых в этом процессе уже выполнены создание
+    # таблиц, миграции и проверка тестовых данных
+    _bootstrapped_paths = set()
+    
     def __new__(cls):
         """Реализация паттерна Singleton для подключения к БД"""
         if cls._instance is None:
             cls._instance = super(DatabaseConnection, cls).__new__(cls)
-            cls._instance._connection = None
+            cls._instance._main_connection = None
+            cls._instance._main_thread = None
+            cls._instance._local = threading.local()
         return cls._instance
     
+    @property
+    def _connection(self):
+        """
+        Соединение текущего потока
+        
+        Основное соединение принадлежит потоку, который его открыл (окна
+        приложения). Фоновые задачи при первом запросе открывают в своем
+        потоке отдельное соединение и закрывают его через
+        close_thread_connection().
+        """
+        if self._main_thread is None or self._main_thread == threading.get_ident():
+            return self._main_connection
+        return getattr(self._local, 'connection', None)
+    
+    @_connection.setter
+    def _connection(self, connection):
+        if self._main_thread is None or self._main_thread == threading.get_ident():
+            self._main_connection = connection
+            self._main_thread = threading.get_ident() if connection is not None else None
+        else:
+            self._local.connection = connection
+    
     def __init__(self):
         """Инициализация подключения к БД"""
+        # Повторный вызов DatabaseConnection() возвращает тот же объект
+        # и не должен сбрасывать авторизацию и открытое соединение
+        if getattr(self, '_initialized', False):
+            return
+        self._initialized = True
+        
         self.db_path = 'med_center.db'
         self.authorized = False
+        self.storage_profile = self.DEFAULT_STORAGE_PROFILE
+        self._writer = None
+        
+        # Формат строк результатов по умолчанию (см. row_types.ROW_FORMATS)
+        self.row_format = 'dict'
         
         # Статус подключения
         self.connected = False
@@ -30,51 +482,120 @@ class DatabaseConnection:
     
     def connect(self, password=None):
         """Установка соединения с базой данных"""
+        # Соединение открывается только после авторизации
+        if self._connection is not None:
+            return True
+        
         # Проверка пароля при первом подключении
         if not self.authorized and password is not None:
             if not self.verify_password(password):
-                print("Неверный пароль для доступа к базе данных")
+                logger.warning("Неверный пароль для доступа к базе данных")
                 return False
             self.authorized = True
         
         # Если уже авторизованы или пароль верный
         if self.authorized:
             try:
-                # Проверка существования файла базы данных
-                db_exists = os.path.exists(self.db_path)
-                print(f"Файл базы данных {'существует' if db_exists else 'не существует'}")
+                self._connection = sqlite3.connect(self.db_path)
+                self._apply_pragmas(self._connection)
+                self._connection.row_factory = row_factory('dict')
+                # Встроенная lower() в SQLite не работает с кириллицей
+                self._connection.create_function("py_lower", 1, self._lower, deterministic=True)
+                self.connected = True
+                logger.info("Подключение к базе данных установлено")
                 
-                if self._connection is None:
-                    self._connection = sqlite3.connect(self.db_path)
-                    self._connection.row_factory = self._dict_factory
-                    self.connected = True
-                    print("Подключение к базе данных установлено")
-                    
-                    # Создаем таблицы если они не существуют
-                    self._initialize_database()
-                    
-                    # Если файл базы данных не существовал, то создаем тестовые данные
-                    if not db_exists:
-                        print("Создание тестовых данных...")
-                        self._create_test_data(force=True)
+                # Создание таблиц, миграции и тестовые данные - один раз за процесс
+                bootstrap_key = os.path.abspath(self.db_path)
+                if bootstrap_key not in self._bootstrapped_paths:
+                    if self._initialize_database():
+                        DatabaseConnection._bootstrapped_paths.add(bootstrap_key)
                 return True
             except sqlite3.Error as e:
+                if self._connection is not None:
+                    self._connection.close()
+                    self._connection = None
                 self.connected = False
-                print(f"Ошибка подключения к базе данных: {e}")
+                logger.error("Ошибка подключения к базе данных: %s", e)
                 return False
         else:
-            print("Необходима авторизация для доступа к базе данных")
+            logger.warning("Необходима авторизация для доступа к базе данных")
+            return False
+    
+    def storage_pragmas(self):
+        """PRAGMA текущего профиля хранения"""
+        return dict(self.STORAGE_PROFILES[self.storage_profile])
+    
+    def _apply_pragmas(self, connection):
+        """Применение PRAGMA профиля хранения к соединению"""
+        for name, value in self.storage_pragmas().items():
+            # PRAGMA не поддерживает параметры запроса
+            connection.execute(f"PRAGMA {name} = {value}")
+    
+    def start_writer(self):
+        """
+        Запуск потока-писателя: запросы execute_query из всех потоков
+        выполняются одним соединением, одновременные записи объединяются
+        в одну транзакцию
+        
+        Работает только в режиме WAL, иначе открытые курсоры чтения
+        блокировали бы фиксацию транзакций писателя.
+        """
+        if self._connection is None and not self.connect():
             return False
+        
+        journal_mode = self._connection.execute("PRAGMA journal_mode").fetchone()
+        if list(journal_mode.values())[0].lower() != 'wal':
+            logger.warning("Поток записи доступен только в режиме WAL")
+            return False
+        
+        if self._writer is None:
+            self._writer = DatabaseWriter(self.db_path, self.storage_pragmas())
+        self._writer.start()
+        return True
     
-    def _dict_factory(self, cursor, row):
-        """Конвертирует строку результата в словарь"""
-        d = {}
-        for idx, col in enumerate(cursor.description):
-            d[col[0]] = row[idx]
-        return d
+    def stop_writer(self):
+        """Остановка потока-писателя после записи всех запросов из очереди"""
+        if self._writer is not None:
+            self._writer.stop()
+            self._writer = None
+    
+    def submit_write(self, query, params=None):
+        """
+        Постановка запроса на запись в очередь без ожидания результата
+        
+        :return: Future с lastrowid (для INSERT) или rowcount,
+                 None если поток-писатель не запущен
+        """
+        if self._writer is None or not self._writer.running:
+            return None
+        return self._writer.submit(query, params)
+    
+    @staticmethod
+    def _lower(value):
+        """Приведение строки к нижнему регистру для SQL-функции py_lower"""
+        return value.lower() if isinstance(value, str) else value
+    
+    def _query_cursor(self, row_format):
+        """
+        Курсор для чтения строк в заданном формате
+        
+        Кроме формата 'row' строки читаются кортежами и преобразуются
+        после чтения, без вызова Python-функции из SQLite для каждой строки.
+        """
+        row_format = row_format or self.row_format
+        if row_format not in ROW_FORMATS:
+            raise ValueError(f"Неизвестный формат строк: {row_format}")
+        
+        cursor = self._connection.cursor()
+        cursor.row_factory = sqlite3.Row if row_format == 'row' else None
+        return cursor, row_format
     
     def _initialize_database(self):
-        """Инициализация базы данных (создание таблиц)"""
+        """
+        Инициализация базы данных (создание таблиц)
+        
+        :return: True, если таблицы и миграции применены успешно
+        """
         try:
             cursor = self._connection.cursor()
             
@@ -160,14 +681,75 @@ class DatabaseConnection:
             ''')
             
             # Создаем тестовые данные, если таблицы были пустыми
+            # (до миграций, чтобы миграции переносили и их)
             self._create_test_data()
             
+            # Применяем миграции схемы (индексы, нормализованные значения и т.п.)
+            self._apply_migrations(cursor)
+            
             self._connection.commit()
+            return True
             
         except sqlite3.Error as e:
-            print(f"Ошибка при инициализации базы данных: {e}")
+            logger.error("Ошибка при инициализации базы данных: %s", e)
             self._connection.rollback()
+            return False
     
+    def _apply_migrations(self, cursor):
+        """Применение миграций схемы, версия которых выше PRAGMA user_version"""
+        cursor.execute("PRAGMA user_version")
+        current_version = cursor.fetchone()['user_version']
+        if current_version >= self.SCHEMA_VERSION:
+            return
+        
+        for version in sorted(self.SCHEMA_MIGRATIONS):
+            if version <= current_version:
+                continue
+                
+            logger.info("Применение миграции схемы до версии %s", version)
+            for statement in self.SCHEMA_MIGRATIONS[version]:
+                if callable(statement):
+                    statement(cursor)
+                else:
+                    cursor.execute(statement)
+                
+            # PRAGMA не поддерживает параметры, версия - всегда целое число
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            current_version = version
+            
+    def change_stamp(self):
+        """
+        Отметка состояния данных для проверки актуальности кэшей
+        
+        PRAGMA data_version меняется после фиксации изменений другими
+        соединениями (в том числе потоком записи), total_changes - после
+        изменений через это соединение. Пока отметка не изменилась,
+        результаты запросов на чтение остаются прежними.
+        
+        :return: Кортеж (data_version, total_changes) или None, если нет соединения
+        """
+        if self._connection is None and not self.connect():
+            return None
+        try:
+            cursor = self._connection.cursor()
+            cursor.row_factory = None
+            data_version = cursor.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error("Ошибка получения версии данных: %s", e)
+            return None
+        return data_version, self._connection.total_changes
+    
+    def explain_query_plan(self, query, params=None):
+        """
+        Получение плана выполнения запроса (EXPLAIN QUERY PLAN)
+        
+        :param query: SQL-запрос
+        :param params: Параметры запроса
+        :return: Список строк плана (поле detail)
+        """
+        rows = self.fetch_all(f"EXPLAIN QUERY PLAN {query}", params)
+        return [row['detail'] for row in rows]
+        
     def _create_test_data(self, force=False):
         """Создание тестовых данных, если они не существуют"""
         # Проверяем, есть ли пользователи
@@ -176,6 +758,7 @@ class DatabaseConnection:
         result = cur.fetchone()
         
         if result and result['count'] == 0 or force:
+            logger.info("Создание тестовых данных...")
             # Создаем пользователей
             user_data = [
                 ('admin', 'admin123', 'Администратор Системы', 'admin', 'admin@medcenter.com'),
@@ -331,25 +914,46 @@ class DatabaseConnection:
             
             self._connection.commit()
     
+    def close_thread_connection(self):
+        """Закрытие соединения фонового потока (основное соединение не закрывается)"""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+    
     def disconnect(self):
         """Закрытие соединения с базой данных"""
+        if self._main_thread is not None and self._main_thread != threading.get_ident():
+            self.close_thread_connection()
+            return
+        self.stop_writer()
         if self._connection:
             self._connection.close()
             self._connection = None
             self.connected = False
-            print("Соединение с базой данных закрыто")
+            logger.info("Соединение с базой данных закрыто")
     
     def execute_query(self, query, params=None):
         """Выполнение SQL-запроса"""
-        if not self.connect():
+        if self._connection is None and not self.connect():
             return None
+        
+        started = time.perf_counter()
+        future = self.submit_write(query, params)
+        if future is not None:
+            try:
+                result = future.result()
+            except sqlite3.Error as e:
+                logger.error("Ошибка выполнения запроса: %s; запрос: %s; параметры: %r", e, query, params)
+                return None
+            log_query(query, params, started)
+            return result
             
         try:
             cursor = self._connection.cursor()
-            print(f"Выполнение запроса: {query}")
-            print(f"Параметры: {params}")
             cursor.execute(query, params or ())
             self._connection.commit()
+            log_query(query, params, started)
             # Для INSERT возвращаем lastrowid, для UPDATE/DELETE возвращаем rowcount
             cmd = query.strip().split()[0].lower()
             if cmd == 'insert':
@@ -358,61 +962,140 @@ class DatabaseConnection:
                 return cursor.rowcount
         except sqlite3.Error as e:
             self._connection.rollback()
-            print(f"Ошибка выполнения запроса: {e}")
-            print(f"Запрос: {query}")
-            print(f"Параметры: {params}")
+            logger.error("Ошибка выполнения запроса: %s; запрос: %s; параметры: %r", e, query, params)
             return None
     
-    def fetch_one(self, query, params=None):
-        """Получение одной записи из базы данных"""
-        if not self.connect():
+    def run_in_transaction(self, func):
+        """
+        Выполнение нескольких связанных запросов записи в одной транзакции
+        
+        :param func: Функция func(cursor), выполняющая запросы через курсор
+        :return: Результат функции или None при ошибке (изменения отменяются).
+                 Ошибкой считается и любое исключение самой функции,
+                 например при подготовке параметров запросов
+        """
+        if self._connection is None and not self.connect():
             return None
-            
+        
+        started = time.perf_counter()
+        name = getattr(func, '__name__', repr(func))
+        if self._writer is not None and self._writer.running:
+            # Писатель откатывает изменения функции до точки сохранения
+            try:
+                result = self._writer.submit_call(func).result()
+            except Exception as e:
+                logger.error("Ошибка выполнения транзакции %s: %s", name, e)
+                return None
+            log_query(f"-- транзакция {name}", None, started)
+            return result
+        
         try:
             cursor = self._connection.cursor()
+            cursor.row_factory = None
+            result = func(cursor)
+            self._connection.commit()
+            log_query(f"-- транзакция {name}", None, started)
+            return result
+        except Exception as e:
+            # Без отката незавершенные изменения зафиксировал бы следующий запрос
+            self._connection.rollback()
+            logger.error("Ошибка выполнения транзакции %s: %s", name, e)
+            return None
+    
+    def fetch_one(self, query, params=None, row_format=None):
+        """
+        Получение одной записи из базы данных
+        
+        :param row_format: Формат строки ('dict', 'row', 'tuple', 'record'),
+                           по умолчанию self.row_format
+        """
+        if self._connection is None and not self.connect():
+            return None
+            
+        try:
+            started = time.perf_counter()
+            cursor, row_format = self._query_cursor(row_format)
             cursor.execute(query, params or ())
-            return cursor.fetchone()
+            row = cursor.fetchone()
+            log_query(query, params, started)
+            if row is None or row_format == 'row':
+                return row
+            converter = row_converter(row_format, cursor.description)
+            return converter(row) if converter else row
         except sqlite3.Error as e:
-            print(f"Ошибка выполнения запроса: {e}")
+            logger.error("Ошибка выполнения запроса: %s; запрос: %s; параметры: %r", e, query, params)
             return None
     
-    def fetch_all(self, query, params=None):
-        """Получение всех записей из базы данных"""
-        if not self.connect():
+    def fetch_all(self, query, params=None, row_format=None):
+        """
+        Получение всех записей из базы данных
+        
+        :param row_format: Формат строк ('dict', 'row', 'tuple', 'record'),
+                           по умолчанию self.row_format
+        """
+        if self._connection is None and not self.connect():
             return []
             
         try:
-            cursor = self._connection.cursor()
+            started = time.perf_counter()
+            cursor, row_format = self._query_cursor(row_format)
             cursor.execute(query, params or ())
-            return cursor.fetchall()
+            rows = cursor.fetchall()
+            log_query(query, params, started)
+            if row_format == 'row' or not rows:
+                return rows
+            # Имена столбцов определяются один раз для всего результата
+            return convert_rows(row_format, cursor.description, rows)
         except sqlite3.Error as e:
-            print(f"Ошибка выполнения запроса: {e}")
+            logger.error("Ошибка выполнения запроса: %s; запрос: %s; параметры: %r", e, query, params)
             return []
 
+    def iter_query(self, query, params=None, row_format=None):
+        """
+        Выполнение запроса с постепенным чтением результатов
+        
+        :param row_format: Формат строк ('dict', 'row', 'tuple', 'record'),
+                           по умолчанию self.row_format
+        :return: Курсор для чтения строк (fetchmany) или None при ошибке
+        """
+        if self._connection is None and not self.connect():
+            return None
+        
+        try:
+            # Время учитывает только выполнение запроса, без чтения строк
+            started = time.perf_counter()
+            cursor, row_format = self._query_cursor(row_format)
+            cursor.row_factory = row_factory(row_format)
+            cursor.execute(query, params or ())
+            log_query(query, params, started)
+            return cursor
+        except sqlite3.Error as e:
+            logger.error("Ошибка выполнения запроса: %s; запрос: %s; параметры: %r", e, query, params)
+            return None
+    
     # Методы для работы с пользователями
     def authenticate_user(self, username, password):
         """Аутентификация пользователя"""
-        print(f"Попытка аутентификации пользователя: {username}")
+        logger.debug("Попытка аутентификации пользователя: %s", username)
         query = "SELECT * FROM users WHERE username = ? AND password = ? AND status = 'active'"
-        print(f"Выполнение запроса: {query} с параметрами: {username}, {password}")
         
         # Сначала проверим, есть ли такой пользователь вообще
         check_user = self.fetch_one("SELECT * FROM users WHERE username = ?", (username,))
         if not check_user:
-            print(f"Пользователь с логином {username} не найден в базе данных")
+            logger.info("Пользователь с логином %s не найден в базе данных", username)
             return None
         
         user = self.fetch_one(query, (username, password))
         
         if user:
-            print(f"Пользователь {username} успешно аутентифицирован")
+            logger.info("Пользователь %s успешно аутентифицирован", username)
             # Обновление времени последнего входа
             current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             update_query = "UPDATE users SET last_login = ? WHERE id = ?"
             self.execute_query(update_query, (current_time, user['id']))
             return user
         else:
-            print(f"Неверный пароль для пользователя {username}")
+            logger.info("Неверный пароль для пользователя %s", username)
             return None
     
     def get_all_users(self):
@@ -432,7 +1115,8 @@ class DatabaseConnection:
     def get_all_patients(self):
         """Получение всех пациентов"""
         query = "SELECT * FROM patients"
-        return self.fetch_all(query)
+        # Записи со __slots__ создаются быстрее словарей и поддерживают get() и []
+        return self.fetch_all(query, row_format='record')
     
     def get_patient(self, patient_id):
         """Получение данных о конкретном пациенте"""
@@ -480,7 +1164,15 @@ class DatabaseConnection:
         return []
     
     def add_analysis_result(self, patient_id, analysis_type_id, lab_user_id, result_data):
-        """Добавление результата анализа"""
+        """
+        Добавление результата анализа
+        
+        Значения сохраняются в JSON (result_data) и построчно в parameter_values
+        в одной транзакции.
+        
+        :return: ID результата анализа или None при ошибке
+        """
+        values = result_data
         # Сериализация результатов в строку
         if isinstance(result_data, dict):
             result_data = json.dumps(result_data)
@@ -489,7 +1181,14 @@ class DatabaseConnection:
         INSERT INTO analysis_results (patient_id, analysis_type_id, lab_user_id, result_data, status) 
         VALUES (?, ?, ?, ?, 'completed')
         """
-        return self.execute_query(query, (patient_id, analysis_type_id, lab_user_id, result_data))
+        
+        def insert_result(cursor):
+            cursor.execute(query, (patient_id, analysis_type_id, lab_user_id, result_data))
+            result_id = cursor.lastrowid
+            save_parameter_values(cursor, result_id, analysis_type_id, values)
+            return result_id
+        
+        return self.run_in_transaction(insert_result)
     
     def get_patient_analysis_results(self, patient_id):
         """Получение всех результатов анализов пациента"""
@@ -514,19 +1213,118 @@ class DatabaseConnection:
         JOIN users u ON ar.lab_user_id = u.id
         ORDER BY ar.result_date DESC
         """
-        return self.fetch_all(query)
+        return self.fetch_all(query, row_format='record')
+    
+    def get_analysis_results_page(self, patient_id=None, status=None, start_date=None, end_date=None,
+                                  after=None, limit=50):
+        """
+        Получение страницы результатов анализов с фильтрами (keyset-пагинация)
+        
+        Результаты упорядочены по (result_date, id) по убыванию. Следующая страница
+        запрашивается по ключу последней строки предыдущей, поэтому время загрузки
+        не зависит от того, сколько страниц уже просмотрено.
+        
+        :param patient_id: ID пациента или None
+        :param status: Статус результата или None
+        :param start_date: Начальная дата периода (включительно) или None
+        :param end_date: Конечная дата периода (включительно) или None
+        :param after: Кортеж (result_date, id) последней загруженной строки или None
+        :param limit: Размер страницы
+        :return: Список результатов анализов
+        """
+        conditions = QueryConditions()
+        conditions.add_equals("ar.patient_id", patient_id)
+        conditions.add_equals("ar.status", status)
+        conditions.add_date_range("ar.result_date", start_date, end_date)
+        
+        if after:
+            conditions.add("(ar.result_date, ar.id) < (?, ?)", *after)
+        
+        query = f"""
+        SELECT ar.*, at.name as analysis_name, p.full_name as patient_name, u.full_name as lab_technician_name 
+        FROM analysis_results ar
+        JOIN analysis_types at ON ar.analysis_type_id = at.id
+        JOIN patients p ON ar.patient_id = p.id
+        JOIN users u ON ar.lab_user_id = u.id
+        WHERE {conditions.where_clause()}
+        ORDER BY ar.result_date DESC, ar.id DESC
+        LIMIT ?
+        """
+        return self.fetch_all(query, conditions.params + [limit])
+    
+    def get_parameter_value_results(self, parameter_name, min_value=None, max_value=None,
+                                    start_date=None, end_date=None, analysis_type_id=None):
+        """
+        Результаты анализов, в которых значение параметра попадает в диапазон
+        
+        Например, все пациенты с глюкозой выше 6.1 за последний месяц:
+        get_parameter_value_results('Глюкоза', min_value=6.1, start_date=...)
+        Запрос использует индекс parameter_values(parameter_id, value).
+        
+        :param parameter_name: Название параметра анализа
+        :param min_value: Нижняя граница значения (не включительно) или None
+        :param max_value: Верхняя граница значения (не включительно) или None
+        :param start_date: Начальная дата периода (включительно) или None
+        :param end_date: Конечная дата периода (включительно) или None
+        :param analysis_type_id: ID типа анализа или None (все типы с этим параметром)
+        :return: Список результатов со значением параметра
+        """
+        conditions = QueryConditions()
+        conditions.add("ap.name = ?", parameter_name)
+        conditions.add_equals("ap.analysis_type_id", analysis_type_id)
+        if min_value is not None:
+            conditions.add("pv.value > ?", min_value)
+        if max_value is not None:
+            conditions.add("pv.value < ?", max_value)
+        if min_value is None and max_value is None:
+            conditions.add("pv.value IS NOT NULL")
+        conditions.add_date_range("ar.result_date", start_date, end_date)
+        
+        query = f"""
+        SELECT ar.id, ar.result_date, ar.status, ar.patient_id, p.full_name as patient_name,
+               at.name as analysis_name, ap.name as parameter_name, ap.unit,
+               pv.value, pv.value_text
+        FROM analysis_parameters ap
+        JOIN parameter_values pv ON pv.parameter_id = ap.id
+        JOIN analysis_results ar ON ar.id = pv.analysis_result_id
+        JOIN analysis_types at ON at.id = ap.analysis_type_id
+        JOIN patients p ON p.id = ar.patient_id
+        WHERE {conditions.where_clause()}
+        ORDER BY ar.result_date DESC, ar.id DESC
+        """
+        return self.fetch_all(query, conditions.params)
     
     # Методы для работы с расписанием
-    def get_doctor_schedule(self, doctor_id):
-        """Получение расписания врача"""
-        query = """
+    def get_doctor_schedule(self, doctor_id, day):
+        """
+        Получение расписания врача на один день
+        
+        :param doctor_id: ID врача
+        :param day: Дата ('YYYY-MM-DD', datetime.date или QDate)
+        :return: Список записей на прием за этот день
+        """
+        return self.get_doctor_schedule_range(doctor_id, day, day)
+        
+    def get_doctor_schedule_range(self, doctor_id, start_date, end_date):
+        """
+        Получение расписания врача за период
+        
+        :param doctor_id: ID врача
+        :param start_date: Начальная дата периода (включительно)
+        :param end_date: Конечная дата периода (включительно)
+        :return: Список записей на прием за период
+        """
+        conditions = QueryConditions().add("a.doctor_id = ?", doctor_id)
+        conditions.add_date_range("a.appointment_date", start_date, end_date)
+        
+        query = f"""
         SELECT a.*, p.full_name as patient_name 
         FROM appointments a
         JOIN patients p ON a.patient_id = p.id
-        WHERE a.doctor_id = ?
+        WHERE {conditions.where_clause()}
         ORDER BY a.appointment_date
         """
-        return self.fetch_all(query, (doctor_id,))
+        return self.fetch_all(query, conditions.params)
     
     def get_all_appointments(self):
         """Получение всех записей на прием"""
@@ -557,23 +1355,25 @@ class DatabaseConnection:
     
     def get_doctor_by_user_id(self, user_id):
         """Получение информации о враче по ID пользователя"""
-        print(f"Получение информации о враче для пользователя с ID: {user_id}")
+        logger.debug("Получение информации о враче для пользователя с ID: %s", user_id)
         query = "SELECT * FROM doctors WHERE user_id = ?"
         result = self.fetch_one(query, (user_id,))
-        print(f"Результат запроса информации о враче: {result}")
+        logger.debug("Результат запроса информации о враче: %s", result)
         return result
     
     def get_patients_without_analysis(self, analysis_type_id=None):
         """Получение списка пациентов, у которых нет анализов определенного типа
         
         Если analysis_type_id не указан, возвращает пациентов, у которых нет анализов вообще.
+        Наличие анализов проверяется по первичному ключу patient_analysis_coverage,
+        а не по всей таблице analysis_results.
         """
         if analysis_type_id:
             query = """
             SELECT p.* FROM patients p
-            WHERE p.id NOT IN (
-                SELECT DISTINCT patient_id FROM analysis_results 
-                WHERE analysis_type_id = ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM patient_analysis_coverage c
+                WHERE c.patient_id = p.id AND c.analysis_type_id = ?
             )
             ORDER BY p.full_name
             """
@@ -581,12 +1381,32 @@ class DatabaseConnection:
         else:
             query = """
             SELECT p.* FROM patients p
-            WHERE p.id NOT IN (
-                SELECT DISTINCT patient_id FROM analysis_results
+            WHERE NOT EXISTS (
+                SELECT 1 FROM patient_analysis_coverage c WHERE c.patient_id = p.id
             )
             ORDER BY p.full_name
             """
             return self.fetch_all(query)
+    
+    def get_patients_with_outdated_analysis(self, analysis_type_id, days):
+        """
+        Пациенты, последний анализ определенного типа которых сдан более days дней назад
+        
+        Пациенты, у которых нет анализов этого типа, не включаются
+        (см. get_patients_without_analysis).
+        
+        :param analysis_type_id: ID типа анализа
+        :param days: Количество дней
+        :return: Список пациентов (с полем last_result_date), сначала сдававшие раньше всех
+        """
+        query = """
+        SELECT p.*, c.last_result_date
+        FROM patient_analysis_coverage c
+        JOIN patients p ON p.id = c.patient_id
+        WHERE c.analysis_type_id = ? AND c.last_result_date < datetime('now', ?)
+        ORDER BY c.last_result_date
+        """
+        return self.fetch_all(query, (analysis_type_id, f"-{int(days)} days"))
 
     def get_analysis_result_details(self, result_id):
         """
@@ -600,7 +1420,7 @@ class DatabaseConnection:
             query = """
             SELECT ar.id, ar.patient_id, ar.analysis_type_id, ar.lab_user_id, 
                    ar.result_data, ar.result_date, ar.status,
-                   p.full_name as patient_name, p.birth_date,
+                   p.full_name as patient_name, p.birth_date, p.gender,
                    at.name as analysis_type_name, at.description as analysis_type_description,
                    at.parameters as analysis_type_parameters,
                    u.full_name as lab_technician_name
@@ -624,7 +1444,7 @@ class DatabaseConnection:
                     'id': result['patient_id'],
                     'full_name': result['patient_name'],
                     'birth_date': result['birth_date'],
-                    'gender': 'Не указан'  # Используем значение по умолчанию
+                    'gender': result['gender'] or 'Не указан'
                 },
                 'analysis_type': {
                     'id': result['analysis_type_id'],
@@ -646,40 +1466,28 @@ class DatabaseConnection:
                 # Получаем список параметров анализа
                 analysis_parameters = result['analysis_type_parameters'].split(',') if result['analysis_type_parameters'] else []
                 
-                # Нормальные значения для известных параметров
-                normal_values = {
-                    'Гемоглобин': {'min': 120, 'max': 160, 'unit': 'г/л'},
-                    'Эритроциты': {'min': 3.8, 'max': 5.5, 'unit': 'млн/мкл'},
-                    'Лейкоциты': {'min': 4.0, 'max': 9.0, 'unit': 'тыс/мкл'},
-                    'Тромбоциты': {'min': 180, 'max': 320, 'unit': 'тыс/мкл'},
-                    'СОЭ': {'min': 2, 'max': 15, 'unit': 'мм/ч'},
-                    'Глюкоза': {'min': 3.9, 'max': 6.1, 'unit': 'ммоль/л'},
-                    'Холестерин': {'min': 3.0, 'max': 5.2, 'unit': 'ммоль/л'},
-                    'Билирубин': {'min': 3.4, 'max': 17.1, 'unit': 'мкмоль/л'},
-                    'АЛТ': {'min': 5, 'max': 40, 'unit': 'ед/л'},
-                    'АСТ': {'min': 5, 'max': 40, 'unit': 'ед/л'},
-                    'Креатинин': {'min': 53, 'max': 106, 'unit': 'мкмоль/л'},
-                    'Мочевина': {'min': 2.5, 'max': 8.3, 'unit': 'ммоль/л'},
-                    'pH': {'min': 5.0, 'max': 7.0, 'unit': ''},
-                    'Белок': {'min': None, 'max': None, 'unit': ''},
-                    'Кетоновые тела': {'min': None, 'max': None, 'unit': ''}
-                }
+                # Нормы подбираются по полу и возрасту пациента на дату анализа
+                age = age_on(result['birth_date'], result['result_date'])
                 
                 for param_name in analysis_parameters:
+                    param_name = param_name.strip()
                     param_value = result_data_dict.get(param_name, 'Нет данных')
-                    normal_vals = normal_values.get(param_name, {'min': None, 'max': None, 'unit': ''})
+                    normal_range = reference_ranges.lookup(param_name, result['gender'], age)
+                    normal_min = normal_range.low if normal_range else None
+                    normal_max = normal_range.high if normal_range else None
                     
                     # Определяем, в норме ли значение
                     is_normal = None
-                    if normal_vals['min'] is not None and normal_vals['max'] is not None and isinstance(param_value, (int, float)):
-                        is_normal = normal_vals['min'] <= param_value <= normal_vals['max']
+                    number = parse_parameter_value(param_value)[0]
+                    if normal_min is not None and normal_max is not None and number is not None:
+                        is_normal = normal_min <= number <= normal_max
                     
                     parameters.append({
                         'name': param_name,
                         'value': param_value,
-                        'unit': normal_vals['unit'],
-                        'normal_min': normal_vals['min'],
-                        'normal_max': normal_vals['max'],
+                        'unit': normal_range.unit if normal_range else '',
+                        'normal_min': normal_min,
+                        'normal_max': normal_max,
                         'is_normal': is_normal
                     })
                 
@@ -698,7 +1506,7 @@ class DatabaseConnection:
             return result_details
             
         except Exception as e:
-            print(f"Ошибка при получении деталей результата анализа: {e}")
+            logger.error("Ошибка при получении деталей результата анализа: %s", e)
             return None
 
 
@@ -0,0 +1,170 @@
+"""
+Поток-писатель для базы данных SQLite.
+
+Все операции записи ставятся в очередь и выполняются одним потоком.
+Операции, накопившиеся в очереди к моменту начала записи, объединяются
+в одну транзакцию, поэтому при параллельной работе нескольких окон
+(и фоновых задач) на диск выполняется одна фиксация вместо многих.
+Результат каждой операции возвращается через concurrent.futures.Future
+после фиксации транзакции.
+"""
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+# Признак остановки потока-писателя
+_STOP = object()
+
+
+class DatabaseWriter:
+    """Единственный поток записи в базу данных с группировкой транзакций"""
+    
+    def __init__(self, db_path, pragmas=None, max_batch=500):
+        """
+        :param db_path: Путь к файлу базы данных
+        :param pragmas: PRAGMA, применяемые к соединению писателя
+        :param max_batch: Максимальное количество операций в одной транзакции
+        """
+        self.db_path = db_path
+        self.pragmas = pragmas or {}
+        self.max_batch = max_batch
+        
+        self._queue = queue.Queue()
+        self._thread = None
+    
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self):
+        """Запуск потока-писателя"""
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="DatabaseWriter", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Остановка потока после записи всех операций из очереди"""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+    
+    def submit(self, query, params=None):
+        """
+        Постановка операции записи в очередь
+        
+        :return: Future с lastrowid (для INSERT) или rowcount
+        """
+        future = Future()
+        self._queue.put((future, 'execute', query, params or ()))
+        return future
+    
+    def submit_many(self, query, seq_of_params):
+        """Постановка пакетной операции (executemany) в очередь"""
+        future = Future()
+        self._queue.put((future, 'many', query, list(seq_of_params)))
+        return future
+    
+    def submit_call(self, func):
+        """
+        Постановка в очередь функции func(cursor), выполняющей несколько
+        связанных запросов (например, вставку с зависимыми строками)
+        
+        Все запросы функции фиксируются вместе; при ошибке отменяются
+        только они, а не вся группа операций.
+        
+        :return: Future с результатом функции
+        """
+        future = Future()
+        self._queue.put((future, 'call', func, None))
+        return future
+    
+    def _connect(self):
+        # Транзакциями управляет сам писатель
+        conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+    
+    def _run(self):
+        conn = self._connect()
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                
+                # Забираем все операции, уже ожидающие в очереди
+                batch = [item]
+                while len(batch) < self.max_batch:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                
+                self._write_batch(conn, batch)
+        finally:
+            conn.close()
+    
+    def _write_batch(self, conn, batch):
+        """Выполнение группы операций в одной транзакции"""
+        completed = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            for future, *_ in batch:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+        
+        # Точки сохранения нужны в группе (ошибка одной операции не должна
+        # отменять остальные) и для функций из нескольких запросов
+        in_group = len(batch) > 1
+        for future, kind, query, params in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            
+            use_savepoint = in_group or kind == 'call'
+            if use_savepoint:
+                conn.execute("SAVEPOINT write_item")
+            try:
+                if kind == 'call':
+                    result = query(conn.cursor())
+                elif kind == 'many':
+                    cursor = conn.executemany(query, params)
+                else:
+                    cursor = conn.execute(query, params)
+                if use_savepoint:
+                    conn.execute("RELEASE write_item")
+            except Exception as e:
+                if use_savepoint:
+                    conn.execute("ROLLBACK TO write_item")
+                    conn.execute("RELEASE write_item")
+                future.set_exception(e)
+                continue
+            
+            if kind == 'call':
+                completed.append((future, result))
+            elif query.strip().split()[0].lower() == 'insert':
+                completed.append((future, cursor.lastrowid))
+            else:
+                completed.append((future, cursor.rowcount))
+        
+        try:
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK")
+            for future, _ in completed:
+                future.set_exception(e)
+            return
+        
+        for future, result in completed:
+            future.set_result(result)
@@ -2,14 +2,23 @@ from PySide6.QtWidgets import (QMainWindow, QWidget, QLabel, QComboBox, QPushBut
                                QVBoxLayout, QHBoxLayout, QMessageBox, QFormLayout, 
                                QTableWidget, QTableWidgetItem, QLineEdit, QDialog,
                                QTabWidget, QCalendarWidget, QDateEdit, QGroupBox,
-                               QScrollArea, QFrame, QHeaderView)
+                               QScrollArea, QFrame, QHeaderView, QTableView)
 from PySide6.QtCore import Qt, Signal, QDate
 from PySide6.QtGui import QFont, QIcon, QColor
 import sys
 import json
+import logging
+from collections import OrderedDict
 from datetime import datetime
 
+from analysis_flags import analysis_flags
 from database_connection import db
+from reference_cache import reference_cache
+from reference_ranges import reference_ranges
+from table_models import (LazyQueryTableModel, TableColumn, ActionButtonsDelegate, RowAction,
+                          ABNORMAL_RESULT_COLOR)
+
+logger = logging.getLogger(__name__)
 
 class AppointmentDetailsDialog(QDialog):
     """Диалоговое окно с деталями приема"""
@@ -18,6 +27,9 @@ class AppointmentDetailsDialog(QDialog):
         super().__init__(parent)
         self.appointment_data = appointment_data
         
+        # Признак того, что статус приема был изменен в базе данных
+        self.status_changed = False
+        
         self.setWindowTitle("Детали приема")
         self.setMinimumWidth(400)
         self.setup_ui()
@@ -151,6 +163,7 @@ class AppointmentDetailsDialog(QDialog):
             if db.update_appointment_status(appointment_id, new_status):
                 QMessageBox.information(self, "Успех", "Статус приема успешно изменен")
                 self.appointment_data['status'] = new_status
+                self.status_changed = True
                 self.accept()  # Закрываем окно
             else:
                 QMessageBox.critical(self, "Ошибка", "Не удалось изменить статус приема")
@@ -242,37 +255,42 @@ class AnalysisDetailsDialog(QDialog):
         self.setLayout(layout)
     
     def get_normal_value(self, parameter):
-        """Получение нормальных значений для параметра анализа"""
-        normal_values = {
-            'Гемоглобин': '120-160 г/л',
-            'Эритроциты': '3.8-5.5 млн/мкл',
-            'Лейкоциты': '4.0-9.0 тыс/мкл',
-            'Тромбоциты': '180-320 тыс/мкл',
-            'СОЭ': '2-15 мм/ч',
-            'Глюкоза': '3.9-6.1 ммоль/л',
-            'Холестерин': '3.0-5.2 ммоль/л',
-            'Билирубин': '3.4-17.1 мкмоль/л',
-            'АЛТ': '5-40 ед/л',
-            'АСТ': '5-40 ед/л',
-            'Креатинин': '53-106 мкмоль/л',
-            'Мочевина': '2.5-8.3 ммоль/л',
-            'pH': '5.0-7.0',
-            'Белок': 'Отсутствует',
-            'Кетоновые тела': 'Отсутствуют',
-            'Цвет': 'Светло-желтый',
-            'Прозрачность': 'Прозрачная'
-        }
-        return normal_values.get(parameter, 'Не определено')
+        """Получение нормальных значений для параметра анализа из справочника"""
+        return reference_ranges.describe(parameter, default='Не определено')
 
 
 class DoctorWindow(QMainWindow):
     """Главное окно интерфейса врача"""
     logout_signal = Signal()
     
+    # Текст и цвет статусов приема в расписании
+    SCHEDULE_STATUS_TEXT = {
+        'scheduled': 'Запланирован',
+        'completed': 'Завершен',
+        'cancelled': 'Отменен'
+    }
+    SCHEDULE_STATUS_COLORS = {
+        'scheduled': QColor("#ffc107"),  # Желтый
+        'completed': QColor("#28a745"),  # Зеленый
+        'cancelled': QColor("#dc3545")   # Красный
+    }
+    
+    # Количество дней расписания, хранимых в кэше
+    SCHEDULE_CACHE_SIZE = 14
+    
+    # Виды данных из reference_versions, которые показывает расписание
+    SCHEDULE_DATA_KINDS = ('appointments', 'patients')
+    
+    # Количество результатов анализов на одной странице
+    ANALYSIS_PAGE_SIZE = 50
+    
     def __init__(self, user_data):
         super().__init__()
         self.user_data = user_data
         
+        # Кэш расписания по дням (LRU): дата -> (версии данных, список записей на прием)
+        self._schedule_cache = OrderedDict()
+        
         # Получаем информацию о враче
         self.doctor_info = db.get_doctor_by_user_id(user_data['id'])
         
@@ -341,6 +359,9 @@ class DoctorWindow(QMainWindow):
         self.tab_widget.addTab(self.analysis_tab, "Анализы")
         
         main_layout.addWidget(self.tab_widget)
+        
+        # Список пациентов обновляется при переходе на вкладку, если изменился
+        self.tab_widget.currentChanged.connect(lambda index: reference_cache.refresh())
     
     def setup_schedule_tab(self):
         """Настройка вкладки расписания"""
@@ -365,12 +386,24 @@ class DoctorWindow(QMainWindow):
         layout.addLayout(filter_layout)
         
         # Таблица с расписанием
-        self.schedule_table = QTableWidget()
-        self.schedule_table.setColumnCount(6)
-        self.schedule_table.setHorizontalHeaderLabels([
-            "Дата", "Время", "Пациент", "Статус", "Примечания", "Действия"
-        ])
+        self.schedule_model = LazyQueryTableModel([
+            TableColumn("Дата", 'appointment_date', display=lambda a: str(a['appointment_date'])[:10]),
+            TableColumn("Время", 'appointment_date', display=self.format_appointment_time),
+            TableColumn("Пациент", 'patient_name'),
+            TableColumn("Статус", 'status',
+                        display=lambda a: self.SCHEDULE_STATUS_TEXT.get(a['status'], a['status']),
+                        background=lambda a: self.SCHEDULE_STATUS_COLORS.get(a['status'])),
+            TableColumn("Примечания", 'notes'),
+            TableColumn("Действия")
+        ], parent=self)
+        
+        self.schedule_table = QTableView()
+        self.schedule_table.setModel(self.schedule_model)
+        self.schedule_table.setItemDelegateForColumn(5, ActionButtonsDelegate([
+            RowAction("Просмотр", self.view_appointment_details)
+        ], self.schedule_table))
         self.schedule_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.schedule_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         self.schedule_table.setSortingEnabled(True)
         
         layout.addWidget(self.schedule_table)
@@ -387,12 +420,9 @@ class DoctorWindow(QMainWindow):
         
         patient_label = QLabel("Пациент:")
         self.patient_filter = QComboBox()
-        self.patient_filter.addItem("Все пациенты", None)
         
-        # Загрузка списка пациентов
-        patients = db.get_all_patients()
-        for patient in patients:
-            self.patient_filter.addItem(patient['full_name'], patient['id'])
+        # Общий список пациентов с опцией "Все пациенты"
+        reference_cache.bind_combo(self.patient_filter, 'patients', "Все пациенты")
         
         date_label = QLabel("Период:")
         self.start_date_filter = QDateEdit()
@@ -405,11 +435,20 @@ class DoctorWindow(QMainWindow):
         self.end_date_filter.setDate(QDate.currentDate())
         self.end_date_filter.setCalendarPopup(True)
         
+        status_label = QLabel("Статус:")
+        self.status_filter = QComboBox()
+        self.status_filter.addItem("Все статусы", None)
+        self.status_filter.addItem("В обработке", "pending")
+        self.status_filter.addItem("Выполнен", "completed")
+        self.status_filter.addItem("Отправлен", "sent")
+        
         apply_filter_button = QPushButton("Применить")
         apply_filter_button.clicked.connect(self.load_analysis_results)
         
         filter_layout.addWidget(patient_label)
         filter_layout.addWidget(self.patient_filter)
+        filter_layout.addWidget(status_label)
+        filter_layout.addWidget(self.status_filter)
         filter_layout.addWidget(date_label)
         filter_layout.addWidget(self.start_date_filter)
         filter_layout.addWidget(date_to_label)
@@ -430,6 +469,11 @@ class DoctorWindow(QMainWindow):
         
         layout.addWidget(self.analysis_table)
         
+        # Кнопка загрузки следующей страницы
+        self.load_more_button = QPushButton("Загрузить еще")
+        self.load_more_button.clicked.connect(self.load_more_analysis_results)
+        layout.addWidget(self.load_more_button)
+        
         # Загрузка результатов анализов
         self.load_analysis_results()
     
@@ -442,196 +486,177 @@ class DoctorWindow(QMainWindow):
         # Получение даты из фильтра
         filter_date = self.date_filter.date().toString("yyyy-MM-dd")
         
-        print(f"Загрузка расписания для врача ID: {self.doctor_info['id']} на дату: {filter_date}")
+        logger.debug("Загрузка расписания для врача ID: %s на дату: %s", self.doctor_info['id'], filter_date)
         
-        # Получение расписания из базы данных
+        # Получение расписания на выбранный день (из кэша или базы данных)
         try:
-            appointments = db.fetch_all("""
-                SELECT a.*, p.full_name as patient_name 
-                FROM appointments a
-                JOIN patients p ON a.patient_id = p.id
-                WHERE a.doctor_id = ?
-                ORDER BY a.appointment_date
-            """, (self.doctor_info['id'],))
-            
-            print(f"Найдено записей: {len(appointments)}")
+            filtered_appointments = self.get_day_schedule(filter_date)
             
-            # Фильтрация по дате на стороне приложения
-            filtered_appointments = []
-            for appointment in appointments:
-                appointment_date = appointment['appointment_date'].split()[0]  # Получаем только дату без времени
-                if appointment_date == filter_date:
-                    filtered_appointments.append(appointment)
-            
-            print(f"После фильтрации осталось записей: {len(filtered_appointments)}")
+            logger.debug("Найдено записей: %d", len(filtered_appointments))
             
             # Заполнение таблицы
-            self.schedule_table.setRowCount(len(filtered_appointments))
-            
-            for row, appointment in enumerate(filtered_appointments):
-                # Время
-                appointment_datetime = appointment['appointment_date']
-                try:
-                    if isinstance(appointment_datetime, str):
-                        date_time = datetime.strptime(appointment_datetime, "%Y-%m-%d %H:%M:%S")
-                        time_item = QTableWidgetItem(date_time.strftime("%H:%M"))
-                    else:
-                        time_item = QTableWidgetItem(appointment_datetime.strftime("%H:%M"))
-                except Exception as e:
-                    print(f"Ошибка обработки даты: {e}")
-                    time_item = QTableWidgetItem(str(appointment_datetime))
-                
-                self.schedule_table.setItem(row, 0, time_item)
-                
-                # Пациент
-                patient_item = QTableWidgetItem(appointment['patient_name'])
-                self.schedule_table.setItem(row, 1, patient_item)
-                
-                # Примечания
-                notes_item = QTableWidgetItem(appointment['notes'] if appointment['notes'] else "")
-                self.schedule_table.setItem(row, 2, notes_item)
-                
-                # Статус
-                status_text = {
-                    'scheduled': 'Запланирован',
-                    'completed': 'Завершен',
-                    'cancelled': 'Отменен'
-                }.get(appointment['status'], appointment['status'])
-                
-                status_item = QTableWidgetItem(status_text)
-                
-                # Цветовое выделение статуса
-                if appointment['status'] == 'scheduled':
-                    status_item.setBackground(QColor("#ffc107"))  # Желтый
-                elif appointment['status'] == 'completed':
-                    status_item.setBackground(QColor("#28a745"))  # Зеленый
-                elif appointment['status'] == 'cancelled':
-                    status_item.setBackground(QColor("#dc3545"))  # Красный
-                
-                self.schedule_table.setItem(row, 3, status_item)
-                
-                # Кнопка действий
-                view_button = QPushButton("Просмотр")
-                view_button.clicked.connect(lambda checked, a=appointment: self.view_appointment_details(a))
-                self.schedule_table.setCellWidget(row, 4, view_button)
+            self.schedule_model.set_rows(filtered_appointments)
         except Exception as e:
-            print(f"Ошибка при загрузке расписания: {e}")
+            logger.error("Ошибка при загрузке расписания: %s", e)
             QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить расписание: {str(e)}")
         
         self.schedule_table.resizeColumnsToContents()
     
+    def format_appointment_time(self, appointment):
+        """Время приема в формате ЧЧ:ММ"""
+        appointment_datetime = appointment['appointment_date']
+        if isinstance(appointment_datetime, str):
+            # Дата хранится как 'YYYY-MM-DD HH:MM' или 'YYYY-MM-DD HH:MM:SS'
+            parts = appointment_datetime.split()
+            return parts[1][:5] if len(parts) > 1 else ""
+        return appointment_datetime.strftime("%H:%M")
+    
+    def get_day_schedule(self, day):
+        """
+        Получение расписания врача на день с использованием LRU-кэша
+        
+        День берется из кэша, только если записи на прием и пациенты не
+        изменялись после его загрузки (в том числе с другого рабочего места).
+        """
+        all_versions = reference_cache.versions()
+        versions = tuple(all_versions.get(kind) for kind in self.SCHEDULE_DATA_KINDS)
+        cached = self._schedule_cache.get(day)
+        # Без таблицы версий актуальность не проверить - день перечитывается
+        if cached is not None and None not in versions and cached[0] == versions:
+            self._schedule_cache.move_to_end(day)
+            return cached[1]
+            
+        appointments = db.get_doctor_schedule(self.doctor_info['id'], day)
+        self._schedule_cache[day] = (versions, appointments)
+        self._schedule_cache.move_to_end(day)
+        if len(self._schedule_cache) > self.SCHEDULE_CACHE_SIZE:
+            self._schedule_cache.popitem(last=False)
+        return appointments
+        
+    def invalidate_schedule_cache(self, day=None):
+        """Сброс кэша расписания за указанный день (или полностью)"""
+        if day is None:
+            self._schedule_cache.clear()
+        else:
+            self._schedule_cache.pop(day, None)
+            
     def load_analysis_results(self):
-        """Загрузка результатов анализов"""
+        """Загрузка первой страницы результатов анализов с учетом фильтров"""
         # Получение параметров фильтрации
-        patient_id = self.patient_filter.currentData()
-        start_date = self.start_date_filter.date().toString("yyyy-MM-dd")
-        end_date = self.end_date_filter.date().toString("yyyy-MM-dd")
+        self._analysis_filters = {
+            'patient_id': self.patient_filter.currentData(),
+            'status': self.status_filter.currentData(),
+            'start_date': self.start_date_filter.date().toString("yyyy-MM-dd"),
+            'end_date': self.end_date_filter.date().toString("yyyy-MM-dd")
+        }
+        self._analysis_after = None
+        
+        logger.debug("Загрузка анализов с фильтрами: %s", self._analysis_filters)
         
-        print(f"Загрузка анализов за период: {start_date} - {end_date}, пациент ID: {patient_id}")
+        self.analysis_table.setRowCount(0)
+        self.load_more_analysis_results()
         
+    def load_more_analysis_results(self):
+        """Загрузка следующей страницы результатов анализов"""
         try:
-            # Базовый запрос без фильтра по дате (будем фильтровать на стороне приложения)
-            query = """
-                SELECT ar.*, at.name as analysis_name, p.full_name as patient_name, u.full_name as lab_technician_name 
-                FROM analysis_results ar
-                JOIN analysis_types at ON ar.analysis_type_id = at.id
-                JOIN patients p ON ar.patient_id = p.id
-                JOIN users u ON ar.lab_user_id = u.id
-            """
-            params = []
+            # Фильтрация и пагинация выполняются на стороне базы данных
+            results = db.get_analysis_results_page(
+                after=self._analysis_after,
+                limit=self.ANALYSIS_PAGE_SIZE,
+                **self._analysis_filters
+            )
+            logger.debug("Загружено записей: %d", len(results))
             
-            # Добавление фильтра по пациенту, если выбран
-            if patient_id:
-                query += " WHERE ar.patient_id = ?"
-                params.append(patient_id)
+            if results:
+                last = results[-1]
+                self._analysis_after = (last['result_date'], last['id'])
             
-            query += " ORDER BY ar.result_date DESC"
+            self.append_analysis_rows(results)
             
-            # Получение результатов анализов
-            all_analysis_results = db.fetch_all(query, params)
-            print(f"Найдено записей: {len(all_analysis_results)}")
+            # Кнопка активна, пока страница заполнена полностью
+            self.load_more_button.setEnabled(len(results) == self.ANALYSIS_PAGE_SIZE)
+        except Exception as e:
+            logger.error("Ошибка при загрузке анализов: %s", e)
+            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить результаты анализов: {str(e)}")
             
-            # Фильтрация по дате на стороне приложения
-            filtered_results = []
-            for result in all_analysis_results:
-                try:
-                    result_date_str = result['result_date']
-                    if isinstance(result_date_str, str):
-                        result_date = result_date_str.split()[0]  # Получаем только дату без времени
-                    else:
-                        result_date = result_date_str.strftime('%Y-%m-%d')
-                    
-                    if start_date <= result_date <= end_date:
-                        filtered_results.append(result)
-                except Exception as e:
-                    print(f"Ошибка обработки даты для анализа: {e}")
-                    # Включаем результат, если не можем определить дату
-                    filtered_results.append(result)
+        self.analysis_table.resizeColumnsToContents()
+    
+    def append_analysis_rows(self, results):
+        """Добавление строк результатов анализов в конец таблицы"""
+        # Сортировка отключается на время заполнения, чтобы строки не перемешивались
+        self.analysis_table.setSortingEnabled(False)
+        
+        start_row = self.analysis_table.rowCount()
+        self.analysis_table.setRowCount(start_row + len(results))
+        
+        # Проверка по нормам всей страницы одним запросом
+        flags = analysis_flags.flag_results(results)
+        
+        for row, result in enumerate(results, start_row):
+            # Пациент
+            patient_item = QTableWidgetItem(result['patient_name'])
+            self.analysis_table.setItem(row, 0, patient_item)
             
-            print(f"После фильтрации осталось записей: {len(filtered_results)}")
+            # Тип анализа
+            analysis_item = QTableWidgetItem(result['analysis_name'])
+            self.analysis_table.setItem(row, 1, analysis_item)
             
-            # Заполнение таблицы
-            self.analysis_table.setRowCount(len(filtered_results))
+            # Дата
+            try:
+                date_str = result['result_date']
+                if isinstance(date_str, str):
+                    # Если дата уже в строковом формате, пытаемся отформатировать её
+                    try:
+                        date_time = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
+                        date_item = QTableWidgetItem(date_time.strftime('%d.%m.%Y %H:%M'))
+                    except:
+                        date_item = QTableWidgetItem(date_str)
+                else:
+                    # Если дата - объект datetime
+                    date_item = QTableWidgetItem(date_str.strftime('%d.%m.%Y %H:%M'))
+            except Exception as e:
+                logger.debug("Ошибка форматирования даты: %s", e)
+                date_item = QTableWidgetItem(str(result.get('result_date', '')))
             
-            for row, result in enumerate(filtered_results):
-                # Пациент
-                patient_item = QTableWidgetItem(result['patient_name'])
-                self.analysis_table.setItem(row, 0, patient_item)
-                
-                # Тип анализа
-                analysis_item = QTableWidgetItem(result['analysis_name'])
-                self.analysis_table.setItem(row, 1, analysis_item)
-                
-                # Дата
-                try:
-                    date_str = result['result_date']
-                    if isinstance(date_str, str):
-                        # Если дата уже в строковом формате, пытаемся отформатировать её
-                        try:
-                            date_time = datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S")
-                            date_item = QTableWidgetItem(date_time.strftime('%d.%m.%Y %H:%M'))
-                        except:
-                            date_item = QTableWidgetItem(date_str)
-                    else:
-                        # Если дата - объект datetime
-                        date_item = QTableWidgetItem(date_str.strftime('%d.%m.%Y %H:%M'))
-                except Exception as e:
-                    print(f"Ошибка форматирования даты: {e}")
-                    date_item = QTableWidgetItem(str(result.get('result_date', '')))
-                
-                self.analysis_table.setItem(row, 2, date_item)
-                
-                # Статус
-                status_text = {
-                    'pending': 'В обработке',
-                    'completed': 'Выполнен',
-                    'sent': 'Отправлен'
-                }.get(result['status'], result['status'])
-                
-                status_item = QTableWidgetItem(status_text)
-                self.analysis_table.setItem(row, 3, status_item)
-                
-                # Лаборант
-                lab_technician_item = QTableWidgetItem(result['lab_technician_name'])
-                self.analysis_table.setItem(row, 4, lab_technician_item)
-                
-                # Кнопка действий
-                view_button = QPushButton("Просмотр")
-                view_button.clicked.connect(lambda checked, r=result: self.view_analysis_details(r))
-                self.analysis_table.setCellWidget(row, 5, view_button)
-        except Exception as e:
-            print(f"Ошибка при загрузке анализов: {e}")
-            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить результаты анализов: {str(e)}")
+            self.analysis_table.setItem(row, 2, date_item)
             
-        self.analysis_table.resizeColumnsToContents()
+            # Статус
+            status_text = {
+                'pending': 'В обработке',
+                'completed': 'Выполнен',
+                'sent': 'Отправлен'
+            }.get(result['status'], result['status'])
+            
+            status_item = QTableWidgetItem(status_text)
+            self.analysis_table.setItem(row, 3, status_item)
+            
+            # Лаборант
+            lab_technician_item = QTableWidgetItem(result['lab_technician_name'])
+            self.analysis_table.setItem(row, 4, lab_technician_item)
+            
+            # Выделение результатов со значениями вне нормы
+            result_flags = flags[result['id']]
+            if result_flags.abnormal:
+                for column in range(5):
+                    item = self.analysis_table.item(row, column)
+                    item.setBackground(ABNORMAL_RESULT_COLOR)
+                    item.setToolTip(result_flags.describe())
+            
+            # Кнопка действий
+            view_button = QPushButton("Просмотр")
+            view_button.clicked.connect(lambda checked, r=result: self.view_analysis_details(r))
+            self.analysis_table.setCellWidget(row, 5, view_button)
+        
+        self.analysis_table.setSortingEnabled(True)
     
     def view_appointment_details(self, appointment):
         """Просмотр деталей приема"""
         dialog = AppointmentDetailsDialog(appointment, self)
-        result = dialog.exec()
+        dialog.exec()
         
-        # Обновление таблицы после изменения статуса
-        if result == QDialog.Accepted:
+        # Обновление таблицы только после реального изменения статуса
+        if dialog.status_changed:
+            self.invalidate_schedule_cache(str(appointment['appointment_date'])[:10])
             self.load_schedule()
     
     def view_analysis_details(self, analysis):
@@ -0,0 +1,554 @@
+"""
+Очередь исходящих писем.
+
+Окна не отправляют письма сами: EmailSender формирует сообщение
+и ставит его в таблицу email_outbox, а доставку выполняет фоновый
+поток EmailOutbox. Письма отправляются через пул из pool_size
+SMTP-соединений (STARTTLS и вход выполняются один раз на соединение):
+выбранная из очереди порция делится между соединениями и отправляется
+параллельно, а результаты отправки записываются одной транзакцией.
+Соединение закрывается после IDLE_TIMEOUT секунд простоя.
+
+При временной ошибке (обрыв соединения, ответ сервера 4xx) письмо
+остается в очереди и отправляется повторно через увеличивающиеся
+интервалы: RETRY_BASE_DELAY * 2^(n-1) секунд, но не более
+RETRY_MAX_DELAY. После MAX_ATTEMPTS попыток или при постоянной ошибке
+(ответ 5xx, адрес отклонен) письмо получает статус 'failed'. После
+доставки письма с результатами анализа статус результата меняется
+на 'sent'.
+
+Очередь хранится в базе данных, поэтому письма, не отправленные
+до закрытия приложения, отправляются после следующего запуска потока.
+
+Каждое письмо хранит ключ профиля SMTP (smtp_profile: сервер, порт
+и логин отправителя, без пароля). Параметры профилей, включая пароль,
+известны только в памяти: их передает configure(). Письмо отправляется
+только через соединение своего профиля, а письма профиля, который
+в этом запуске еще не настроен, остаются в очереди до его настройки.
+Параметры из переменных окружения используются, только если в них
+задан логин (MAIL_USERNAME).
+"""
+import atexit
+import logging
+import os
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from database_connection import db
+
+logger = logging.getLogger(__name__)
+
+# Состояния письма в очереди
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+# Повторная отправка: количество попыток и интервалы (в секундах)
+MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = 30
+RETRY_MAX_DELAY = 3600
+
+# Повтор записи результатов отправки при ошибке базы данных (в секундах)
+RECORD_RETRY_BASE_DELAY = 1
+RECORD_RETRY_MAX_DELAY = 60
+
+# Время простоя, после которого SMTP-соединение закрывается (в секундах)
+IDLE_TIMEOUT = 60
+
+# Таймаут сетевых операций SMTP (в секундах)
+SMTP_TIMEOUT = 30
+
+# Количество писем на одно соединение, выбираемых из очереди за один запрос
+BATCH_SIZE = 50
+
+# Количество одновременных SMTP-соединений
+POOL_SIZE = 4
+
+# Параметры SMTP-сервера; use_tls - STARTTLS после подключения
+SmtpSettings = namedtuple('SmtpSettings', 'server port username password use_tls', defaults=(True,))
+
+# Ответы сервера об ошибке входа или отсутствии авторизации: письмо
+# не виновато, оно отправится после настройки верных параметров
+AUTH_ERROR_CODES = (530, 534, 535)
+
+
+def settings_from_env():
+    """Параметры SMTP из переменных окружения MAIL_SERVER, MAIL_PORT, MAIL_USERNAME, MAIL_PASSWORD"""
+    return SmtpSettings(
+        server=os.environ.get('MAIL_SERVER', 'smtp.gmail.com'),
+        port=int(os.environ.get('MAIL_PORT', 587)),
+        username=os.environ.get('MAIL_USERNAME', ''),
+        password=os.environ.get('MAIL_PASSWORD', ''),
+    )
+
+
+def profile_key(settings):
+    """Ключ профиля SMTP для столбца email_outbox.smtp_profile (без пароля)"""
+    return f"{settings.username}@{settings.server}:{settings.port}"
+
+
+def build_message(sender, recipient, subject, html, attachments=None):
+    """
+    Формирование HTML-письма с вложениями
+    
+    :param sender: Адрес отправителя
+    :param recipient: Адрес получателя
+    :param subject: Тема письма
+    :param html: HTML-содержимое
+    :param attachments: Пути к файлам вложений (несуществующие пропускаются)
+    :return: MIMEMultipart
+    """
+    # Случайная граница задается сразу: иначе генератор при каждой
+    # сериализации подбирает ее, проверяя текст письма регулярным выражением
+    message = MIMEMultipart(boundary=f"==={uuid.uuid4().hex}===")
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = subject
+    message.attach(MIMEText(html, 'html'))
+    
+    for file_path in attachments or ():
+        if os.path.isfile(file_path):
+            with open(file_path, 'rb') as file:
+                part = MIMEApplication(file.read(), Name=os.path.basename(file_path))
+            part['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
+            message.attach(part)
+    return message
+
+
+def insert_message(cursor, recipient, subject, message, analysis_result_id=None, smtp_profile=None):
+    """
+    Добавление письма в очередь через курсор транзакции
+    
+    Используется, когда письмо ставится в очередь вместе с другими
+    изменениями (см. appointment_reminders); после фиксации транзакции
+    нужно вызвать email_outbox.notify().
+    
+    :param smtp_profile: Ключ профиля SMTP (profile_key), через который
+                         отправляется письмо
+    :return: ID письма в очереди
+    """
+    cursor.execute(
+        "INSERT INTO email_outbox (recipient, subject, message, analysis_result_id, smtp_profile) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (recipient, subject, message, analysis_result_id, smtp_profile)
+    )
+    return cursor.lastrowid
+
+
+def retry_delay(attempts):
+    """Интервал до следующей попытки после attempts неудачных попыток (в секундах)"""
+    return min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY)
+
+
+def is_permanent_error(error):
+    """Постоянная ошибка доставки: повторная отправка не поможет"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        # Адрес отклонен; 4xx - временный отказ (например, greylisting)
+        return all(500 <= code < 600 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600 and error.smtp_code not in AUTH_ERROR_CODES
+    return False
+
+
+class SmtpSession:
+    """SMTP-соединение, используемое для отправки нескольких писем подряд"""
+    
+    def __init__(self, settings):
+        self.settings = settings
+        self._server = None
+        self._last_used = 0.0
+        # Количество установленных соединений (для журнала и замеров)
+        self.connections = 0
+    
+    @property
+    def connected(self):
+        return self._server is not None
+    
+    @property
+    def idle_time(self):
+        return time.monotonic() - self._last_used
+    
+    def _connect(self):
+        settings = self.settings
+        server = smtplib.SMTP(settings.server, settings.port, timeout=SMTP_TIMEOUT)
+        try:
+            if settings.use_tls:
+                server.starttls(context=ssl.create_default_context())
+            if settings.username and settings.password:
+                server.login(settings.username, settings.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self.connections += 1
+        logger.debug("SMTP-соединение установлено: %s:%s", settings.server, settings.port)
+    
+    def send(self, sender, recipient, message):
+        """
+        Отправка письма; соединение устанавливается при необходимости
+        
+        Если сервер закрыл неиспользуемое соединение, оно устанавливается
+        заново и письмо отправляется повторно.
+        """
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.sendmail(sender, recipient, message.encode('utf-8'))
+        except smtplib.SMTPServerDisconnected:
+            self._server = None
+            self._connect()
+            self._server.sendmail(sender, recipient, message.encode('utf-8'))
+        self._last_used = time.monotonic()
+    
+    def close(self):
+        """Завершение сеанса (QUIT) и закрытие соединения"""
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            self._server.close()
+        self._server = None
+
+
+class EmailOutbox:
+    """Очередь исходящих писем в базе данных и поток их доставки"""
+    
+    def __init__(self, database=None, settings=None, pool_size=POOL_SIZE):
+        """
+        :param settings: Параметры SMTP по умолчанию; None - из переменных
+                         окружения (профиль настраивается, только если задан логин)
+        """
+        self._db = database or db
+        # Ключ профиля -> SmtpSettings для профилей, настроенных в этом запуске
+        self._profiles = {}
+        self._profiles_lock = threading.Lock()
+        self.settings = settings or settings_from_env()
+        if settings is not None or self.settings.username:
+            self._profiles[profile_key(self.settings)] = self.settings
+        self.pool_size = max(int(pool_size), 1)
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._exit_registered = False
+    
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+    
+    def configure(self, settings):
+        """
+        Настройка профиля SMTP и выбор его профилем по умолчанию
+        
+        Письма этого профиля, оставшиеся в очереди, начинают отправляться;
+        при смене пароля соединения профиля устанавливаются заново.
+        """
+        key = profile_key(settings)
+        with self._profiles_lock:
+            changed = self._profiles.get(key) != settings
+            self._profiles[key] = settings
+        self.settings = settings
+        if changed:
+            if self.running:
+                self._wakeup.set()
+            else:
+                self.resume()
+    
+    def default_profile(self):
+        """Ключ профиля по умолчанию (последнего настроенного)"""
+        return profile_key(self.settings)
+    
+    def _configured_profiles(self):
+        with self._profiles_lock:
+            return dict(self._profiles)
+    
+    def enqueue(self, recipient, subject, message, analysis_result_id=None):
+        """
+        Постановка письма в очередь
+        
+        :param recipient: Адрес получателя
+        :param subject: Тема письма (для журнала и просмотра очереди)
+        :param message: Письмо целиком (MIMEMultipart.as_string())
+        :param analysis_result_id: ID результата анализа, статус которого
+                                   меняется на 'sent' после доставки
+        :return: ID письма в очереди или None при ошибке
+        """
+        outbox_id = self._db.execute_query(
+            "INSERT INTO email_outbox (recipient, subject, message, analysis_result_id, smtp_profile) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (recipient, subject, message, analysis_result_id, self.default_profile())
+        )
+        if outbox_id is None:
+            return None
+        self.notify()
+        return outbox_id
+    
+    def notify(self):
+        """Запуск потока доставки после добавления писем в очередь"""
+        self.start()
+        self._wakeup.set()
+    
+    def start(self):
+        """Запуск потока доставки"""
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="EmailOutbox", daemon=True)
+        self._thread.start()
+        if not self._exit_registered:
+            atexit.register(self.stop)
+            self._exit_registered = True
+    
+    def resume(self):
+        """
+        Запуск потока доставки, если в очереди остались неотправленные
+        письма настроенных профилей
+        """
+        condition, params = self._profile_condition()
+        if condition is None:
+            return
+        row = self._db.fetch_one(
+            f"SELECT 1 FROM email_outbox WHERE status = ? AND {condition} LIMIT 1",
+            (STATUS_PENDING,) + params, row_format='tuple'
+        )
+        if row:
+            self.start()
+    
+    def stop(self, timeout=5):
+        """Остановка потока доставки (неотправленные письма остаются в очереди)"""
+        if not self.running:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+    
+    def wait_until_empty(self, timeout=None):
+        """
+        Ожидание отправки всех писем, срок которых наступил
+        
+        :return: True, если таких писем в очереди не осталось
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._due_messages(1):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+    
+    def status_counts(self):
+        """Количество писем в очереди по состояниям"""
+        return dict(self._db.fetch_all(
+            "SELECT status, COUNT(*) FROM email_outbox GROUP BY status", row_format='tuple'
+        ))
+    
+    def _profile_condition(self):
+        """
+        Условие выбора писем настроенных профилей: (SQL, параметры)
+        
+        Письма без профиля (поставленные до появления столбца smtp_profile)
+        отправляются через профиль по умолчанию, если он настроен.
+        Если не настроен ни один профиль, возвращается (None, ()).
+        """
+        profiles = self._configured_profiles()
+        if not profiles:
+            return None, ()
+        keys = tuple(profiles)
+        condition = f"smtp_profile IN ({', '.join('?' * len(keys))})"
+        if self.default_profile() in profiles:
+            condition = f"({condition} OR smtp_profile IS NULL)"
+        return condition, keys
+    
+    def _due_messages(self, limit=BATCH_SIZE):
+        condition, params = self._profile_condition()
+        if condition is None:
+            return []
+        return self._db.fetch_all(f"""
+            SELECT id, recipient, message, analysis_result_id, attempts, smtp_profile
+            FROM email_outbox
+            WHERE status = ? AND next_attempt_at <= datetime('now') AND {condition}
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        """, (STATUS_PENDING,) + params + (limit,), row_format='tuple')
+    
+    def _seconds_until_next(self):
+        """Время до ближайшей повторной попытки или None, если очередь пуста"""
+        condition, params = self._profile_condition()
+        if condition is None:
+            return None
+        # Интервал считается в SQLite: те же часы, что и datetime('now') в _due_messages
+        row = self._db.fetch_one(
+            f"SELECT (julianday(MIN(next_attempt_at)) - julianday('now')) * 86400 "
+            f"FROM email_outbox WHERE status = ? AND {condition}",
+            (STATUS_PENDING,) + params, row_format='tuple'
+        )
+        if not row or row[0] is None:
+            return None
+        return max(row[0], 0.0)
+    
+    def _run(self):
+        # Ключ профиля -> соединения профиля
+        pools = {}
+        # Результаты отправки, которые не удалось записать в базу данных
+        unrecorded = None
+        record_failures = 0
+        executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix="EmailOutboxSmtp") if self.pool_size > 1 else None
+        try:
+            while not self._stopping.is_set():
+                self._wakeup.clear()
+                if unrecorded:
+                    # Пока доставка не записана, письма остаются 'pending':
+                    # следующая порция не выбирается, иначе они уйдут повторно
+                    if not self._record_results(unrecorded):
+                        record_failures += 1
+                        self._stopping.wait(min(RECORD_RETRY_BASE_DELAY * 2 ** (record_failures - 1),
+                                                RECORD_RETRY_MAX_DELAY))
+                        continue
+                    unrecorded = None
+                    record_failures = 0
+                
+                profiles = self._configured_profiles()
+                for key in list(pools):
+                    # Профиль перенастроен: соединения устанавливаются заново
+                    if profiles.get(key) != pools[key][0].settings:
+                        self._close_sessions(pools.pop(key))
+                
+                messages = self._due_messages(BATCH_SIZE * self.pool_size)
+                if messages:
+                    # Каждое письмо отправляется через соединения своего профиля
+                    groups = {}
+                    for message in messages:
+                        groups.setdefault(message[5] or self.default_profile(), []).append(message)
+                    results = []
+                    for key, group in groups.items():
+                        if key not in profiles:
+                            continue
+                        if key not in pools:
+                            pools[key] = [SmtpSession(profiles[key]) for _ in range(self.pool_size)]
+                        results.extend(self._send_batch(executor, pools[key], group))
+                    if not self._record_results(results):
+                        unrecorded = results
+                    continue
+                
+                # Очередь пуста: соединения закрываются после простоя,
+                # поток ждет новых писем или срока повторной попытки
+                timeout = self._seconds_until_next()
+                for session in [session for sessions in pools.values() for session in sessions]:
+                    if not session.connected:
+                        continue
+                    if session.idle_time >= IDLE_TIMEOUT:
+                        session.close()
+                        continue
+                    remaining = IDLE_TIMEOUT - session.idle_time
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                self._wakeup.wait(timeout)
+        except Exception:
+            logger.exception("Ошибка потока отправки писем")
+        finally:
+            if unrecorded and not self._record_results(unrecorded):
+                logger.error("Не записаны результаты отправки писем %s: после перезапуска они будут отправлены повторно",
+                             ", ".join(str(message[0]) for message, _ in unrecorded))
+            if executor is not None:
+                executor.shutdown(wait=True)
+            for sessions in pools.values():
+                self._close_sessions(sessions)
+            self._db.close_thread_connection()
+    
+    @staticmethod
+    def _close_sessions(sessions):
+        for session in sessions:
+            session.close()
+    
+    def _send_batch(self, executor, sessions, messages):
+        """
+        Отправка порции писем: каждое соединение получает свою часть
+        
+        :return: Список (письмо, ошибка или None) в порядке отправки
+        """
+        chunks = [messages[index::len(sessions)] for index in range(min(len(sessions), len(messages)))]
+        if executor is None or len(chunks) == 1:
+            return self._send_chunk(sessions[0], messages)
+        
+        futures = [executor.submit(self._send_chunk, session, chunk) for session, chunk in zip(sessions, chunks)]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+    
+    def _send_chunk(self, session, messages):
+        """Отправка писем через одно соединение (выполняется в потоке пула)"""
+        results = []
+        for message in messages:
+            if self._stopping.is_set():
+                break
+            recipient, text = message[1], message[2]
+            try:
+                # Адрес конверта - логин профиля, от имени которого сформировано письмо
+                session.send(session.settings.username, recipient, text)
+            except (smtplib.SMTPException, OSError) as e:
+                if not isinstance(e, smtplib.SMTPRecipientsRefused):
+                    # Соединение могло остаться в неизвестном состоянии
+                    session.close()
+                results.append((message, e))
+            else:
+                results.append((message, None))
+        return results
+    
+    def _record_results(self, results):
+        """
+        Запись результатов отправки порции писем одной транзакцией
+        
+        :return: True, если результаты записаны
+        """
+        sent, retries, failures, analysis_results = [], [], [], []
+        for (outbox_id, recipient, _, analysis_result_id, attempts, _), error in results:
+            attempts += 1
+            if error is None:
+                sent.append((STATUS_SENT, attempts, outbox_id))
+                if analysis_result_id is not None:
+                    analysis_results.append((analysis_result_id,))
+            elif is_permanent_error(error) or attempts >= MAX_ATTEMPTS:
+                logger.error("Письмо %s для %s не доставлено: %s", outbox_id, recipient, error)
+                failures.append((STATUS_FAILED, attempts, str(error), outbox_id))
+            else:
+                delay = retry_delay(attempts)
+                logger.warning("Письмо %s для %s: ошибка отправки (%s), повтор через %d с",
+                               outbox_id, recipient, error, delay)
+                retries.append((attempts, str(error), f'+{delay} seconds', outbox_id))
+        
+        def record_results(cursor):
+            cursor.executemany(
+                "UPDATE email_outbox SET status = ?, attempts = ?, last_error = NULL, "
+                "sent_at = CURRENT_TIMESTAMP WHERE id = ?",
+                sent
+            )
+            cursor.executemany(
+                "UPDATE email_outbox SET status = ?, attempts = ?, last_error = ? WHERE id = ?",
+                failures
+            )
+            cursor.executemany(
+                "UPDATE email_outbox SET attempts = ?, last_error = ?, "
+                "next_attempt_at = datetime('now', ?) WHERE id = ?",
+                retries
+            )
+            cursor.executemany("UPDATE analysis_results SET status = 'sent' WHERE id = ?", analysis_results)
+            return len(results)
+        
+        if self._db.run_in_transaction(record_results) is None:
+            logger.error("Не удалось записать результаты отправки %d писем, запись будет повторена", len(results))
+            return False
+        if sent:
+            logger.info("Доставлено писем: %d", len(sent))
+        return True
+
+
+# Общая очередь писем приложения
+email_outbox = EmailOutbox()
@@ -1,12 +1,11 @@
-import smtplib
-import ssl
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
 import os
 import json
 from datetime import datetime, timedelta
 
+from email_outbox import email_outbox, build_message, SmtpSettings
+from email_templates import render_analysis_results, render_appointment_reminder, render_report
+from reference_ranges import reference_ranges
+
 class EmailSender:
     """Класс для отправки электронных писем с результатами анализов"""
     
@@ -24,7 +23,8 @@ class EmailSender:
         if not password:
             self.password = os.environ.get('MAIL_PASSWORD', '')
     
-    def send_analysis_results(self, recipient_email, subject, patient_name, analysis_name, result_data, attachments=None):
+    def send_analysis_results(self, recipient_email, subject, patient_name, analysis_name, result_data, attachments=None,
+                              analysis_result_id=None):
         """
         Отправка результатов анализов по электронной почте
         
@@ -34,15 +34,11 @@ class EmailSender:
         :param analysis_name: Название анализа
         :param result_data: Данные результатов анализа (строка или словарь)
         :param attachments: Список путей к файлам для прикрепления
-        :return: True в случае успеха, False в случае ошибки
+        :param analysis_result_id: ID результата анализа; после доставки письма
+                                   статус результата меняется на 'sent'
+        :return: True, если письмо поставлено в очередь отправки, False в случае ошибки
         """
         try:
-            # Создание объекта сообщения
-            message = MIMEMultipart()
-            message['From'] = self.username
-            message['To'] = recipient_email
-            message['Subject'] = subject
-            
             # Преобразование данных результатов анализа в читаемый формат
             if isinstance(result_data, str):
                 try:
@@ -51,76 +47,11 @@ class EmailSender:
                     # Если не удалось распарсить JSON, оставляем как строку
                     pass
             
-            # Создание HTML-содержимого письма
-            html_content = f"""
-            <html>
-                <head>
-                    <style>
-                        body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
-                        .container {{ width: 80%; margin: 0 auto; padding: 20px; }}
-                        h1 {{ color: #2c3e50; }}
-                        h2 {{ color: #3498db; }}
-                        table {{ border-collapse: collapse; width: 100%; margin-top: 20px; }}
-                        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                        th {{ background-color: #f2f2f2; }}
-                        tr:nth-child(even) {{ background-color: #f9f9f9; }}
-                    </style>
-                </head>
-                <body>
-                    <div class="container">
-                        <h1>Результаты анализов</h1>
-                        <p>Уважаемый(ая) <strong>{patient_name}</strong>,</p>
-                        <p>Направляем Вам результаты анализа <strong>{analysis_name}</strong>.</p>
-                        
-                        <h2>Результаты:</h2>
-                        <table>
-                            <tr>
-                                <th>Параметр</th>
-                                <th>Значение</th>
-                                <th>Нормальные значения</th>
-                            </tr>
-            """
-            
-            # Добавление результатов анализа в таблицу
-            if isinstance(result_data, dict):
-                for param, value in result_data.items():
-                    # Здесь можно добавить нормальные значения для каждого параметра
-                    normal_values = self._get_normal_values(param)
-                    html_content += f"""
-                    <tr>
-                        <td>{param}</td>
-                        <td>{value}</td>
-                        <td>{normal_values}</td>
-                    </tr>
-                    """
-            else:
-                # Если результаты не в формате словаря, просто выводим их как текст
-                html_content += f"""
-                <tr>
-                    <td colspan="3">{result_data}</td>
-                </tr>
-                """
+            # HTML-содержимое письма по общему шаблону
+            html_content = render_analysis_results(patient_name, analysis_name, result_data, self._get_normal_values)
             
-            html_content += """
-                        </table>
-                        
-                        <p>С уважением,<br>Медицинский центр</p>
-                    </div>
-                </body>
-            </html>
-            """
-            
-            # Прикрепление HTML-содержимого к письму
-            message.attach(MIMEText(html_content, 'html'))
-            
-            # Прикрепление файлов, если они указаны
-            if attachments:
-                for file_path in attachments:
-                    if os.path.isfile(file_path):
-                        with open(file_path, 'rb') as file:
-                            part = MIMEApplication(file.read(), Name=os.path.basename(file_path))
-                            part['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
-                            message.attach(part)
+            # Письмо с HTML-содержимым и вложениями (несуществующие файлы пропускаются)
+            message = build_message(self.username, recipient_email, subject, html_content, attachments)
             
             # В тестовом режиме не отправляем письмо, а только выводим информацию
             if self.test_mode:
@@ -134,14 +65,8 @@ class EmailSender:
                 print("Email успешно отправлен (тестовый режим)")
                 return True
             
-            # Установка соединения с SMTP-сервером и отправка письма (только если не тестовый режим)
-            context = ssl.create_default_context()
-            with smtplib.SMTP(self.smtp_server, self.port) as server:
-                server.starttls(context=context)
-                server.login(self.username, self.password)
-                server.sendmail(self.username, recipient_email, message.as_string())
-            
-            return True
+            # Письмо отправляется фоновым потоком очереди
+            return self._enqueue(recipient_email, message, analysis_result_id)
         
         except Exception as e:
             print(f"Ошибка при отправке email: {str(e)}")
@@ -158,67 +83,17 @@ class EmailSender:
         :param appointment_time: Время приема (строка в формате HH:MM)
         :param doctor_specialization: Специализация врача (опционально)
         :param notes: Дополнительные примечания (опционально)
-        :return: True в случае успеха, False в случае ошибки
+        :return: True, если письмо поставлено в очередь отправки, False в случае ошибки
         """
         try:
-            # Создание объекта сообщения
-            message = MIMEMultipart()
-            message['From'] = self.username
-            message['To'] = recipient_email
-            message['Subject'] = f"Напоминание о приеме {appointment_date}"
+            # HTML-содержимое письма по общему шаблону
+            html_content = render_appointment_reminder(
+                patient_name, doctor_name, appointment_date, appointment_time, doctor_specialization, notes
+            )
             
-            # Форматирование специализации врача, если она указана
-            doctor_spec_text = f", {doctor_specialization}" if doctor_specialization else ""
-            
-            # Создание HTML-содержимого письма
-            html_content = f"""
-            <html>
-                <head>
-                    <style>
-                        body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
-                        .container {{ width: 80%; margin: 0 auto; padding: 20px; }}
-                        h1 {{ color: #2c3e50; }}
-                        .appointment-info {{ background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-                        .appointment-info h2 {{ color: #3498db; margin-top: 0; }}
-                        .important {{ color: #e74c3c; font-weight: bold; }}
-                        .notes {{ background-color: #fffde7; padding: 10px; border-left: 4px solid #ffd600; margin-top: 20px; }}
-                    </style>
-                </head>
-                <body>
-                    <div class="container">
-                        <h1>Напоминание о приеме</h1>
-                        <p>Уважаемый(ая) <strong>{patient_name}</strong>,</p>
-                        <p>Напоминаем Вам о предстоящем приеме в нашем медицинском центре.</p>
-                        
-                        <div class="appointment-info">
-                            <h2>Информация о приеме:</h2>
-                            <p><strong>Дата:</strong> {appointment_date}</p>
-                            <p><strong>Время:</strong> {appointment_time}</p>
-                            <p><strong>Врач:</strong> {doctor_name}{doctor_spec_text}</p>
-                        </div>
-                        
-                        <p class="important">Пожалуйста, не забудьте взять с собой паспорт и полис ОМС.</p>
-            """
-            
-            # Добавление примечаний, если они указаны
-            if notes:
-                html_content += f"""
-                        <div class="notes">
-                            <p><strong>Дополнительная информация:</strong></p>
-                            <p>{notes}</p>
-                        </div>
-                """
-            
-            html_content += """
-                        <p>В случае невозможности посещения в указанное время, пожалуйста, свяжитесь с нами заранее.</p>
-                        <p>С уважением,<br>Медицинский центр</p>
-                    </div>
-                </body>
-            </html>
-            """
-            
-            # Прикрепление HTML-содержимого к письму
-            message.attach(MIMEText(html_content, 'html'))
+            message = build_message(
+                self.username, recipient_email, f"Напоминание о приеме {appointment_date}", html_content
+            )
             
             # В тестовом режиме не отправляем письмо, а только выводим информацию
             if self.test_mode:
@@ -230,14 +105,8 @@ class EmailSender:
                 print("Email успешно отправлен (тестовый режим)")
                 return True
             
-            # Установка соединения с SMTP-сервером и отправка письма
-            context = ssl.create_default_context()
-            with smtplib.SMTP(self.smtp_server, self.port) as server:
-                server.starttls(context=context)
-                server.login(self.username, self.password)
-                server.sendmail(self.username, recipient_email, message.as_string())
-            
-            return True
+            # Письмо отправляется фоновым потоком очереди
+            return self._enqueue(recipient_email, message)
         
         except Exception as e:
             print(f"Ошибка при отправке напоминания: {str(e)}")
@@ -253,7 +122,7 @@ class EmailSender:
         :param report_period: Период отчета (например, "Март 2025", "1 кв. 2025")
         :param report_file_path: Путь к файлу отчета для прикрепления
         :param additional_text: Дополнительный текст для включения в письмо
-        :return: True в случае успеха, False в случае ошибки
+        :return: True, если письмо поставлено в очередь отправки, False в случае ошибки
         """
         try:
             # Проверка существования файла отчета
@@ -261,60 +130,16 @@ class EmailSender:
                 print(f"Ошибка: файл отчета {report_file_path} не найден")
                 return False
             
-            # Создание объекта сообщения
-            message = MIMEMultipart()
-            message['From'] = self.username
-            message['To'] = recipient_email
-            message['Subject'] = f"Отчет: {report_type} за {report_period}"
+            # HTML-содержимое письма по общему шаблону
+            html_content = render_report(
+                recipient_name, report_type, report_period, os.path.splitext(report_file_path)[1], additional_text
+            )
             
-            # Создание HTML-содержимого письма
-            html_content = f"""
-            <html>
-                <head>
-                    <style>
-                        body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
-                        .container {{ width: 80%; margin: 0 auto; padding: 20px; }}
-                        h1 {{ color: #2c3e50; }}
-                        .report-info {{ background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-                        .additional-info {{ background-color: #e8f4fe; padding: 10px; border-left: 4px solid #2196f3; margin-top: 20px; }}
-                    </style>
-                </head>
-                <body>
-                    <div class="container">
-                        <h1>Отчет: {report_type}</h1>
-                        <p>Уважаемый(ая) <strong>{recipient_name}</strong>,</p>
-                        <p>Направляем Вам отчет <strong>"{report_type}"</strong> за период <strong>{report_period}</strong>.</p>
-                        
-                        <div class="report-info">
-                            <p>Файл отчета прикреплен к письму.</p>
-                            <p>Тип файла: {os.path.splitext(report_file_path)[1]}</p>
-                        </div>
-            """
-            
-            # Добавление дополнительной информации, если она указана
-            if additional_text:
-                html_content += f"""
-                        <div class="additional-info">
-                            <p><strong>Дополнительная информация:</strong></p>
-                            <p>{additional_text}</p>
-                        </div>
-                """
-            
-            html_content += """
-                        <p>С уважением,<br>Медицинский центр</p>
-                    </div>
-                </body>
-            </html>
-            """
-            
-            # Прикрепление HTML-содержимого к письму
-            message.attach(MIMEText(html_content, 'html'))
-            
-            # Прикрепление файла отчета
-            with open(report_file_path, 'rb') as file:
-                part = MIMEApplication(file.read(), Name=os.path.basename(report_file_path))
-                part['Content-Disposition'] = f'attachment; filename="{os.path.basename(report_file_path)}"'
-                message.attach(part)
+            # Письмо с файлом отчета во вложении
+            message = build_message(
+                self.username, recipient_email, f"Отчет: {report_type} за {report_period}", html_content,
+                [report_file_path]
+            )
             
             # В тестовом режиме не отправляем письмо, а только выводим информацию
             if self.test_mode:
@@ -327,47 +152,36 @@ class EmailSender:
                 print("Email успешно отправлен (тестовый режим)")
                 return True
             
-            # Установка соединения с SMTP-сервером и отправка письма
-            context = ssl.create_default_context()
-            with smtplib.SMTP(self.smtp_server, self.port) as server:
-                server.starttls(context=context)
-                server.login(self.username, self.password)
-                server.sendmail(self.username, recipient_email, message.as_string())
-            
-            return True
+            # Письмо отправляется фоновым потоком очереди
+            return self._enqueue(recipient_email, message)
         
         except Exception as e:
             print(f"Ошибка при отправке отчета: {str(e)}")
             return False
     
+    def smtp_settings(self):
+        """Параметры SMTP-сервера для очереди писем"""
+        return SmtpSettings(self.smtp_server, self.port, self.username, self.password)
+    
+    def _enqueue(self, recipient_email, message, analysis_result_id=None):
+        """
+        Постановка письма в очередь email_outbox
+        
+        Очередь отправляет письма через одно SMTP-соединение с параметрами
+        этого отправителя и повторяет отправку при временных ошибках.
+        """
+        email_outbox.configure(self.smtp_settings())
+        outbox_id = email_outbox.enqueue(recipient_email, message['Subject'], message.as_string(), analysis_result_id)
+        return outbox_id is not None
+    
     def _get_normal_values(self, parameter):
         """
-        Получение нормальных значений для параметра анализа
-        В реальном приложении эти данные могли бы храниться в базе данных
+        Получение нормальных значений для параметра анализа из справочника
         
         :param parameter: Имя параметра анализа
         :return: Строка с нормальными значениями
         """
-        # Словарь с нормальными значениями для некоторых параметров
-        normal_values = {
-            'Гемоглобин': '120-160 г/л',
-            'Эритроциты': '3.8-5.5 млн/мкл',
-            'Лейкоциты': '4.0-9.0 тыс/мкл',
-            'Тромбоциты': '180-320 тыс/мкл',
-            'СОЭ': '2-15 мм/ч',
-            'Глюкоза': '3.9-6.1 ммоль/л',
-            'Холестерин': '3.0-5.2 ммоль/л',
-            'Билирубин': '3.4-17.1 мкмоль/л',
-            'АЛТ': '5-40 ед/л',
-            'АСТ': '5-40 ед/л',
-            'Креатинин': '53-106 мкмоль/л',
-            'Мочевина': '2.5-8.3 ммоль/л',
-            'pH': '5.0-7.0',
-            'Белок': 'Отсутствует',
-            'Кетоновые тела': 'Отсутствуют'
-        }
-        
-        return normal_values.get(parameter, 'Не указано')
+        return reference_ranges.describe(parameter, default='Не указано')
 
 
 # Создание экземпляра для использования в других модулях
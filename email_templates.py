@@ -0,0 +1,292 @@
+"""
+HTML-шаблоны писем.
+
+Текст шаблона разбирается один раз (string.Formatter().parse) и
+превращается в функцию сборки письма; get_template() кэширует
+разобранные шаблоны по имени. Строки таблиц собираются render_many() одним
+"".join(), без повторного объявления стилей и без наращивания строки
+через +=.
+
+Значения подстановок экранируются для HTML. Уже собранные фрагменты
+(строки таблицы, необязательные блоки) передаются как Safe и
+вставляются без изменений.
+
+Шаблоны используются EmailSender из email_sender.py и admin_window.py
+и рассылкой напоминаний appointment_reminders.
+"""
+import html
+from functools import lru_cache
+from string import Formatter
+
+
+class Safe(str):
+    """Готовый HTML-фрагмент, который не экранируется при подстановке"""
+
+
+@lru_cache(maxsize=4096)
+def _escape_text(text):
+    # Названия параметров, нормы и имена повторяются от письма к письму
+    return html.escape(text)
+
+
+def escape(value):
+    """Экранирование значения подстановки (None - пустая строка)"""
+    kind = type(value)
+    if kind is str:
+        return _escape_text(value)
+    if kind is Safe:
+        return value
+    if kind is int or kind is float:
+        # В записи чисел нет символов, которые нужно экранировать
+        return str(value)
+    if value is None:
+        return ""
+    return _escape_text(str(value))
+
+
+class EmailTemplate:
+    """
+    Разобранный шаблон
+    
+    При разборе текст шаблона превращается в функцию, которая собирает
+    письмо одним "".join() из неизменяемых фрагментов и экранированных
+    значений подстановок.
+    """
+    
+    def __init__(self, source):
+        items = []
+        fields = []
+        for literal, field, _, _ in Formatter().parse(source):
+            if literal:
+                items.append(repr(literal))
+            if field is not None:
+                items.append(f"escape(v{len(fields)})")
+                fields.append(field)
+        arguments = ", ".join(f"v{index}" for index in range(len(fields)))
+        code = f"lambda {arguments}: ''.join(({', '.join(items)},))"
+        self._build = eval(code, {'escape': escape})
+        # Имена подстановок в порядке их следования в шаблоне
+        self.fields = tuple(fields)
+    
+    def render(self, values=None, **kwargs):
+        """
+        Подстановка значений в шаблон
+        
+        :param values: Словарь значений (можно дополнить именованными аргументами)
+        :return: Safe с HTML-текстом
+        """
+        if values is None:
+            values = kwargs
+        elif kwargs:
+            values = {**values, **kwargs}
+        return Safe(self._build(*[values[field] for field in self.fields]))
+    
+    def render_many(self, rows):
+        """
+        Подстановка значений для каждой строки и объединение результатов
+        
+        :param rows: Итератор кортежей значений в порядке self.fields
+        :return: Safe с HTML-текстом всех строк
+        """
+        build = self._build
+        return Safe("".join([build(*row) for row in rows]))
+
+
+# Общие стили писем ({{ и }} - фигурные скобки CSS)
+BASE_STYLES = """
+                        body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
+                        .container {{ width: 80%; margin: 0 auto; padding: 20px; }}
+                        h1 {{ color: #2c3e50; }}"""
+
+TABLE_STYLES = """
+                        h2 {{ color: #3498db; }}
+                        table {{ border-collapse: collapse; width: 100%; margin-top: 20px; }}
+                        th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+                        th {{ background-color: #f2f2f2; }}
+                        tr:nth-child(even) {{ background-color: #f9f9f9; }}"""
+
+SIGNATURE = """
+                        <p>С уважением,<br>Медицинский центр</p>"""
+
+# Тексты шаблонов по именам
+TEMPLATE_SOURCES = {
+    # Результаты анализа с таблицей параметров (EmailSender.send_analysis_results)
+    'analysis_results': """
+            <html>
+                <head>
+                    <style>""" + BASE_STYLES + TABLE_STYLES + """
+                    </style>
+                </head>
+                <body>
+                    <div class="container">
+                        <h1>Результаты анализов</h1>
+                        <p>Уважаемый(ая) <strong>{patient_name}</strong>,</p>
+                        <p>Направляем Вам результаты анализа <strong>{analysis_name}</strong>.</p>
+                        
+                        <h2>Результаты:</h2>
+                        <table>
+                            <tr>
+                                <th>Параметр</th>
+                                <th>Значение</th>
+                                <th>Нормальные значения</th>
+                            </tr>{rows}
+                        </table>
+                        """ + SIGNATURE + """
+                    </div>
+                </body>
+            </html>
+""",
+    'analysis_result_row': """
+                            <tr>
+                                <td>{parameter}</td>
+                                <td>{value}</td>
+                                <td>{normal_values}</td>
+                            </tr>""",
+    'analysis_result_text': """
+                            <tr>
+                                <td colspan="3">{text}</td>
+                            </tr>""",
+    
+    # Уведомление о результатах с файлом во вложении (AnalysisResultsWidget)
+    'analysis_notification': """
+            <html>
+            <head>
+                <style>
+                    body {{ font-family: Arial, sans-serif; }}
+                    h2 {{ color: #2c3e50; }}
+                    table {{ border-collapse: collapse; width: 100%; }}
+                    th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
+                    th {{ background-color: #f2f2f2; }}
+                </style>
+            </head>
+            <body>
+                <h2>Результаты анализа: {analysis_name}</h2>
+                <p>Уважаемый(ая) <strong>{patient_name}</strong>!</p>
+                <p>Направляем Вам результаты анализа от {date_taken}.</p>
+                <p>Полные результаты доступны во вложенном файле.</p>
+                <p>С уважением,<br>Медицинский центр</p>
+            </body>
+            </html>
+""",
+
+    # Отчет сотруднику (EmailSender.send_report)
+    'report': """
+            <html>
+                <head>
+                    <style>""" + BASE_STYLES + """
+                        .report-info {{ background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0; }}
+                        .additional-info {{ background-color: #e8f4fe; padding: 10px; border-left: 4px solid #2196f3; margin-top: 20px; }}
+                    </style>
+                </head>
+                <body>
+                    <div class="container">
+                        <h1>Отчет: {report_type}</h1>
+                        <p>Уважаемый(ая) <strong>{recipient_name}</strong>,</p>
+                        <p>Направляем Вам отчет <strong>"{report_type}"</strong> за период <strong>{report_period}</strong>.</p>
+                        
+                        <div class="report-info">
+                            <p>Файл отчета прикреплен к письму.</p>
+                            <p>Тип файла: {file_type}</p>
+                        </div>{additional_info}""" + SIGNATURE + """
+                    </div>
+                </body>
+            </html>
+""",
+    'report_additional_info': """
+                        <div class="additional-info">
+                            <p><strong>Дополнительная информация:</strong></p>
+                            <p>{text}</p>
+                        </div>""",
+    
+    # Напоминание о приеме (EmailSender.send_appointment_reminder, appointment_reminders)
+    'appointment_reminder': """
+            <html>
+                <head>
+                    <style>""" + BASE_STYLES + """
+                        .appointment-info {{ background-color: #f8f9fa; padding: 15px; border-radius: 5px; margin: 20px 0; }}
+                        .appointment-info h2 {{ color: #3498db; margin-top: 0; }}
+                        .important {{ color: #e74c3c; font-weight: bold; }}
+                        .notes {{ background-color: #fffde7; padding: 10px; border-left: 4px solid #ffd600; margin-top: 20px; }}
+                    </style>
+                </head>
+                <body>
+                    <div class="container">
+                        <h1>Напоминание о приеме</h1>
+                        <p>Уважаемый(ая) <strong>{patient_name}</strong>,</p>
+                        <p>Напоминаем Вам о предстоящем приеме в нашем медицинском центре.</p>
+                        
+                        <div class="appointment-info">
+                            <h2>Информация о приеме:</h2>
+                            <p><strong>Дата:</strong> {date}</p>
+                            <p><strong>Время:</strong> {time}</p>
+                            <p><strong>Врач:</strong> {doctor_name}{doctor_specialization}</p>
+                        </div>
+                        
+                        <p class="important">Пожалуйста, не забудьте взять с собой паспорт и полис ОМС.</p>{notes}
+                        <p>В случае невозможности посещения в указанное время, пожалуйста, свяжитесь с нами заранее.</p>""" + SIGNATURE + """
+                    </div>
+                </body>
+            </html>
+""",
+    'appointment_notes': """
+                        <div class="notes">
+                            <p><strong>Дополнительная информация:</strong></p>
+                            <p>{text}</p>
+                        </div>""",
+}
+
+
+@lru_cache(maxsize=None)
+def get_template(name):
+    """Разобранный шаблон по имени (разбирается при первом обращении)"""
+    return EmailTemplate(TEMPLATE_SOURCES[name])
+
+
+def render_analysis_results(patient_name, analysis_name, result_data, normal_values=None):
+    """
+    Письмо с результатами анализа
+    
+    :param patient_name: Имя пациента
+    :param analysis_name: Название анализа
+    :param result_data: Словарь {параметр: значение} или текст результата
+    :param normal_values: Функция normal_values(параметр) -> строка с нормой
+    :return: HTML-текст письма
+    """
+    if isinstance(result_data, dict):
+        describe = normal_values or (lambda parameter: "")
+        rows = get_template('analysis_result_row').render_many(
+            (parameter, value, describe(parameter)) for parameter, value in result_data.items()
+        )
+    else:
+        # Результат не в формате словаря выводится как текст
+        rows = get_template('analysis_result_text').render(text=result_data)
+    return get_template('analysis_results').render(patient_name=patient_name, analysis_name=analysis_name, rows=rows)
+
+
+def render_analysis_notification(patient_name, analysis_name, date_taken):
+    """Письмо о результатах анализа, полные результаты которого во вложении"""
+    return get_template('analysis_notification').render(
+        patient_name=patient_name, analysis_name=analysis_name, date_taken=date_taken
+    )
+
+
+def render_report(recipient_name, report_type, report_period, file_type, additional_text=None):
+    """Письмо с отчетом для сотрудника"""
+    additional_info = get_template('report_additional_info').render(text=additional_text) if additional_text else Safe()
+    return get_template('report').render(
+        recipient_name=recipient_name, report_type=report_type, report_period=report_period,
+        file_type=file_type, additional_info=additional_info
+    )
+
+
+def render_appointment_reminder(patient_name, doctor_name, appointment_date, appointment_time,
+                                doctor_specialization=None, notes=None):
+    """Письмо с напоминанием о приеме"""
+    return get_template('appointment_reminder').render(
+        patient_name=patient_name,
+        date=appointment_date,
+        time=appointment_time,
+        doctor_name=doctor_name,
+        doctor_specialization=f", {doctor_specialization}" if doctor_specialization else "",
+        notes=get_template('appointment_notes').render(text=notes) if notes else Safe(),
+    )
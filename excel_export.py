@@ -0,0 +1,81 @@
+"""
+Потоковый экспорт строк в Excel (.xlsx).
+
+Книга openpyxl создается в режиме write-only: каждая строка сразу
+записывается во временный файл листа и не хранится в памяти, поэтому
+потребление памяти не зависит от количества строк. Строки берутся из
+итератора (например, курсора базы данных), а не из таблицы окна.
+
+Ограничения формата .xls (65 536 строк) нет; если строк больше, чем
+помещается на лист .xlsx (1 048 576 вместе с заголовком), запись
+продолжается на следующем листе.
+"""
+from collections import namedtuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font
+from openpyxl.utils import get_column_letter
+
+# Максимальное количество строк на листе .xlsx
+XLSX_MAX_ROWS = 1048576
+
+# Через сколько строк вызывается функция прогресса
+PROGRESS_ROWS = 1000
+
+# Столбец отчета: заголовок, функция row -> значение ячейки, ширина в символах
+ExcelColumn = namedtuple('ExcelColumn', 'title value width', defaults=(20,))
+
+
+def _add_sheet(workbook, title, columns):
+    """Новый лист с заголовками и шириной столбцов"""
+    sheet = workbook.create_sheet(title[:31])
+    # В режиме write-only ширина столбцов задается до записи строк
+    for index, column in enumerate(columns, 1):
+        sheet.column_dimensions[get_column_letter(index)].width = column.width
+    sheet.freeze_panes = 'A2'
+    
+    header_font = Font(bold=True)
+    header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=column.title)
+        cell.font = header_font
+        cell.alignment = header_alignment
+        header.append(cell)
+    sheet.append(header)
+    return sheet
+
+
+def export_rows(file_path, sheet_title, columns, rows, progress=None):
+    """
+    Запись строк в файл .xlsx
+    
+    :param file_path: Путь к файлу
+    :param sheet_title: Название листа (следующие листы получают номер)
+    :param columns: Список ExcelColumn
+    :param rows: Итератор строк; значения ячеек вычисляются функциями столбцов
+    :param progress: Функция progress(количество записанных строк) для фоновой
+                     задачи; исключение из нее прерывает запись
+    :return: Количество записанных строк (без заголовков)
+    """
+    workbook = Workbook(write_only=True)
+    value_getters = [column.value for column in columns]
+    
+    sheet_number = 1
+    sheet = _add_sheet(workbook, sheet_title, columns)
+    sheet_rows = 1
+    count = 0
+    for row in rows:
+        if sheet_rows == XLSX_MAX_ROWS:
+            sheet_number += 1
+            sheet = _add_sheet(workbook, f"{sheet_title} ({sheet_number})", columns)
+            sheet_rows = 1
+        sheet.append([value(row) for value in value_getters])
+        sheet_rows += 1
+        count += 1
+        if progress is not None and count % PROGRESS_ROWS == 0:
+            progress(count)
+    
+    workbook.save(file_path)
+    return count
@@ -1,14 +1,18 @@
 from PySide6.QtWidgets import (QMainWindow, QWidget, QLabel, QComboBox, QPushButton,
                                QVBoxLayout, QHBoxLayout, QMessageBox, QFormLayout, 
-                               QTableWidget, QTableWidgetItem, QLineEdit, QDialog,
-                               QScrollArea, QGridLayout, QGroupBox, QFrame)
+                               QTableWidget, QLineEdit, QDialog,
+                               QScrollArea, QGridLayout, QGroupBox, QFrame, QTableView, QSpinBox)
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QFont, QIcon
 import sys
 import json
 from datetime import datetime
 
+from analysis_flags import analysis_flags
 from database_connection import db
+from reference_cache import reference_cache, ReferenceListModel
+from table_models import (LazyQueryTableModel, TableColumn, ActionButtonsDelegate, RowAction,
+                          abnormal_result_background)
 
 class AnalysisEntryForm(QDialog):
     """Диалоговое окно для ввода результатов анализа"""
@@ -128,6 +132,13 @@ class LabTechnicianWindow(QMainWindow):
     """Главное окно интерфейса лаборанта"""
     logout_signal = Signal()
     
+    # Текстовое представление статусов анализа
+    STATUS_TEXT = {
+        'completed': 'Выполнен',
+        'pending': 'В обработке',
+        'sent': 'Отправлен'
+    }
+    
     def __init__(self, user_data):
         super().__init__()
         self.user_data = user_data
@@ -135,10 +146,6 @@ class LabTechnicianWindow(QMainWindow):
         self.setWindowTitle(f"Медицинский центр - Лаборант: {user_data['full_name']}")
         self.setMinimumSize(800, 600)
         
-        # Загрузка данных для работы
-        self.patients = db.get_all_patients()
-        self.analysis_types = db.get_all_analysis_types()
-        
         self.setup_ui()
     
     def setup_ui(self):
@@ -190,9 +197,9 @@ class LabTechnicianWindow(QMainWindow):
         patient_group = QGroupBox("Выбор пациента")
         patient_layout = QVBoxLayout()
         
+        # Списки пациентов и типов анализов общие для всех окон (reference_cache)
         self.patient_combo = QComboBox()
-        for patient in self.patients:
-            self.patient_combo.addItem(patient['full_name'], patient['id'])
+        reference_cache.bind_combo(self.patient_combo, 'patients')
         
         patient_layout.addWidget(self.patient_combo)
         
@@ -229,6 +236,28 @@ class LabTechnicianWindow(QMainWindow):
         self.show_patients_without_analysis_button.clicked.connect(self.show_patients_without_analysis)
         filter_layout.addWidget(self.show_patients_without_analysis_button)
         
+        # Пациенты, последний анализ выбранного типа которых старше указанного срока
+        self.outdated_days_spin = QSpinBox()
+        self.outdated_days_spin.setRange(1, 3650)
+        self.outdated_days_spin.setValue(365)
+        self.outdated_days_spin.setSuffix(" дн.")
+        filter_layout.addWidget(self.outdated_days_spin)
+        
+        self.show_outdated_patients_button = QPushButton("Давно не сдавали")
+        self.show_outdated_patients_button.setStyleSheet("""
+            QPushButton {
+                background-color: #fd7e14;
+                color: white;
+                padding: 5px;
+                border-radius: 3px;
+            }
+            QPushButton:hover {
+                background-color: #e8590c;
+            }
+        """)
+        self.show_outdated_patients_button.clicked.connect(self.show_patients_with_outdated_analysis)
+        filter_layout.addWidget(self.show_outdated_patients_button)
+        
         patient_layout.addLayout(filter_layout)
         patient_group.setLayout(patient_layout)
         selection_layout.addWidget(patient_group)
@@ -238,8 +267,7 @@ class LabTechnicianWindow(QMainWindow):
         analysis_layout = QVBoxLayout()
         
         self.analysis_combo = QComboBox()
-        for analysis in self.analysis_types:
-            self.analysis_combo.addItem(analysis['name'], analysis['id'])
+        reference_cache.bind_combo(self.analysis_combo, 'analysis_types')
         
         analysis_layout.addWidget(self.analysis_combo)
         analysis_group.setLayout(analysis_layout)
@@ -270,13 +298,23 @@ class LabTechnicianWindow(QMainWindow):
         history_group = QGroupBox("История анализов")
         history_layout = QVBoxLayout()
         
-        self.history_table = QTableWidget()
-        self.history_table.setColumnCount(5)
-        self.history_table.setHorizontalHeaderLabels([
-            "Дата", "Пациент", "Тип анализа", "Статус", "Действия"
-        ])
-        
-        # Включаем сортировку
+        self.history_model = LazyQueryTableModel([
+            TableColumn("Дата", 'result_date', display=self.format_result_date),
+            TableColumn("Пациент", 'patient_name'),
+            TableColumn("Тип анализа", 'analysis_name'),
+            TableColumn("Статус", 'status',
+                        display=lambda r: self.STATUS_TEXT.get(r['status'], r['status'])),
+            TableColumn("Действия")
+        ], parent=self, row_background=abnormal_result_background, rows_loaded=analysis_flags.flag_results)
+        
+        self.history_table = QTableView()
+        self.history_table.setModel(self.history_model)
+        self.history_table.setItemDelegateForColumn(4, ActionButtonsDelegate([
+            RowAction("Просмотр", self.view_analysis_result)
+        ], self.history_table))
+        
+        # Включаем сортировку (выполняется запросом к базе данных)
+        self.history_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         self.history_table.setSortingEnabled(True)
         
         history_layout.addWidget(self.history_table)
@@ -288,7 +326,8 @@ class LabTechnicianWindow(QMainWindow):
     
     def load_analysis_history(self):
         """Загрузка истории анализов, выполненных текущим лаборантом"""
-        analysis_results = db.fetch_all("""
+        # Строки читаются из курсора по мере прокрутки таблицы
+        self.history_model.set_query("""
             SELECT ar.*, p.full_name as patient_name, at.name as analysis_name 
             FROM analysis_results ar
             JOIN patients p ON ar.patient_id = p.id
@@ -296,41 +335,17 @@ class LabTechnicianWindow(QMainWindow):
             WHERE ar.lab_user_id = ?
             ORDER BY ar.result_date DESC
         """, (self.user_data['id'],))
-        
-        self.history_table.setRowCount(len(analysis_results))
-        
-        for row, result in enumerate(analysis_results):
-            self.history_table.setItem(row, 0, QTableWidgetItem(result['result_date']))
-            self.history_table.setItem(row, 1, QTableWidgetItem(result['patient_name']))
-            self.history_table.setItem(row, 2, QTableWidgetItem(result['analysis_name']))
-            
-            # Корректная обработка даты (может быть строкой)
-            result_date = result['result_date']
-            if result_date:
-                # Если дата уже в строковом формате, используем её как есть
-                # Иначе форматируем с помощью strftime
-                if isinstance(result_date, str):
-                    date_str = result_date
-                else:
-                    date_str = result_date.strftime('%d.%m.%Y %H:%M')
-            else:
-                date_str = ""
-                
-            self.history_table.setItem(row, 3, QTableWidgetItem(date_str))
-            
-            status_item = QTableWidgetItem(result['status'])
-            if result['status'] == 'completed':
-                status_item.setText("Выполнен")
-            elif result['status'] == 'pending':
-                status_item.setText("В обработке")
-            elif result['status'] == 'sent':
-                status_item.setText("Отправлен")
-            
-            self.history_table.setItem(row, 4, status_item)
-            
-            view_button = QPushButton("Просмотр")
-            view_button.clicked.connect(lambda checked, r=result: self.view_analysis_result(r))
-            self.history_table.setCellWidget(row, 5, view_button)
+    
+    def format_result_date(self, result):
+        """Корректная обработка даты (может быть строкой)"""
+        result_date = result['result_date']
+        if not result_date:
+            return ""
+        # Если дата уже в строковом формате, используем её как есть
+        # Иначе форматируем с помощью strftime
+        if isinstance(result_date, str):
+            return result_date
+        return result_date.strftime('%d.%m.%Y %H:%M')
     
     def start_analysis_entry(self):
         """Начало ввода результатов анализа"""
@@ -430,15 +445,12 @@ class LabTechnicianWindow(QMainWindow):
 
     def show_all_patients(self):
         """Показать всех пациентов в выпадающем списке"""
-        self.patient_combo.clear()
-        self.patients = db.get_all_patients()
-        for patient in self.patients:
-            self.patient_combo.addItem(patient['full_name'], patient['id'])
+        model = reference_cache.bind_combo(self.patient_combo, 'patients')
         
         QMessageBox.information(
             self,
             "Информация",
-            f"Отображены все пациенты ({len(self.patients)})"
+            f"Отображены все пациенты ({model.item_count()})"
         )
     
     def show_patients_without_analysis(self):
@@ -450,16 +462,38 @@ class LabTechnicianWindow(QMainWindow):
         # Получаем пациентов без анализов данного типа
         patients_without_analysis = db.get_patients_without_analysis(analysis_id)
         
-        # Обновляем выпадающий список
-        self.patient_combo.clear()
-        for patient in patients_without_analysis:
-            self.patient_combo.addItem(patient['full_name'], patient['id'])
+        # Отдельная модель: общий список пациентов не меняется
+        self.patient_combo.setModel(ReferenceListModel(
+            [(patient['id'], patient['full_name']) for patient in patients_without_analysis], parent=self.patient_combo
+        ))
         
         QMessageBox.information(
             self,
             "Информация",
             f"Отображены пациенты, у которых нет анализа '{analysis_name}' ({len(patients_without_analysis)})"
         )
+    
+    def show_patients_with_outdated_analysis(self):
+        """Показать пациентов, последний анализ выбранного типа которых сдан раньше указанного срока"""
+        analysis_id = self.analysis_combo.currentData()
+        analysis_name = self.analysis_combo.currentText()
+        days = self.outdated_days_spin.value()
+        
+        patients = db.get_patients_with_outdated_analysis(analysis_id, days)
+        
+        # Отдельная модель: общий список пациентов не меняется
+        self.patient_combo.setModel(ReferenceListModel(
+            [(patient['id'], f"{patient['full_name']} ({(patient['last_result_date'] or '')[:10]})")
+             for patient in patients],
+            parent=self.patient_combo
+        ))
+        
+        QMessageBox.information(
+            self,
+            "Информация",
+            f"Отображены пациенты, последний анализ '{analysis_name}' которых сдан более {days} дн. назад "
+            f"({len(patients)})"
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,163 @@
+"""
+Вкладки, которые создаются и загружают данные при первом показе.
+
+LazyTab добавляется в QTabWidget вместо виджета вкладки. Пока вкладка
+не показана, ее виджет не создается и запросы к базе данных не
+выполняются. При первом показе создается виджет, а данные читаются
+в пуле потоков; до их появления отображается заглушка "Загрузка...".
+
+Вкладка помнит версии данных (reference_versions, см. миграции схемы
+9 и 10), с которыми она загружена. При следующем показе данные
+перечитываются, только если версия одной из таблиц вкладки изменилась;
+пока читаются новые данные, на вкладке остаются прежние.
+
+Функция чтения данных выполняется в потоке пула и не должна обращаться
+к виджетам: значения фильтров собираются до ее запуска (см. loader).
+"""
+import logging
+
+from PySide6.QtCore import Qt, QObject, QRunnable, QThreadPool, QTimer, Signal
+from PySide6.QtWidgets import QWidget, QLabel, QStackedLayout
+
+from database_connection import db
+from reference_cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+
+class _LoadSignals(QObject):
+    # Номер загрузки, результат и текст ошибки (или None)
+    finished = Signal(int, object, object)
+
+
+class _LoadTask(QRunnable):
+    """Чтение данных вкладки в потоке пула"""
+    
+    def __init__(self, generation, func):
+        super().__init__()
+        # Объектом владеет LazyTab до получения результата
+        self.setAutoDelete(False)
+        self.generation = generation
+        self.func = func
+        self.signals = _LoadSignals()
+    
+    def run(self):
+        result = error = None
+        try:
+            result = self.func()
+        except Exception as e:
+            logger.exception("Ошибка загрузки данных вкладки")
+            error = str(e)
+        finally:
+            db.close_thread_connection()
+        self.signals.finished.emit(self.generation, result, error)
+
+
+class LazyTab(QWidget):
+    """Вкладка с отложенным созданием виджета и фоновой загрузкой данных"""
+    
+    def __init__(self, create, loader=None, show=None, depends_on=(), parent=None):
+        """
+        :param create: Функция создания виджета вкладки (без загрузки данных)
+        :param loader: Функция loader(widget), которая в главном потоке собирает
+                       значения фильтров и возвращает функцию чтения данных
+                       для потока пула; None - виджет загружает данные сам
+        :param show: Функция show(widget, result) отображения прочитанных данных
+        :param depends_on: Виды данных из reference_versions, которые показывает вкладка
+        """
+        super().__init__(parent)
+        self._create = create
+        self._loader = loader
+        self._show = show
+        self.depends_on = tuple(depends_on)
+        
+        self.widget = None
+        # Версии данных, с которыми загружена вкладка (None - не загружена)
+        self._versions = None
+        self._stamp = None
+        self._generation = 0
+        self._loading = False
+        # Выполняющиеся загрузки по номеру
+        self._tasks = {}
+        
+        self._layout = QStackedLayout(self)
+        self._placeholder = QLabel("Загрузка...")
+        self._placeholder.setAlignment(Qt.AlignCenter)
+        self._placeholder.setStyleSheet("color: #6c757d;")
+        self._layout.addWidget(self._placeholder)
+    
+    @property
+    def loading(self):
+        return self._loading
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        # Заглушка отображается сразу, виджет создается после отрисовки
+        QTimer.singleShot(0, self.activate)
+    
+    def activate(self):
+        """Создание виджета при первом показе и обновление устаревших данных"""
+        if not self.isVisible():
+            return
+        if self.widget is None:
+            self.widget = self._create()
+            self._layout.addWidget(self.widget)
+            if self._loader is None:
+                self._layout.setCurrentWidget(self.widget)
+        if self._loader is not None and self.is_stale():
+            self.refresh()
+    
+    def _current_versions(self):
+        if not self.depends_on:
+            return None
+        versions = reference_cache.versions()
+        return tuple(versions.get(kind) for kind in self.depends_on)
+    
+    def is_stale(self):
+        """Изменились ли данные вкладки после последней загрузки"""
+        if self._versions is None:
+            return True
+        stamp = db.change_stamp()
+        if stamp is not None and stamp == self._stamp:
+            return False
+        if self._current_versions() != self._versions:
+            return True
+        # Изменились другие таблицы: до следующей записи проверка не нужна
+        self._stamp = stamp
+        return False
+    
+    def mark_stale(self):
+        """Пометка данных как устаревших; видимая вкладка обновляется сразу"""
+        self._versions = None
+        if self.isVisible():
+            self.activate()
+    
+    def refresh(self):
+        """Чтение данных вкладки в потоке пула"""
+        if self.widget is None or self._loader is None:
+            return
+        self._generation += 1
+        self._loading = True
+        # Версии запоминаются до чтения: запись во время чтения
+        # сделает вкладку устаревшей при следующей проверке
+        self._stamp = db.change_stamp()
+        self._versions = self._current_versions() or ()
+        
+        task = _LoadTask(self._generation, self._loader(self.widget))
+        task.signals.finished.connect(self._loaded)
+        self._tasks[task.generation] = task
+        QThreadPool.globalInstance().start(task)
+    
+    def _loaded(self, generation, result, error):
+        self._tasks.pop(generation, None)
+        if generation != self._generation:
+            # Результат устарел: уже запущена следующая загрузка
+            return
+        self._loading = False
+        if error is not None:
+            self._versions = None
+            if self._layout.currentWidget() is self._placeholder:
+                self._placeholder.setText(f"Не удалось загрузить данные: {error}")
+            return
+        self._show(self.widget, result)
+        self._layout.setCurrentWidget(self.widget)
@@ -1,12 +1,17 @@
 import sys
+import logging
 from PySide6.QtWidgets import QApplication, QInputDialog, QLineEdit, QMessageBox
 from PySide6.QtCore import QTimer
 
 from login_window import LoginWindow
-from lab_technician_window import LabTechnicianWindow
-from doctor_window import DoctorWindow
-from admin_window import AdminWindow
 from database_connection import db
+from query_log import configure_logging
+
+# Окна ролей и очередь писем импортируются при входе пользователя
+# соответствующей роли (после запроса пароля базы данных): окно
+# администратора загружает модули отчетов, Excel и отправки почты
+
+logger = logging.getLogger(__name__)
 
 class MedicalCenter:
     """Главный класс приложения"""
@@ -39,7 +44,11 @@ class MedicalCenter:
                 return False
             
             if db.connect(password):
-                print("Успешное подключение к базе данных")
+                logger.info("Успешное подключение к базе данных")
+                # Отправка писем, оставшихся в очереди после прошлого запуска;
+                # письма профилей SMTP, еще не настроенных в этом запуске, ждут настройки
+                from email_outbox import email_outbox
+                email_outbox.resume()
                 return True
             
             attempts -= 1
@@ -69,7 +78,7 @@ class MedicalCenter:
     
     def handle_login(self, user_data):
         """Обработка успешной авторизации"""
-        print(f"Пользователь {user_data['username']} успешно авторизован. Роль: {user_data['role']}")
+        logger.info("Пользователь %s успешно авторизован. Роль: %s", user_data['username'], user_data['role'])
         
         # Закрываем окно авторизации
         self.login_window.close()
@@ -82,12 +91,13 @@ class MedicalCenter:
         elif user_data['role'] == 'admin':
             self.open_admin_window(user_data)
         else:
-            print(f"Неизвестная роль: {user_data['role']}")
+            logger.warning("Неизвестная роль: %s", user_data['role'])
             # Возвращение к окну авторизации в случае неизвестной роли
             QTimer.singleShot(0, self.start_login)
     
     def open_lab_technician_window(self, user_data):
         """Открытие окна лаборанта"""
+        from lab_technician_window import LabTechnicianWindow
         lab_window = LabTechnicianWindow(user_data)
         lab_window.logout_signal.connect(self.start_login)
         lab_window.show()
@@ -95,6 +105,7 @@ class MedicalCenter:
     
     def open_doctor_window(self, user_data):
         """Открытие окна врача"""
+        from doctor_window import DoctorWindow
         doctor_window = DoctorWindow(user_data)
         doctor_window.logout_signal.connect(self.start_login)
         doctor_window.show()
@@ -102,6 +113,7 @@ class MedicalCenter:
     
     def open_admin_window(self, user_data):
         """Открытие окна администратора"""
+        from admin_window import AdminWindow
         admin_window = AdminWindow(user_data)
         admin_window.logout_signal.connect(self.start_login)
         admin_window.show()
@@ -113,6 +125,9 @@ class MedicalCenter:
 
 
 if __name__ == "__main__":
+    # Уровень журнала и порог медленных запросов задаются переменными окружения
+    configure_logging()
+    
     # Запуск приложения
     medical_center = MedicalCenter()
     sys.exit(medical_center.run()) 
\ No newline at end of file
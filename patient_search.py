@@ -0,0 +1,220 @@
+"""
+Поиск пациентов по ФИО, телефону и email.
+
+Поиск выполняется по виртуальной таблице FTS5 patients_fts (миграция
+схемы 8), которую триггеры обновляют при каждом изменении patients.
+В индексе хранятся:
+
+- full_name - ФИО с заменой "ё" на "е"; токенизатор unicode61 приводит
+  кириллицу к нижнему регистру;
+- phone - цифры телефона без пробелов, скобок и дефисов: полный номер
+  и номер без кода страны (7 или 8), поэтому "916 123" и "8 (916) 123"
+  находят "+7 916 123-45-67";
+- email - адрес, разбитый на части по "@" и ".".
+
+Каждое слово запроса ищется как начало слова ("иван петр" находит
+"Иванов Петр Сергеевич"), слова объединяются через AND. Запрос только
+из цифр и символов телефона ищется по столбцу phone. Результаты
+упорядочиваются по релевантности (bm25, совпадение в ФИО весит больше)
+среди первых RANK_CANDIDATES совпадений и ограничиваются SEARCH_LIMIT
+строками, поэтому время ответа почти не зависит от количества пациентов.
+
+Если SQLite собран без FTS5, таблица не создается и поиск выполняется
+через LIKE по таблице patients (полный просмотр).
+"""
+import logging
+import re
+import sqlite3
+
+logger = logging.getLogger(__name__)
+
+# Максимальное количество результатов поиска
+SEARCH_LIMIT = 200
+
+# Количество совпадений, среди которых выбираются лучшие по релевантности.
+# Для коротких запросов ("и", "се") совпадают сотни тысяч строк, и bm25
+# для всех заняло бы около секунды на 1 млн пациентов
+RANK_CANDIDATES = 2000
+
+# Задержка поиска после последнего нажатия клавиши (в миллисекундах)
+SEARCH_DELAY = 250
+
+# Цифры телефона: без пробелов, скобок, дефисов, точек и "+"
+PHONE_DIGITS_SQL = (
+    "replace(replace(replace(replace(replace(replace({column}, ' ', ''), '-', ''), '(', ''), ')', ''), '+', ''), '.', '')"
+)
+
+# Полный номер и номер без кода страны (из столбца d с цифрами телефона)
+PHONE_TOKENS_SQL = (
+    "CASE WHEN length(d) = 11 AND substr(d, 1, 1) IN ('7', '8') "
+    "THEN '7' || substr(d, 2) || ' ' || substr(d, 2) ELSE d END"
+)
+
+
+def _index_row_sql(source):
+    """Добавление строк в patients_fts из source (id, full_name, email, phone)"""
+    return f"""
+        INSERT INTO patients_fts (rowid, full_name, phone, email)
+        SELECT id, replace(replace(full_name, 'ё', 'е'), 'Ё', 'Е'), {PHONE_TOKENS_SQL}, email
+        FROM (SELECT id, full_name, email, {PHONE_DIGITS_SQL.format(column='phone')} AS d FROM {source})
+    """
+
+
+PATIENTS_FTS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_patients_fts_insert
+    AFTER INSERT ON patients
+    BEGIN
+        {_index_row_sql("(SELECT NEW.id AS id, NEW.full_name AS full_name, NEW.email AS email, NEW.phone AS phone)")};
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_patients_fts_delete
+    AFTER DELETE ON patients
+    BEGIN
+        DELETE FROM patients_fts WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_patients_fts_update
+    AFTER UPDATE OF full_name, phone, email ON patients
+    BEGIN
+        DELETE FROM patients_fts WHERE rowid = OLD.id;
+        {_index_row_sql("(SELECT NEW.id AS id, NEW.full_name AS full_name, NEW.email AS email, NEW.phone AS phone)")};
+    END
+    """,
+]
+
+
+def create_patients_fts(cursor):
+    """
+    Создание индекса patients_fts, триггеров и заполнение из patients
+    
+    Если SQLite собран без FTS5, индекс не создается (поиск через LIKE).
+    """
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5(
+                full_name, phone, email,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        logger.warning("FTS5 недоступен, поиск пациентов будет выполняться через LIKE: %s", e)
+        return
+    
+    # Вес совпадений в столбцах для ORDER BY rank: ФИО, телефон, email
+    cursor.execute("INSERT INTO patients_fts (patients_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 2.0)')")
+    for statement in PATIENTS_FTS_TRIGGERS:
+        cursor.execute(statement)
+    cursor.execute("DELETE FROM patients_fts")
+    cursor.execute(_index_row_sql("patients"))
+
+
+# Запрос, похожий на номер телефона: цифры, пробелы, скобки, дефисы, "+"
+_PHONE_QUERY = re.compile(r'^[\d\s()+\-.]*\d[\d\s()+\-.]*$')
+_WORD = re.compile(r'\w+')
+
+
+def phone_prefixes(digits):
+    """Варианты начала номера для поиска: как введен, без кода страны, с кодом 7 вместо 8"""
+    variants = [digits]
+    if len(digits) > 1 and digits[0] in '78':
+        variants.append(digits[1:])
+        if digits[0] == '8':
+            variants.append('7' + digits[1:])
+    return variants
+
+
+def match_expression(text):
+    """
+    Выражение FTS5 MATCH для строки поиска
+    
+    :param text: Строка поиска
+    :return: Выражение или None, если в строке нет слов
+    """
+    text = text.strip()
+    if _PHONE_QUERY.match(text):
+        digits = re.sub(r'\D', '', text)
+        return "phone : (" + " OR ".join(f'"{prefix}"*' for prefix in phone_prefixes(digits)) + ")"
+    
+    words = _WORD.findall(text.lower().replace('ё', 'е'))
+    if not words:
+        return None
+    return " AND ".join(f'"{word}"*' for word in words)
+
+
+class PatientSearch:
+    """Поиск пациентов по индексу patients_fts или через LIKE"""
+    
+    def __init__(self, database=None, limit=SEARCH_LIMIT, candidates=RANK_CANDIDATES):
+        self._database = database
+        self.limit = limit
+        self.candidates = candidates
+        # Путь к базе данных, для которой проверено наличие индекса, и результат
+        self._checked = (None, False)
+    
+    @property
+    def _db(self):
+        if self._database is None:
+            from database_connection import db
+            self._database = db
+        return self._database
+    
+    def fts_available(self):
+        """Есть ли в текущей базе данных индекс patients_fts"""
+        path, available = self._checked
+        if path != self._db.db_path:
+            row = self._db.fetch_one(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patients_fts'", row_format='tuple'
+            )
+            available = row is not None
+            self._checked = (self._db.db_path, available)
+        return available
+    
+    def search_query(self, text):
+        """
+        Запрос поиска пациентов для LazyQueryTableModel.set_query
+        
+        :param text: Строка поиска (пустая - все пациенты)
+        :return: Кортеж (запрос, параметры)
+        """
+        text = text.strip()
+        if not text:
+            return "SELECT * FROM patients", ()
+        
+        if self.fts_available():
+            expression = match_expression(text)
+            if expression is None:
+                return "SELECT * FROM patients WHERE 0", ()
+            # Лучшие ID выбираются по индексу среди первых совпадений,
+            # и только они соединяются с patients
+            return """
+                SELECT p.*
+                FROM (
+                    SELECT rowid, rank
+                    FROM (SELECT rowid, rank FROM patients_fts WHERE patients_fts MATCH ? LIMIT ?)
+                    ORDER BY rank
+                    LIMIT ?
+                ) f
+                JOIN patients p ON p.id = f.rowid
+                ORDER BY f.rank
+            """, (expression, self.candidates, self.limit)
+        
+        pattern = f"%{text.lower()}%"
+        return """
+            SELECT * FROM patients
+            WHERE py_lower(full_name) LIKE ? OR py_lower(phone) LIKE ? OR py_lower(email) LIKE ?
+            ORDER BY full_name
+            LIMIT ?
+        """, (pattern, pattern, pattern, self.limit)
+    
+    def search(self, text):
+        """Найденные пациенты (список словарей)"""
+        query, params = self.search_query(text)
+        return self._db.fetch_all(query, params, row_format='dict')
+
+
+# Общий поиск пациентов для окон приложения
+patient_search = PatientSearch()
@@ -0,0 +1,87 @@
+"""
+Построение условий SQL-запросов для фильтров окон приложения.
+
+Даты в базе данных хранятся как строки 'YYYY-MM-DD' или 'YYYY-MM-DD HH:MM[:SS]'.
+Фильтр по периоду преобразуется в полуоткрытый интервал
+[начальная дата, конечная дата + 1 день) по исходному столбцу, без обертки
+date(столбец), поэтому SQLite может использовать индекс по этому столбцу.
+"""
+from datetime import date, datetime, timedelta
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def to_date_string(value):
+    """
+    Приведение даты к строке формата 'YYYY-MM-DD'
+    
+    :param value: Строка 'YYYY-MM-DD', datetime.date, datetime.datetime или QDate
+    :return: Строка с датой
+    """
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    if isinstance(value, date):
+        return value.strftime(DATE_FORMAT)
+    if hasattr(value, 'toString'):
+        # QDate из виджетов выбора даты
+        return value.toString("yyyy-MM-dd")
+    return str(value)[:10]
+
+
+def next_day(value):
+    """Строка с датой следующего дня (исключающая верхняя граница интервала)"""
+    day = datetime.strptime(to_date_string(value), DATE_FORMAT).date()
+    return (day + timedelta(days=1)).strftime(DATE_FORMAT)
+
+
+def date_range(start_date, end_date):
+    """
+    Границы полуоткрытого интервала дат
+    
+    :param start_date: Начальная дата (включительно)
+    :param end_date: Конечная дата (включительно)
+    :return: Кортеж (начало, день после окончания)
+    """
+    return to_date_string(start_date), next_day(end_date)
+
+
+class QueryConditions:
+    """Набор условий WHERE и параметров запроса"""
+    
+    def __init__(self):
+        self.conditions = []
+        self.params = []
+        
+    def add(self, condition, *params):
+        """Добавление произвольного условия с параметрами"""
+        self.conditions.append(condition)
+        self.params.extend(params)
+        return self
+        
+    def add_equals(self, column, value):
+        """Добавление условия равенства, если значение фильтра задано"""
+        if value:
+            self.add(f"{column} = ?", value)
+        return self
+        
+    def add_date_from(self, column, start_date):
+        """Добавление нижней границы периода (включительно)"""
+        if start_date:
+            self.add(f"{column} >= ?", to_date_string(start_date))
+        return self
+        
+    def add_date_to(self, column, end_date):
+        """Добавление верхней границы периода (день окончания включается)"""
+        if end_date:
+            self.add(f"{column} < ?", next_day(end_date))
+        return self
+        
+    def add_date_range(self, column, start_date, end_date):
+        """Добавление условия по периоду в виде полуоткрытого интервала"""
+        self.add_date_from(column, start_date)
+        self.add_date_to(column, end_date)
+        return self
+        
+    def where_clause(self):
+        """Текст условия WHERE (без ключевого слова)"""
+        return " AND ".join(self.conditions) if self.conditions else "1=1"
@@ -0,0 +1,73 @@
+"""
+Журналирование приложения и запросов к базе данных.
+
+Сообщения выводятся через logging с отложенным форматированием, поэтому
+отладочные сообщения (текст SQL, параметры) на уровне INFO не формируются
+и не пишутся в stdout. Журнал медленных запросов включается отдельно
+и записывает только запросы, выполнявшиеся дольше заданного порога.
+
+Настройка через переменные окружения:
+    MED_CENTER_LOG_LEVEL=DEBUG      - уровень журнала (по умолчанию INFO)
+    MED_CENTER_SLOW_QUERY_MS=50     - порог журнала медленных запросов, мс
+"""
+import logging
+import os
+import time
+
+# Журнал всех запросов (уровень DEBUG)
+logger = logging.getLogger('med_center.sql')
+
+# Журнал медленных запросов (уровень WARNING)
+slow_logger = logging.getLogger('med_center.sql.slow')
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Порог медленного запроса в секундах (None - журнал выключен)
+_slow_query_threshold = None
+
+
+def configure_logging(level=None, slow_query_ms=None):
+    """
+    Настройка журнала приложения
+    
+    :param level: Уровень журнала (имя или число), по умолчанию из
+                  MED_CENTER_LOG_LEVEL или INFO
+    :param slow_query_ms: Порог журнала медленных запросов в миллисекундах,
+                          по умолчанию из MED_CENTER_SLOW_QUERY_MS
+    """
+    if level is None:
+        level = os.environ.get('MED_CENTER_LOG_LEVEL', 'INFO')
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    
+    if slow_query_ms is None:
+        slow_query_ms = os.environ.get('MED_CENTER_SLOW_QUERY_MS')
+    if slow_query_ms not in (None, ''):
+        try:
+            set_slow_query_threshold(float(slow_query_ms))
+        except ValueError:
+            slow_logger.warning("Некорректный порог медленных запросов: %r", slow_query_ms)
+
+
+def set_slow_query_threshold(milliseconds):
+    """Установка порога медленных запросов (None - выключить журнал)"""
+    global _slow_query_threshold
+    _slow_query_threshold = None if milliseconds is None else milliseconds / 1000
+
+
+def log_query(query, params, started):
+    """
+    Запись выполненного запроса в журнал
+    
+    :param query: Текст SQL-запроса
+    :param params: Параметры запроса
+    :param started: Значение time.perf_counter() перед выполнением запроса
+    """
+    elapsed = time.perf_counter() - started
+    if _slow_query_threshold is not None and elapsed >= _slow_query_threshold:
+        slow_logger.warning("%.1f мс: %s; параметры: %r", elapsed * 1000, query, params)
+    else:
+        logger.debug("%.2f мс: %s; параметры: %r", elapsed * 1000, query, params)
@@ -0,0 +1,211 @@
+"""
+Общий кэш справочных списков для выпадающих списков: пациенты, врачи,
+типы анализов.
+
+Каждый список загружается из базы данных один раз и хранится вместе
+с номером версии из таблицы reference_versions (миграция схемы 9).
+Триггеры увеличивают номер версии при добавлении, удалении и изменении
+строк patients, doctors, users (ФИО врача) и analysis_types, поэтому
+запись из любого окна или потока делает список устаревшим. Проверка
+актуальности - отметка db.change_stamp() и, если она изменилась,
+один запрос к reference_versions; список перечитывается, только если
+изменилась его версия.
+
+Все QComboBox одного вида используют общую модель ReferenceListModel
+(по одной на пару вид + строка "Все ..."), а не копируют строки
+через addItem. При перезагрузке списка модели обновляются, а выбранное
+значение в связанных выпадающих списках сохраняется.
+"""
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QObject
+from PySide6.QtWidgets import QComboBox
+
+# Запросы справочных списков: (ID, текст)
+REFERENCE_QUERIES = {
+    'patients': "SELECT id, full_name FROM patients ORDER BY id",
+    'doctors': """
+        SELECT d.id,
+               u.full_name || CASE WHEN d.specialization IS NOT NULL AND d.specialization <> ''
+                                   THEN ' (' || d.specialization || ')' ELSE '' END
+        FROM doctors d
+        JOIN users u ON d.user_id = u.id
+        ORDER BY u.full_name
+    """,
+    'analysis_types': "SELECT id, name FROM analysis_types ORDER BY id",
+}
+
+# Ширина выпадающего списка в символах. Размер по содержимому
+# потребовал бы просмотра всех строк модели при первом показе
+COMBO_CONTENTS_LENGTH = 30
+
+
+class ReferenceListModel(QAbstractListModel):
+    """
+    Список (ID, текст) для QComboBox
+    
+    Текст возвращается для Qt.DisplayRole, ID - для Qt.UserRole
+    (currentData(), findData()). Необязательная строка placeholder
+    ("Все пациенты") выводится первой и имеет ID None.
+    """
+    
+    def __init__(self, items=(), placeholder=None, parent=None):
+        super().__init__(parent)
+        self._items = items
+        self._placeholder = placeholder
+        self._offset = 0 if placeholder is None else 1
+        # Номер строки по ID, строится при первом поиске
+        self._rows = None
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._items) + self._offset
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row() - self._offset
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            return self._placeholder if row < 0 else self._items[row][1]
+        if role == Qt.UserRole:
+            return None if row < 0 else self._items[row][0]
+        return None
+    
+    def match(self, start, role, value, hits=1, flags=Qt.MatchExactly | Qt.MatchCaseSensitive):
+        # findData() по ID без перебора всех строк
+        if role != Qt.UserRole or value is None:
+            return super().match(start, role, value, hits, flags)
+        if self._rows is None:
+            self._rows = {item[0]: row for row, item in enumerate(self._items)}
+        row = self._rows.get(value)
+        return [] if row is None else [self.index(row + self._offset)]
+    
+    def set_items(self, items):
+        """Замена строк списка"""
+        self.beginResetModel()
+        self._items = items
+        self._rows = None
+        self.endResetModel()
+    
+    def item_count(self):
+        """Количество строк без строки placeholder"""
+        return len(self._items)
+
+
+class _SelectionKeeper(QObject):
+    """Восстановление выбранного ID в QComboBox после перезагрузки модели"""
+    
+    def __init__(self, combo, model):
+        # Дочерний объект выпадающего списка: соединения удаляются вместе с ним
+        super().__init__(combo)
+        self._combo = combo
+        self.model = model
+        self._selected = None
+        model.modelAboutToBeReset.connect(self._save)
+        model.modelReset.connect(self._restore)
+    
+    def _save(self):
+        self._selected = self._combo.currentData()
+    
+    def _restore(self):
+        if self._combo.model() is not self.model:
+            return
+        index = self._combo.findData(self._selected) if self._selected is not None else -1
+        self._combo.setCurrentIndex(max(index, 0))
+
+
+class ReferenceCache:
+    """Справочные списки с проверкой версий и общими моделями"""
+    
+    def __init__(self, database=None):
+        self._database = database
+        # Вид списка -> (версия, строки)
+        self._lists = {}
+        # (вид, placeholder) -> ReferenceListModel
+        self._models = {}
+        self._stamp = None
+    
+    @property
+    def _db(self):
+        if self._database is None:
+            from database_connection import db
+            self._database = db
+        return self._database
+    
+    def versions(self):
+        """Версии данных из reference_versions: {вид данных: номер версии}"""
+        rows = self._db.fetch_all("SELECT kind, version FROM reference_versions", row_format='tuple')
+        return dict(rows)
+    
+    def _load(self, kind, version):
+        items = self._db.fetch_all(REFERENCE_QUERIES[kind], row_format='tuple')
+        self._lists[kind] = (version, items)
+        for (model_kind, _), model in self._models.items():
+            if model_kind == kind:
+                model.set_items(items)
+        return items
+    
+    def refresh(self):
+        """Перезагрузка списков, версия которых изменилась после загрузки"""
+        stamp = self._db.change_stamp()
+        if stamp is not None and stamp == self._stamp:
+            return
+        self._stamp = stamp
+        versions = self.versions()
+        for kind, (version, _) in list(self._lists.items()):
+            # Без таблицы версий список перечитывается при любом изменении данных
+            if version is None or versions.get(kind) != version:
+                self._load(kind, versions.get(kind))
+    
+    def invalidate(self, kind=None):
+        """Пометка списка (или всех списков) как устаревшего"""
+        for name in [kind] if kind else list(self._lists):
+            if name in self._lists:
+                self._lists[name] = (None, self._lists[name][1])
+        self._stamp = None
+    
+    def items(self, kind):
+        """
+        Актуальные строки списка
+        
+        :param kind: 'patients', 'doctors' или 'analysis_types'
+        :return: Список кортежей (ID, текст)
+        """
+        self.refresh()
+        if kind not in self._lists:
+            return self._load(kind, self.versions().get(kind))
+        return self._lists[kind][1]
+    
+    def model(self, kind, placeholder=None):
+        """
+        Общая модель списка для QComboBox
+        
+        :param kind: 'patients', 'doctors' или 'analysis_types'
+        :param placeholder: Текст первой строки с ID None ("Все пациенты") или None
+        :return: ReferenceListModel
+        """
+        items = self.items(kind)
+        key = (kind, placeholder)
+        model = self._models.get(key)
+        if model is None:
+            model = ReferenceListModel(items, placeholder)
+            self._models[key] = model
+        return model
+    
+    def bind_combo(self, combo, kind, placeholder=None):
+        """
+        Подключение выпадающего списка к общей модели
+        
+        :param combo: QComboBox
+        :param kind: 'patients', 'doctors' или 'analysis_types'
+        :param placeholder: Текст первой строки с ID None или None
+        :return: ReferenceListModel
+        """
+        model = self.model(kind, placeholder)
+        combo.setSizeAdjustPolicy(QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        combo.setMinimumContentsLength(COMBO_CONTENTS_LENGTH)
+        combo.setModel(model)
+        if not any(keeper.model is model for keeper in combo.findChildren(_SelectionKeeper)):
+            _SelectionKeeper(combo, model)
+        return model
+
+
+# Общий кэш справочных списков для окон приложения
+reference_cache = ReferenceCache()
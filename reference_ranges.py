@@ -0,0 +1,312 @@
+"""
+Справочник нормальных значений (референсных диапазонов) параметров анализов.
+
+Диапазоны хранятся в таблице reference_ranges: параметр, пол ('М', 'Ж'
+или NULL - для всех), возрастная группа [age_min, age_max) в полных годах
+(NULL - без ограничения), нижняя и верхняя границы, единица измерения
+и текст нормы для качественных параметров ("Отсутствует").
+
+Таблица читается один раз в индекс в памяти (reference_ranges); окна,
+отчеты и письма используют этот индекс вместо собственных словарей.
+Для пакетов результатов evaluate() сравнивает значения с границами
+массивами numpy, подбирая диапазон один раз для каждого сочетания
+параметра, пола и возраста.
+"""
+import logging
+import math
+from collections import namedtuple
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+ReferenceRange = namedtuple('ReferenceRange', 'parameter sex age_min age_max low high unit text')
+
+# Состояние значения относительно диапазона (результат evaluate)
+STATUS_LOW = -1
+STATUS_NORMAL = 0
+STATUS_HIGH = 1
+STATUS_UNKNOWN = 2
+
+# Исходное содержимое таблицы reference_ranges:
+# (параметр, пол, возраст от, возраст до, нижняя граница, верхняя граница, единица, текст нормы)
+DEFAULT_RANGES = [
+    ('Гемоглобин', None, None, None, 120, 160, 'г/л', None),
+    ('Гемоглобин', 'Ж', None, None, 120, 160, 'г/л', None),
+    ('Гемоглобин', 'М', None, None, 130, 170, 'г/л', None),
+    ('Эритроциты', None, None, None, 3.8, 5.5, 'млн/мкл', None),
+    ('Эритроциты', 'Ж', None, None, 3.8, 5.2, 'млн/мкл', None),
+    ('Эритроциты', 'М', None, None, 4.2, 5.6, 'млн/мкл', None),
+    ('Лейкоциты', None, None, None, 4.0, 9.0, 'тыс/мкл', None),
+    ('Тромбоциты', None, None, None, 180, 320, 'тыс/мкл', None),
+    ('СОЭ', None, None, None, 2, 15, 'мм/ч', None),
+    ('Глюкоза', None, None, None, 3.9, 6.1, 'ммоль/л', None),
+    ('Холестерин', None, None, None, 3.0, 5.2, 'ммоль/л', None),
+    ('Триглицериды', None, None, None, 0.45, 1.7, 'ммоль/л', None),
+    ('Билирубин', None, None, None, 3.4, 17.1, 'мкмоль/л', None),
+    ('Билирубин общий', None, None, None, 3.4, 20.5, 'мкмоль/л', None),
+    ('АЛТ', None, None, None, 5, 40, 'ед/л', None),
+    ('АЛТ', 'Ж', None, None, 0, 33, 'ед/л', None),
+    ('АЛТ', 'М', None, None, 0, 41, 'ед/л', None),
+    ('АСТ', None, None, None, 5, 40, 'ед/л', None),
+    ('АСТ', 'Ж', None, None, 0, 32, 'ед/л', None),
+    ('АСТ', 'М', None, None, 0, 40, 'ед/л', None),
+    ('Креатинин', None, None, None, 53, 106, 'мкмоль/л', None),
+    ('Креатинин', 'Ж', None, None, 44, 80, 'мкмоль/л', None),
+    ('Креатинин', 'М', None, None, 62, 106, 'мкмоль/л', None),
+    ('Мочевина', None, None, None, 2.5, 8.3, 'ммоль/л', None),
+    ('Мочевая кислота', 'Ж', None, None, 154, 357, 'мкмоль/л', None),
+    ('Мочевая кислота', 'М', None, None, 202, 416, 'мкмоль/л', None),
+    ('pH', None, None, None, 5.0, 7.0, '', None),
+    ('Белок', None, None, None, None, None, '', 'Отсутствует'),
+    ('Кетоновые тела', None, None, None, None, None, '', 'Отсутствуют'),
+    ('Цвет', None, None, None, None, None, '', 'Светло-желтый'),
+    ('Прозрачность', None, None, None, None, None, '', 'Прозрачная'),
+]
+
+
+def create_reference_ranges(cursor):
+    """Создание таблицы reference_ranges и заполнение ее исходными диапазонами"""
+    cur = cursor.connection.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS reference_ranges (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            parameter_name TEXT NOT NULL,
+            sex TEXT CHECK (sex IN ('М', 'Ж')),
+            age_min INTEGER,
+            age_max INTEGER,
+            low REAL,
+            high REAL,
+            unit TEXT NOT NULL DEFAULT '',
+            text TEXT,
+            UNIQUE (parameter_name, sex, age_min, age_max)
+        )
+    """)
+    cur.executemany(
+        "INSERT OR IGNORE INTO reference_ranges "
+        "(parameter_name, sex, age_min, age_max, low, high, unit, text) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        DEFAULT_RANGES
+    )
+
+
+def normalize_sex(gender):
+    """
+    Пол пациента в обозначении справочника
+    
+    :param gender: Значение patients.gender ("Мужской", "Женский", "М", "Ж")
+    :return: 'М', 'Ж' или None, если пол не указан
+    """
+    if not gender:
+        return None
+    first = str(gender).strip()[:1].upper()
+    return first if first in ('М', 'Ж') else None
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def age_on(birth_date, on_date=None):
+    """
+    Возраст в полных годах на дату
+    
+    :param birth_date: Дата рождения (date или строка 'YYYY-MM-DD')
+    :param on_date: Дата, на которую считается возраст (по умолчанию сегодня)
+    :return: Возраст или None, если дату рождения не удалось разобрать
+    """
+    if not birth_date:
+        return None
+    try:
+        born = _to_date(birth_date)
+        today = _to_date(on_date) if on_date else date.today()
+    except (TypeError, ValueError):
+        return None
+    return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
+
+
+def format_range(reference_range):
+    """Текст нормы для отображения: 120-160 г/л, 5-7 или текст нормы"""
+    if reference_range.text:
+        return reference_range.text
+    if reference_range.low is None and reference_range.high is None:
+        return ''
+    
+    low = '' if reference_range.low is None else f"{reference_range.low:g}"
+    high = '' if reference_range.high is None else f"{reference_range.high:g}"
+    text = f"{low}-{high}"
+    return f"{text} {reference_range.unit}" if reference_range.unit else text
+
+
+class ReferenceRanges:
+    """
+    Индекс референсных диапазонов в памяти
+    
+    Загружается из таблицы reference_ranges при первом обращении;
+    если таблица недоступна (нет соединения с базой данных), используются
+    исходные диапазоны DEFAULT_RANGES. После изменения таблицы нужно
+    вызвать invalidate().
+    """
+    
+    def __init__(self, rows=None):
+        self._rows = rows
+        self._index = None
+        self._lookup_cache = {}
+        # Увеличивается при каждом сбросе; по нему сбрасываются зависимые кэши
+        self.version = 0
+    
+    def _load_rows(self):
+        """Строки таблицы reference_ranges"""
+        from database_connection import db
+        
+        rows = db.fetch_all(
+            "SELECT parameter_name, sex, age_min, age_max, low, high, unit, text FROM reference_ranges",
+            row_format='tuple'
+        )
+        if not rows:
+            logger.warning("Справочник нормальных значений недоступен, используются значения по умолчанию")
+            return DEFAULT_RANGES
+        return rows
+    
+    def _ensure_loaded(self):
+        if self._index is not None:
+            return self._index
+        
+        index = {}
+        for row in (self._rows if self._rows is not None else self._load_rows()):
+            reference_range = ReferenceRange(*row)
+            index.setdefault(reference_range.parameter, []).append(reference_range)
+        # Сначала более точные диапазоны: с полом и с возрастной группой
+        for ranges in index.values():
+            ranges.sort(key=lambda r: (r.sex is None, r.age_min is None and r.age_max is None))
+        self._index = index
+        return index
+    
+    def invalidate(self):
+        """Сброс индекса; диапазоны будут перечитаны при следующем обращении"""
+        self._index = None
+        self._lookup_cache = {}
+        self.version += 1
+    
+    def candidates(self, parameter):
+        """Все диапазоны параметра (сначала более точные)"""
+        return self._ensure_loaded().get(parameter, [])
+    
+    def lookup(self, parameter, sex=None, age=None):
+        """
+        Диапазон параметра для пациента
+        
+        Диапазон с указанным полом или возрастной группой подходит, только
+        если пол или возраст пациента известен и совпадает.
+        
+        :param parameter: Название параметра анализа
+        :param sex: Пол ('М', 'Ж' или значение patients.gender)
+        :param age: Возраст в полных годах
+        :return: ReferenceRange или None
+        """
+        sex = normalize_sex(sex)
+        key = (parameter, sex, age)
+        try:
+            return self._lookup_cache[key]
+        except KeyError:
+            pass
+        
+        found = None
+        for reference_range in self.candidates(parameter):
+            if reference_range.sex is not None and reference_range.sex != sex:
+                continue
+            if reference_range.age_min is not None and (age is None or age < reference_range.age_min):
+                continue
+            if reference_range.age_max is not None and (age is None or age >= reference_range.age_max):
+                continue
+            found = reference_range
+            break
+        
+        self._lookup_cache[key] = found
+        return found
+    
+    def describe(self, parameter, sex=None, age=None, default=''):
+        """
+        Текст нормы параметра для отображения
+        
+        Если пол пациента неизвестен, а общего диапазона нет, перечисляются
+        диапазоны для каждого пола: "154-357 мкмоль/л (Ж), 202-416 мкмоль/л (М)".
+        
+        :param default: Текст, если норма для параметра не задана
+        """
+        reference_range = self.lookup(parameter, sex, age)
+        if reference_range is not None:
+            return format_range(reference_range) or default
+        
+        by_sex = [r for r in self.candidates(parameter)
+                  if r.sex is not None and r.age_min is None and r.age_max is None]
+        if by_sex:
+            return ", ".join(f"{format_range(r)} ({r.sex})" for r in sorted(by_sex, key=lambda r: r.sex))
+        return default
+    
+    def evaluate(self, parameters, values, sexes=None, ages=None):
+        """
+        Сравнение пакета значений с диапазонами
+        
+        Диапазон подбирается один раз для каждого сочетания параметра,
+        пола и возраста, сравнение выполняется массивами numpy.
+        
+        :param parameters: Названия параметров
+        :param values: Числовые значения (None или NaN - значение не число)
+        :param sexes: Пол пациента для каждого значения (или None для всех)
+        :param ages: Возраст пациента для каждого значения (или None для всех)
+        :return: Кортеж массивов (нижние границы, верхние границы, состояния STATUS_*);
+                 отсутствующие границы - NaN
+        """
+        import numpy as np
+        
+        count = len(parameters)
+        sexes = sexes if sexes is not None else [None] * count
+        ages = ages if ages is not None else [None] * count
+        
+        # Номер диапазона для каждого значения; -1 - диапазона нет
+        bounds = {}
+        low_list = []
+        high_list = []
+        
+        def range_number(key):
+            number = bounds.get(key)
+            if number is None:
+                reference_range = self.lookup(*key)
+                if reference_range is None or (reference_range.low is None and reference_range.high is None):
+                    number = -1
+                else:
+                    number = len(low_list)
+                    low_list.append(math.nan if reference_range.low is None else reference_range.low)
+                    high_list.append(math.nan if reference_range.high is None else reference_range.high)
+                bounds[key] = number
+            return number
+        
+        numbers = np.fromiter(
+            (range_number((parameter, sex, None if age is None else int(age)))
+             for parameter, sex, age in zip(parameters, sexes, ages)),
+            dtype=np.intp, count=count
+        )
+        
+        # Последний элемент - NaN для значений без диапазона (номер -1)
+        low = np.append(np.asarray(low_list, dtype=float), math.nan)[numbers]
+        high = np.append(np.asarray(high_list, dtype=float), math.nan)[numbers]
+        value_array = np.asarray(
+            [math.nan if value is None else value for value in values], dtype=float
+        ) if not isinstance(values, np.ndarray) else values.astype(float, copy=False)
+        
+        status = np.full(count, STATUS_UNKNOWN, dtype=np.int8)
+        known = ~np.isnan(value_array) & (numbers >= 0)
+        with np.errstate(invalid='ignore'):
+            below = known & (value_array < low)
+            above = known & (value_array > high)
+        status[known] = STATUS_NORMAL
+        status[below] = STATUS_LOW
+        status[above] = STATUS_HIGH
+        return low, high, status
+
+
+# Общий индекс для окон, отчетов и писем
+reference_ranges = ReferenceRanges()
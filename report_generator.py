@@ -7,11 +7,10 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from PySide6.QtWidgets import QFileDialog, QMessageBox
 from PySide6.QtCore import QDate
 
-from database_connection import DatabaseConnection
-
-# Создаем экземпляр менеджера БД
-db = DatabaseConnection()
-db.connect()
+from background_jobs import job_manager, output_file
+from database_connection import db
+from query_builder import QueryConditions
+from reference_ranges import reference_ranges, age_on
 
 def export_analysis_to_word(result_id, parent_widget):
     """Экспорт результата анализа в Word"""
@@ -104,7 +103,7 @@ def export_analysis_to_word(result_id, parent_widget):
                 row_cells[1].text = str(result_data[param])
                 
                 # Получаем нормальные значения для параметра
-                normal_values = get_normal_values(param)
+                normal_values = get_normal_values(param, result['gender'], result['birth_date'], result['date'])
                 row_cells[2].text = normal_values
     else:
         doc.add_paragraph('Нет данных о результатах анализа.')
@@ -138,8 +137,13 @@ def export_analysis_to_word(result_id, parent_widget):
     
     return None
 
-def export_all_analyses_to_word(parent_widget, filters=None):
-    """Экспорт всех результатов анализов в Word с учетом фильтров"""
+def analyses_report_query(filters=None):
+    """
+    Запрос результатов анализов для отчета с учетом фильтров
+    
+    :param filters: Словарь фильтров (patient_id, analysis_type_id, from_date, to_date, status)
+    :return: Кортеж (запрос, параметры)
+    """
     # Базовый запрос
     query = """
         SELECT ar.id, ar.result_date as date, p.full_name as patient_name, p.birth_date, 
@@ -164,13 +168,13 @@ def export_all_analyses_to_word(parent_widget, filters=None):
             query += " AND at.id = ?"
             params.append(filters['analysis_type_id'])
         
-        if filters.get('from_date'):
-            query += " AND date(ar.result_date) >= ?"
-            params.append(filters['from_date'])
-        
-        if filters.get('to_date'):
-            query += " AND date(ar.result_date) <= ?"
-            params.append(filters['to_date'])
+        # Период фильтруется по исходному столбцу, чтобы использовался индекс
+        date_conditions = QueryConditions().add_date_range(
+            "ar.result_date", filters.get('from_date'), filters.get('to_date')
+        )
+        if date_conditions.conditions:
+            query += f" AND {date_conditions.where_clause()}"
+            params.extend(date_conditions.params)
         
         if filters.get('status'):
             query += " AND ar.status = ?"
@@ -179,12 +183,20 @@ def export_all_analyses_to_word(parent_widget, filters=None):
     # Сортировка по дате и имени пациента
     query += " ORDER BY ar.result_date DESC, p.full_name"
     
-    # Получаем результаты
-    results = db.fetch_all(query, tuple(params))
+    return query, tuple(params)
+
+def write_analyses_report(job, file_path, filters=None):
+    """
+    Формирование отчета по результатам анализов в Word (фоновая задача)
     
-    if not results:
-        QMessageBox.warning(parent_widget, "Внимание", "Нет результатов анализов для экспорта.")
-        return
+    :param job: Фоновая задача (background_jobs.Job) для прогресса и отмены
+    :param file_path: Путь к файлу .docx
+    :param filters: Фильтры (см. analyses_report_query)
+    :return: Путь к созданному файлу
+    """
+    query, params = analyses_report_query(filters)
+    results = db.fetch_all(query, params)
+    job.set_progress(0, len(results), "формирование документа")
     
     # Создаем документ Word
     doc = docx.Document()
@@ -276,7 +288,9 @@ def export_all_analyses_to_word(parent_widget, filters=None):
                         row_cells = results_table.add_row().cells
                         row_cells[0].text = param
                         row_cells[1].text = str(result_data[param])
-                        row_cells[2].text = get_normal_values(param)
+                        row_cells[2].text = get_normal_values(
+                            param, result['gender'], result['birth_date'], result['date']
+                        )
             else:
                 doc.add_paragraph('Нет данных о результатах анализа.')
                 
@@ -288,6 +302,29 @@ def export_all_analyses_to_word(parent_widget, filters=None):
         lab_tech = doc.add_paragraph()
         lab_tech.add_run('Лаборант: ').bold = True
         lab_tech.add_run(f'{result["lab_technician"]}')
+        
+        job.set_progress(i)
+    
+    job.set_progress(len(results), message="сохранение файла")
+    with output_file(file_path):
+        doc.save(file_path)
+    return file_path
+
+def export_all_analyses_to_word(parent_widget, filters=None):
+    """
+    Экспорт всех результатов анализов в Word с учетом фильтров
+    
+    Документ формируется и сохраняется фоновой задачей, ход выполнения
+    отображается на панели задач.
+    
+    :return: Фоновая задача (background_jobs.Job) или None
+    """
+    query, params = analyses_report_query(filters)
+    count = db.fetch_one(f"SELECT COUNT(*) FROM ({query})", params, row_format='tuple')
+    
+    if not count or not count[0]:
+        QMessageBox.warning(parent_widget, "Внимание", "Нет результатов анализов для экспорта.")
+        return None
     
     # Выбор места сохранения файла
     file_path, _ = QFileDialog.getSaveFileName(
@@ -297,18 +334,15 @@ def export_all_analyses_to_word(parent_widget, filters=None):
         "Word Documents (*.docx)"
     )
     
-    if file_path:
-        if not file_path.endswith('.docx'):
-            file_path += '.docx'
-        
-        try:
-            doc.save(file_path)
-            QMessageBox.information(parent_widget, "Успех", "Отчет успешно сохранен.")
-            return file_path
-        except Exception as e:
-            QMessageBox.critical(parent_widget, "Ошибка", f"Не удалось сохранить файл: {str(e)}")
+    if not file_path:
+        return None
+    if not file_path.endswith('.docx'):
+        file_path += '.docx'
     
-    return None
+    return job_manager.submit(
+        f"Отчет по анализам (Word): {os.path.basename(file_path)}",
+        write_analyses_report, os.path.abspath(file_path), filters
+    )
 
 def translate_status(status):
     """Перевод статуса на русский язык"""
@@ -320,23 +354,13 @@ def translate_status(status):
     }
     return status_map.get(status, status)
 
-def get_normal_values(parameter):
-    """Получение нормальных значений для параметра анализа"""
-    # В реальном приложении это должно быть получено из БД
-    # Здесь приведены условные примеры
-    normal_values = {
-        'Гемоглобин': '120-160 г/л (Ж), 130-170 г/л (М)',
-        'Эритроциты': '3,8-5,2 ×10^12/л (Ж), 4,2-5,6 ×10^12/л (М)',
-        'Лейкоциты': '4,0-9,0 ×10^9/л',
-        'Глюкоза': '3,3-5,5 ммоль/л',
-        'Холестерин': '3,6-5,2 ммоль/л',
-        'Триглицериды': '0,45-1,7 ммоль/л',
-        'АЛТ': '0-33 Ед/л (Ж), 0-41 Ед/л (М)',
-        'АСТ': '0-32 Ед/л (Ж), 0-40 Ед/л (М)',
-        'Билирубин общий': '3,4-20,5 мкмоль/л',
-        'Креатинин': '44-80 мкмоль/л (Ж), 62-106 мкмоль/л (М)',
-        'Мочевина': '2,5-6,7 ммоль/л',
-        'Мочевая кислота': '154-357 мкмоль/л (Ж), 202-416 мкмоль/л (М)'
-    }
+def get_normal_values(parameter, gender=None, birth_date=None, on_date=None):
+    """
+    Получение нормальных значений для параметра анализа из справочника
     
-    return normal_values.get(parameter, 'Нет данных') 
\ No newline at end of file
+    Если пол пациента не указан, для параметров с разными нормами
+    выводятся диапазоны для мужчин и женщин.
+    """
+    return reference_ranges.describe(
+        parameter, gender, age_on(birth_date, on_date), default='Нет данных'
+    )
@@ -0,0 +1,191 @@
+"""
+Представления строк результатов запросов.
+
+DatabaseConnection возвращает строки в одном из форматов:
+    'dict'   - словарь {столбец: значение} (по умолчанию)
+    'row'    - sqlite3.Row (доступ по имени и индексу, создается в C)
+    'tuple'  - кортеж значений без имен столбцов
+    'record' - объект класса со __slots__, созданного для набора столбцов
+               запроса; поддерживает get(), [] по имени и индексу, in,
+               keys()/items() и dict(record)
+
+Имена столбцов берутся из cursor.description один раз на запрос,
+а не для каждой строки.
+"""
+import gc
+import keyword
+import sqlite3
+from functools import lru_cache
+
+ROW_FORMATS = ('dict', 'row', 'tuple', 'record')
+
+# Начиная с этого количества строк сборщик мусора приостанавливается
+# на время преобразования: строки не содержат циклических ссылок, а сборки
+# поколений при создании сотен тысяч объектов занимают большую часть времени
+GC_PAUSE_ROWS = 10000
+
+# Имена, которые нельзя использовать для атрибутов записи
+_RESERVED_NAMES = {'get', 'keys', 'values', 'items', 'to_dict'}
+
+
+def column_names(description):
+    """Имена столбцов из cursor.description"""
+    return tuple(column[0] for column in description)
+
+
+class BaseRecord:
+    """Базовый класс записей; конкретные классы создает record_class"""
+    
+    __slots__ = ()
+    
+    # Заполняются в record_class
+    _fields = ()
+    _slots = ()
+    _index = {}
+    
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return getattr(self, self._slots[key])
+        try:
+            return getattr(self, self._slots[self._index[key]])
+        except (KeyError, TypeError):
+            raise KeyError(key) from None
+    
+    def __setitem__(self, key, value):
+        if isinstance(key, int):
+            setattr(self, self._slots[key], value)
+            return
+        try:
+            setattr(self, self._slots[self._index[key]], value)
+        except (KeyError, TypeError):
+            raise KeyError(f"Столбец {key!r} отсутствует в результате запроса") from None
+    
+    def __contains__(self, key):
+        return key in self._index
+    
+    def __iter__(self):
+        return iter(self._index)
+    
+    def __len__(self):
+        return len(self._index)
+    
+    def __eq__(self, other):
+        if isinstance(other, (BaseRecord, dict)):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+    
+    def get(self, key, default=None):
+        index = self._index.get(key)
+        if index is None:
+            return default
+        return getattr(self, self._slots[index])
+    
+    def keys(self):
+        return self._index.keys()
+    
+    def values(self):
+        return [getattr(self, self._slots[index]) for index in self._index.values()]
+    
+    def items(self):
+        return [(key, getattr(self, self._slots[index])) for key, index in self._index.items()]
+    
+    def to_dict(self):
+        """Преобразование записи в словарь"""
+        return {key: getattr(self, self._slots[index]) for key, index in self._index.items()}
+
+
+@lru_cache(maxsize=256)
+def record_class(fields):
+    """
+    Класс записи для набора столбцов запроса
+    
+    Столбцы с допустимыми уникальными именами доступны и как атрибуты
+    (record.full_name), остальные - только по имени или индексу.
+    
+    :param fields: Кортеж имен столбцов
+    """
+    slots = []
+    for position, name in enumerate(fields):
+        if (name.isidentifier() and not keyword.iskeyword(name) and not name.startswith('_')
+                and name not in _RESERVED_NAMES and fields.count(name) == 1):
+            slots.append(name)
+        else:
+            slots.append(f"_{position}")
+    
+    # Как и в словаре, при повторяющихся именах действует последний столбец
+    index = {name: position for position, name in enumerate(fields)}
+    
+    # Конструктор распаковывает кортеж строки одной операцией
+    targets = ", ".join(f"self.{slot}" for slot in slots) or "()"
+    source = f"def __init__(self, values):\n    {targets}{',' if len(slots) == 1 else ''} = values\n"
+    namespace = {}
+    exec(source, namespace)
+    
+    return type("Record", (BaseRecord,), {
+        '__slots__': tuple(slots),
+        '__init__': namespace['__init__'],
+        '_fields': fields,
+        '_slots': tuple(slots),
+        '_index': index,
+    })
+
+
+def row_converter(row_format, description):
+    """
+    Функция преобразования кортежа значений в строку заданного формата
+    
+    :return: Функция tuple -> строка или None, если кортеж подходит как есть
+    """
+    if row_format == 'tuple':
+        return None
+    if row_format == 'record':
+        return record_class(column_names(description))
+    if row_format == 'dict':
+        names = column_names(description)
+        return lambda values: dict(zip(names, values))
+    raise ValueError(f"Неизвестный формат строк: {row_format}")
+
+
+def convert_rows(row_format, description, rows):
+    """Преобразование списка кортежей значений в строки заданного формата"""
+    converter = row_converter(row_format, description)
+    if converter is None:
+        return rows
+    if len(rows) < GC_PAUSE_ROWS or not gc.isenabled():
+        return list(map(converter, rows))
+    
+    gc.disable()
+    try:
+        return list(map(converter, rows))
+    finally:
+        gc.enable()
+
+
+def row_factory(row_format):
+    """
+    Фабрика строк для cursor.row_factory
+    
+    Преобразователь строится один раз для каждого выполненного запроса
+    (cursor.description не меняется между строками одного запроса).
+    """
+    if row_format == 'row':
+        return sqlite3.Row
+    if row_format == 'tuple':
+        return None
+    if row_format not in ROW_FORMATS:
+        raise ValueError(f"Неизвестный формат строк: {row_format}")
+    
+    cache = [None, None]
+    
+    def factory(cursor, values):
+        if cursor.description is not cache[0]:
+            cache[0] = cursor.description
+            cache[1] = row_converter(row_format, cursor.description)
+        return cache[1](values)
+    
+    return factory
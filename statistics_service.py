@@ -0,0 +1,164 @@
+"""
+Статистика медицинского центра за период.
+
+Количество анализов, приемов и новых пациентов берется из дневных
+сводок stat_daily_analyses, stat_daily_appointments и stat_daily_patients,
+которые триггеры обновляют при каждой записи (см. миграцию схемы 5
+в DatabaseConnection). Поэтому время ответа зависит от числа дней
+в периоде, а не от количества записей в таблицах.
+
+Результаты кэшируются по периоду; кэш действителен, пока не изменились
+версии данных статистики в reference_versions (см. миграции схемы 9
+и 10). Отметка db.change_stamp() для этого не подходит: вкладка
+статистики читает данные из потока пула (lazy_tabs) через отдельное
+соединение, а data_version и total_changes сравнимы только в пределах
+одного соединения. Окно статистики и отчеты используют общий экземпляр
+statistics_service; обращения к кэшу выполняются под блокировкой.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from database_connection import db
+
+# Виды данных из reference_versions, от которых зависит статистика
+STATISTICS_DATA_KINDS = ('users', 'patients', 'doctors', 'analysis_types', 'analysis_results', 'appointments')
+
+PeriodStatistics = namedtuple('PeriodStatistics', [
+    'start_date', 'end_date',
+    'users_by_role',           # [(роль, количество)]
+    'total_patients',
+    'new_patients',
+    'total_analyses',
+    'analyses_by_type',        # [(название типа, количество)] по убыванию количества
+    'analyses_by_status',      # [(статус, количество)]
+    'total_appointments',
+    'appointments_by_status',  # [(статус, количество)]
+    'appointments_by_doctor',  # [(ФИО врача, количество)] по убыванию количества
+])
+
+
+class StatisticsService:
+    """Статистика за период по дневным сводкам с кэшем результатов"""
+    
+    # Количество периодов в кэше
+    CACHE_SIZE = 16
+    
+    def __init__(self, database=None):
+        self._db = database or db
+        self._cache = OrderedDict()
+        self._versions = None
+        self._lock = threading.Lock()
+    
+    def invalidate(self):
+        """Сброс кэша"""
+        with self._lock:
+            self._cache.clear()
+            self._versions = None
+    
+    def _check_versions(self):
+        # Данные изменились - результаты в кэше устарели
+        rows = self._db.fetch_all(
+            f"SELECT kind, version FROM reference_versions WHERE kind IN ({', '.join('?' * len(STATISTICS_DATA_KINDS))})",
+            STATISTICS_DATA_KINDS, row_format='tuple'
+        )
+        versions = dict(rows) if rows else None
+        if versions is None or versions != self._versions:
+            self._cache.clear()
+            self._versions = versions
+    
+    def get_statistics(self, start_date, end_date):
+        """
+        Статистика за период
+        
+        Пока данные не изменились, для того же периода возвращается
+        тот же объект, поэтому по нему можно проверить, нужно ли
+        перестраивать отображение.
+        
+        :param start_date: Начальная дата периода 'YYYY-MM-DD' (включительно)
+        :param end_date: Конечная дата периода 'YYYY-MM-DD' (включительно)
+        :return: PeriodStatistics
+        """
+        with self._lock:
+            self._check_versions()
+            key = (start_date, end_date)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            
+            statistics = self._load(start_date, end_date)
+            if self._versions is not None:
+                self._cache[key] = statistics
+                if len(self._cache) > self.CACHE_SIZE:
+                    self._cache.popitem(last=False)
+            return statistics
+    
+    def _pairs(self, query, params=()):
+        return list(self._db.fetch_all(query, params, row_format='tuple'))
+    
+    def _scalar(self, query, params=()):
+        row = self._db.fetch_one(query, params, row_format='tuple')
+        return row[0] if row else 0
+    
+    def _load(self, start_date, end_date):
+        """Чтение статистики из дневных сводок"""
+        period = (start_date, end_date)
+        
+        users_by_role = self._pairs("SELECT role, COUNT(*) FROM users GROUP BY role")
+        
+        total_patients = self._scalar("SELECT COALESCE(SUM(count), 0) FROM stat_daily_patients")
+        new_patients = self._scalar(
+            "SELECT COALESCE(SUM(count), 0) FROM stat_daily_patients WHERE day BETWEEN ? AND ?", period
+        )
+        
+        analyses_by_type = self._pairs("""
+            SELECT at.name, SUM(s.count) as count
+            FROM stat_daily_analyses s
+            JOIN analysis_types at ON at.id = s.analysis_type_id
+            WHERE s.day BETWEEN ? AND ?
+            GROUP BY at.name
+            HAVING SUM(s.count) > 0
+            ORDER BY count DESC
+        """, period)
+        analyses_by_status = self._pairs("""
+            SELECT status, SUM(count)
+            FROM stat_daily_analyses
+            WHERE day BETWEEN ? AND ?
+            GROUP BY status
+            HAVING SUM(count) > 0
+        """, period)
+        
+        appointments_by_status = self._pairs("""
+            SELECT status, SUM(count)
+            FROM stat_daily_appointments
+            WHERE day BETWEEN ? AND ?
+            GROUP BY status
+            HAVING SUM(count) > 0
+        """, period)
+        appointments_by_doctor = self._pairs("""
+            SELECT u.full_name, SUM(s.count) as count
+            FROM stat_daily_appointments s
+            JOIN doctors d ON d.id = s.doctor_id
+            JOIN users u ON u.id = d.user_id
+            WHERE s.day BETWEEN ? AND ?
+            GROUP BY s.doctor_id
+            HAVING SUM(s.count) > 0
+            ORDER BY count DESC
+        """, period)
+        
+        return PeriodStatistics(
+            start_date=start_date,
+            end_date=end_date,
+            users_by_role=users_by_role,
+            total_patients=total_patients,
+            new_patients=new_patients,
+            total_analyses=sum(count for _, count in analyses_by_status),
+            analyses_by_type=analyses_by_type,
+            analyses_by_status=analyses_by_status,
+            total_appointments=sum(count for _, count in appointments_by_status),
+            appointments_by_status=appointments_by_status,
+            appointments_by_doctor=appointments_by_doctor,
+        )
+
+
+# Общий экземпляр для окна статистики и отчетов
+statistics_service = StatisticsService()
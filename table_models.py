@@ -0,0 +1,380 @@
+"""
+Модели и делегаты для таблиц приложения.
+
+LazyQueryTableModel загружает строки из курсора базы данных порциями
+(canFetchMore/fetchMore), поэтому представление запрашивает только те строки,
+которые видны пользователю. ActionButtonsDelegate рисует кнопки действий
+в ячейке вместо создания отдельных виджетов QPushButton для каждой строки.
+"""
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, QRect, QTimer
+from PySide6.QtGui import QColor
+from PySide6.QtWidgets import QStyledItemDelegate, QStyleOptionButton, QStyle, QApplication
+
+from analysis_flags import analysis_flags
+from database_connection import db
+
+# Фон строк результатов анализов со значениями вне нормы
+ABNORMAL_RESULT_COLOR = QColor("#f8d7da")
+
+
+def abnormal_result_background(row):
+    """Фон строки результата анализа: выделяются результаты со значениями вне нормы"""
+    return ABNORMAL_RESULT_COLOR if analysis_flags.is_abnormal(row['id']) else None
+
+
+class TableColumn:
+    """Описание столбца табличной модели"""
+    
+    def __init__(self, title, key=None, display=None, foreground=None, background=None):
+        """
+        :param title: Заголовок столбца
+        :param key: Имя поля строки (используется для отображения и сортировки)
+        :param display: Функция row -> текст ячейки (по умолчанию значение поля key)
+        :param foreground: Функция row -> QColor цвета текста или None
+        :param background: Функция row -> QColor цвета фона или None
+        """
+        self.title = title
+        self.key = key
+        self.display = display
+        self.foreground = foreground
+        self.background = background
+    
+    def text(self, row):
+        """Текст ячейки для строки"""
+        if self.display:
+            return self.display(row)
+        if self.key is None:
+            return ""
+        value = row.get(self.key)
+        return "" if value is None else str(value)
+
+
+class LazyQueryTableModel(QAbstractTableModel):
+    """Табличная модель с постепенной загрузкой строк из курсора базы данных"""
+    
+    def __init__(self, columns, batch_size=100, parent=None, row_background=None, rows_loaded=None):
+        """
+        :param columns: Список TableColumn
+        :param batch_size: Количество строк в одной порции
+        :param row_background: Функция row -> QColor фона всей строки или None
+                               (для столбцов без собственного background)
+        :param rows_loaded: Функция, получающая каждую новую порцию строк до ее
+                            отображения (например, для загрузки данных пакетом)
+        """
+        super().__init__(parent)
+        self.columns = columns
+        self.batch_size = batch_size
+        self.row_background = row_background
+        self.rows_loaded = rows_loaded
+        
+        self._rows = []
+        self._cursor = None
+        # Количество строк, уже прочитанных в другом потоке: курсор
+        # открывается при прокрутке дальше них
+        self._resume_offset = None
+        self._query = None
+        self._params = ()
+        self._source_rows = None
+        self._order = None
+    
+    def set_query(self, query, params=None):
+        """Установка запроса; строки будут загружаться по мере прокрутки"""
+        self._query = query
+        self._params = tuple(params or ())
+        self._source_rows = None
+        self._reload()
+    
+    def set_rows(self, rows):
+        """Установка уже загруженного списка строк (например, из кэша)"""
+        self._query = None
+        self._params = ()
+        self._source_rows = list(rows)
+        self._reload()
+    
+    def refresh(self):
+        """Повторное выполнение текущего запроса"""
+        self._reload()
+    
+    def first_rows_loader(self, query, params=None):
+        """
+        Функция чтения первой порции строк запроса в фоновом потоке
+        
+        Функция не обращается к модели; ее результат передается
+        в set_loaded_query() в главном потоке.
+        
+        :param query: SQL-запрос (как для set_query)
+        :param params: Параметры запроса
+        :return: Функция без аргументов
+        """
+        params = tuple(params or ())
+        ordered_query = self._ordered_query(query)
+        batch_size = self.batch_size
+        return lambda: (query, params, ordered_query, fetch_first_rows(ordered_query, params, batch_size))
+    
+    def set_loaded_query(self, loaded):
+        """
+        Установка запроса вместе с первой порцией строк, прочитанной first_rows_loader()
+        
+        Остальные строки читаются курсором по мере прокрутки.
+        """
+        query, params, ordered_query, rows = loaded
+        self._query = query
+        self._params = params
+        self._source_rows = None
+        # Пока строки читались, могла измениться сортировка
+        self._reload(rows if ordered_query == self._ordered_query() else None)
+    
+    def _ordered_query(self, query=None):
+        """Запрос (по умолчанию текущий) с учетом выбранной сортировки"""
+        query = query or self._query
+        if not self._order:
+            return query
+        key, order = self._order
+        direction = "DESC" if order == Qt.DescendingOrder else "ASC"
+        return f'SELECT * FROM ({query}) ORDER BY "{key}" {direction}'
+    
+    def _reload(self, first_rows=None):
+        """Сброс модели и загрузка первой порции строк"""
+        self.beginResetModel()
+        self._close_cursor()
+        self._resume_offset = None
+        self._rows = []
+        
+        if self._source_rows is not None:
+            self._rows = list(self._source_rows)
+            if self.rows_loaded and self._rows:
+                self.rows_loaded(self._rows)
+            if self._order:
+                key, order = self._order
+                self._rows.sort(
+                    key=lambda row: (row.get(key) is None, row.get(key) if row.get(key) is not None else ""),
+                    reverse=order == Qt.DescendingOrder
+                )
+        elif self._query and first_rows is not None:
+            self._rows = list(first_rows)
+            if self.rows_loaded and self._rows:
+                self.rows_loaded(self._rows)
+            if len(self._rows) >= self.batch_size:
+                self._resume_offset = len(self._rows)
+        elif self._query:
+            self._cursor = db.iter_query(self._ordered_query(), self._params)
+        self.endResetModel()
+        
+        if self._cursor is not None:
+            self.fetchMore()
+    
+    def _close_cursor(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+    
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and (self._cursor is not None or self._resume_offset is not None)
+    
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        if self._cursor is None and self._resume_offset is not None:
+            # Первые строки уже прочитаны в другом потоке: курсор этого
+            # потока пропускает их
+            self._cursor = db.iter_query(self._ordered_query(), self._params)
+            if self._cursor is not None:
+                self._cursor.fetchmany(self._resume_offset)
+            self._resume_offset = None
+        if self._cursor is None:
+            return
+        
+        batch = self._cursor.fetchmany(self.batch_size)
+        if len(batch) < self.batch_size:
+            self._close_cursor()
+        
+        if batch:
+            if self.rows_loaded:
+                self.rows_loaded(batch)
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(batch) - 1)
+            self._rows.extend(batch)
+            self.endInsertRows()
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        
+        row = self._rows[index.row()]
+        column = self.columns[index.column()]
+        
+        if role == Qt.DisplayRole:
+            return column.text(row)
+        if role == Qt.ForegroundRole and column.foreground:
+            return column.foreground(row)
+        if role == Qt.BackgroundRole:
+            if column.background:
+                return column.background(row)
+            if self.row_background:
+                return self.row_background(row)
+        return None
+    
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section].title
+        return super().headerData(section, orientation, role)
+    
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Сортировка выполняется запросом к базе данных, а не по загруженным строкам"""
+        key = self.columns[column].key if 0 <= column < len(self.columns) else None
+        new_order = (key, order) if key else None
+        if new_order == self._order:
+            return
+        
+        self._order = new_order
+        self._reload()
+    
+    def row_data(self, row):
+        """Данные строки по ее номеру"""
+        return self._rows[row]
+    
+    def current_query(self):
+        """
+        Текущий запрос модели с учетом сортировки
+        
+        Позволяет прочитать все строки в другом потоке (например, в фоновой
+        задаче экспорта) без обращения к самой модели.
+        
+        :return: Кортеж (запрос, параметры) или None, если строки заданы set_rows
+        """
+        if self._source_rows is not None or not self._query:
+            return None
+        return self._ordered_query(), self._params
+    
+    def iter_all_rows(self):
+        """
+        Перебор всех строк текущего запроса (включая еще не загруженные)
+        
+        Запрос выполняется заново отдельным курсором, поэтому строки
+        не добавляются в модель и не занимают память представления.
+        """
+        query = self.current_query()
+        if query is None:
+            yield from self._rows
+            return
+        yield from iter_query_rows(*query, batch_size=self.batch_size)
+
+
+def fetch_first_rows(query, params=(), count=100):
+    """Первые count строк запроса (курсор закрывается, остальные строки не читаются)"""
+    cursor = db.iter_query(query, params)
+    if cursor is None:
+        return []
+    try:
+        return cursor.fetchmany(count)
+    finally:
+        cursor.close()
+
+
+def iter_query_rows(query, params=(), batch_size=100):
+    """Перебор строк запроса отдельным курсором порциями по batch_size строк"""
+    cursor = db.iter_query(query, params)
+    if cursor is None:
+        return
+    try:
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            yield from batch
+    finally:
+        cursor.close()
+
+
+class RowAction:
+    """Кнопка действия в строке таблицы"""
+    
+    def __init__(self, text, callback, visible=None):
+        """
+        :param text: Надпись на кнопке
+        :param callback: Функция, вызываемая с данными строки
+        :param visible: Функция row -> bool, определяющая видимость кнопки
+        """
+        self.text = text
+        self.callback = callback
+        self.visible = visible
+    
+    def is_visible(self, row):
+        return self.visible is None or self.visible(row)
+
+
+class ActionButtonsDelegate(QStyledItemDelegate):
+    """Делегат, рисующий кнопки действий строки без создания виджетов"""
+    
+    MARGIN = 2
+    
+    def __init__(self, actions, parent=None):
+        super().__init__(parent)
+        self.actions = actions
+        self._pressed = None
+    
+    def _button_rects(self, rect, row):
+        """Прямоугольники видимых кнопок в ячейке"""
+        visible = [action for action in self.actions if action.is_visible(row)]
+        if not visible:
+            return []
+        
+        width = (rect.width() - self.MARGIN * (len(visible) + 1)) // len(visible)
+        rects = []
+        for number, action in enumerate(visible):
+            left = rect.left() + self.MARGIN + number * (width + self.MARGIN)
+            rects.append((action, QRect(left, rect.top() + self.MARGIN, width, rect.height() - 2 * self.MARGIN)))
+        return rects
+    
+    def paint(self, painter, option, index):
+        row = index.model().row_data(index.row())
+        widget = option.widget
+        style = widget.style() if widget else QApplication.style()
+        
+        for action, rect in self._button_rects(option.rect, row):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.text = action.text
+            button.state = QStyle.State_Enabled | QStyle.State_Raised
+            if self._pressed == (index.row(), index.column(), action):
+                button.state |= QStyle.State_Sunken
+            style.drawControl(QStyle.CE_PushButton, button, painter, widget)
+    
+    def sizeHint(self, option, index):
+        size = super().sizeHint(option, index)
+        metrics = option.fontMetrics
+        width = sum(metrics.horizontalAdvance(action.text) + 24 for action in self.actions)
+        size.setWidth(max(size.width(), width))
+        size.setHeight(max(size.height(), metrics.height() + 12))
+        return size
+    
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease):
+            return False
+        
+        row = model.row_data(index.row())
+        position = event.position().toPoint()
+        clicked = None
+        for action, rect in self._button_rects(option.rect, row):
+            if rect.contains(position):
+                clicked = action
+                break
+        
+        if event.type() == QEvent.MouseButtonPress:
+            self._pressed = (index.row(), index.column(), clicked) if clicked else None
+            return clicked is not None
+        
+        pressed = self._pressed
+        self._pressed = None
+        if clicked and pressed == (index.row(), index.column(), clicked):
+            # Действие выполняется после обработки события, так как оно может
+            # открыть диалог или перезагрузить модель
+            QTimer.singleShot(0, lambda: clicked.callback(row))
+            return True
+        return False